@@ -1,4 +1,6 @@
 from .utilities import device_slug_to_id, device_id_to_slug
 from .cloud import IOTileCloud
+from .report_uploader import ReportUploader, UploadResult
+from .report_spool import ReportSpool, SpoolDrainer
 
-__all__ = ['device_slug_to_id', 'device_id_to_slug', 'IOTileCloud']
+__all__ = ['device_slug_to_id', 'device_id_to_slug', 'IOTileCloud', 'ReportUploader', 'UploadResult', 'ReportSpool', 'SpoolDrainer']
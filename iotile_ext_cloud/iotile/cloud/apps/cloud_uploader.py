@@ -3,15 +3,85 @@
 import logging
 import time
 import struct
-from builtins import range
-from iotile.core.exceptions import HardwareError
+import threading
+from builtins import range, zip
+from queue import Queue, Empty
+from monotonic import monotonic
+from iotile.core.exceptions import HardwareError, ExternalError, ArgumentError
 from iotile.core.hw import IOTileApp
 from iotile.core.hw.reports import SignedListReport
 from iotile.core.utilities.console import ProgressBar
 from iotile.cloud import IOTileCloud, device_id_to_slug
+from iotile.cloud.cloud import Acknowledgement
+from iotile.cloud.report_uploader import ReportUploader
+from iotile.cloud.report_spool import ReportSpool, SpoolDrainer
 from typedargs.annotate import docannotate, context
 
 
+class DeviceUploadResult(object):
+    """The outcome of collecting and uploading the data from one device.
+
+    Args:
+        device_id (int): The UUID of the device.
+        connect_time (float): The number of seconds it took to connect.
+        stream_time (float): The number of seconds from connecting until the
+            device finished streaming all of its reports.
+        total_time (float): The number of seconds from starting to connect
+            until all of the device's reports were uploaded.
+        uploads (list of UploadResult): The result of each report upload.
+        ignored (int): The number of realtime reports that were ignored.
+        error (str): A description of why the device could not be processed
+            or None if it was processed successfully.
+    """
+
+    def __init__(self, device_id, connect_time=0.0, stream_time=0.0, total_time=0.0, uploads=None, ignored=0, error=None):
+        if uploads is None:
+            uploads = []
+
+        self.device_id = device_id
+        self.connect_time = connect_time
+        self.stream_time = stream_time
+        self.total_time = total_time
+        self.uploads = uploads
+        self.ignored = ignored
+        self.error = error
+
+    @property
+    def succeeded(self):
+        """Whether the device was processed and all of its reports uploaded."""
+
+        return self.error is None and all(x.succeeded for x in self.uploads)
+
+
+class FleetUploadResult(object):
+    """The outcome of uploading data from a fleet of devices.
+
+    Args:
+        devices (list of DeviceUploadResult): The result for each device in
+            the order the devices were given.
+        elapsed (float): The total number of seconds the fleet upload took.
+    """
+
+    def __init__(self, devices, elapsed):
+        self.devices = devices
+        self.elapsed = elapsed
+
+    @property
+    def failed(self):
+        """The devices that could not be processed completely."""
+
+        return [x for x in self.devices if not x.succeeded]
+
+    @property
+    def devices_per_hour(self):
+        """The rate at which devices were processed successfully."""
+
+        if self.elapsed <= 0.0:
+            return 0.0
+
+        return (len(self.devices) - len(self.failed)) * 3600.0 / self.elapsed
+
+
 @context("CloudUploader")
 class CloudUploader(IOTileApp):
     """An IOtile app that can get reports from a device and upload them to the cloud.
@@ -21,8 +91,8 @@ class CloudUploader(IOTileApp):
     will start a loop that:
         - acknowledges old data from the device that has safely reched iotile.cloud
         - triggers the device to send all of its data
-        - waits for all data to be sent
-        - uploads all reports to iotile.cloud
+        - uploads reports to iotile.cloud as they are received until all data
+          has been sent
 
     Args:
         hw (HardwareManager): A HardwareManager instance connected to a
@@ -32,14 +102,19 @@ class CloudUploader(IOTileApp):
         os_info (tuple): The os_tag and version of the device we are
             connected to.
         device_id (int): The UUID of the device that we are connected to.
+        cloud (IOTileCloud): An optional existing cloud connection to use.  If
+            not given, a new one is created with the default settings.
     """
 
     logger = logging.getLogger(__name__)
 
-    def __init__(self, hw, app_info, os_info, device_id):
+    def __init__(self, hw, app_info, os_info, device_id, cloud=None):
         super(CloudUploader, self).__init__(hw, app_info, os_info, device_id)
 
-        self._cloud = IOTileCloud()
+        if cloud is None:
+            cloud = IOTileCloud()
+
+        self._cloud = cloud
         self._con = self._hw.get(8, basic=True)
 
     @classmethod
@@ -70,13 +145,16 @@ class CloudUploader(IOTileApp):
         comm_status, = struct.unpack("<18xBx", res['buffer'])
         return comm_status == 0
 
-    def _wait_streamers_finished(self, timeout=60*10.0):
+    def _wait_streamers_finished(self, timeout=60*10.0, on_poll=None):
         start = time.time()
 
         while (time.time() - start) < timeout:
             for i in range(0, 16):
                 self.logger.info("Waiting for streamer %d", i)
                 while True:
+                    if on_poll is not None:
+                        on_poll()
+
                     status = self._streamer_finished(i)
                     if status is None:
                         self.logger.info("No streamer %d, all streamers finished", i)
@@ -131,24 +209,35 @@ class CloudUploader(IOTileApp):
             list of IOTileReport: The list of reports received from the device.
         """
 
-        device_id = self._get_uuid()
-        slug = device_id_to_slug(device_id)
+        self._start_streaming(trigger, acknowledge)
+        self._wait_streamers_finished()
 
-        self.logger.info("Connected to device 0x%X", device_id)
+        reports = [x for x in self._hw.iter_reports()]
+        signed_reports = [x for x in reports if isinstance(x, SignedListReport)]
 
-        if acknowledge:
-            self.logger.info("Getting acknowledgements from cloud for slug %s", slug)
+        self.logger.info("Received %d signed reports, ignored %d realtime reports", len(signed_reports), len(reports) - len(signed_reports))
+
+        return signed_reports
 
-            resp = self._cloud.api.streamer.get(device=slug)
-            acks = resp.get('results', [])
-            self.logger.info("Found %d acknowledgements", len(acks))
+    def _start_streaming(self, trigger, acknowledge, acknowledgements=None):
+        """Acknowledge old data and tell the device to start sending reports.
+
+        Args:
+            trigger (int): An optional streamer to trigger manually.
+            acknowledge (bool): Whether to send cloud acknowledgements to the
+                device before streaming.
+            acknowledgements (list of Acknowledgement): The acknowledgements
+                to send if they have already been fetched from the cloud.  If
+                None, they are fetched for the connected device.
+        """
 
-            for ack in acks:
-                index = ack['index']
-                last_id = ack['last_id']
+        if acknowledge:
+            if acknowledgements is None:
+                acknowledgements = self._fetch_acknowledgements()
 
-                self.logger.info("Acknowledging highest ID %d for streamer %d", last_id, index)
-                self._ack_streamer(index, last_id)
+            for ack in acknowledgements:
+                self.logger.info("Acknowledging highest ID %d for streamer %d", ack.ack, ack.index)
+                self._ack_streamer(ack.index, ack.ack)
         else:
             self.logger.info("Not acknowledging readings from cloud per user request")
 
@@ -158,17 +247,55 @@ class CloudUploader(IOTileApp):
             self.logger.info("Explicitly triggering streamer %d", trigger)
             self._trigger_streamer(trigger)
 
-        self._wait_streamers_finished()
+    def _fetch_acknowledgements(self):
+        device_id = self._get_uuid()
+        slug = device_id_to_slug(device_id)
 
-        reports = [x for x in self._hw.iter_reports()]
-        signed_reports = [x for x in reports if isinstance(x, SignedListReport)]
+        self.logger.info("Connected to device 0x%X", device_id)
+        self.logger.info("Getting acknowledgements from cloud for slug %s", slug)
 
-        self.logger.info("Received %d signed reports, ignored %d realtime reports", len(signed_reports), len(reports) - len(signed_reports))
+        resp = self._cloud.api.streamer.get(device=slug)
+        acks = [Acknowledgement(x['index'], x['last_id'], x.get('selector')) for x in resp.get('results', [])]
+        self.logger.info("Found %d acknowledgements", len(acks))
 
-        return signed_reports
+        return acks
+
+    def _stream_to_uploader(self, uploader, trigger=None, acknowledge=True, acknowledgements=None):
+        """Submit signed reports to an uploader as they are received.
+
+        Args:
+            uploader (ReportUploader): The uploader to submit reports to.
+            trigger (int): An optional streamer to trigger manually.
+            acknowledge (bool): Whether to send cloud acknowledgements to the
+                device before streaming.
+            acknowledgements (list of Acknowledgement): Optional prefetched
+                acknowledgements for this device.
+
+        Returns:
+            (list of Future, int): The futures for each submitted upload and
+                the number of realtime reports that were ignored.
+        """
+
+        futures = []
+        ignored = [0]
+
+        def _upload_received():
+            for report in self._hw.iter_reports():
+                if not isinstance(report, SignedListReport):
+                    ignored[0] += 1
+                    continue
+
+                self.logger.info("Uploading report with ids in (%d, %d)", report.lowest_id, report.highest_id)
+                futures.append(uploader.submit(report))
+
+        self._start_streaming(trigger, acknowledge, acknowledgements)
+        self._wait_streamers_finished(on_poll=_upload_received)
+        _upload_received()
+
+        return futures, ignored[0]
 
     @docannotate
-    def upload(self, trigger=None, acknowledge=True):
+    def upload(self, trigger=None, acknowledge=True, workers=4, spool=None):
         """Synchronously get all data from the device and upload it to iotile.cloud.
 
         This function will:
@@ -178,8 +305,8 @@ class CloudUploader(IOTileApp):
           when we enable_streaming.  However, if you need to manually trigger a
           streamer, you can specify that using trigger=X where X is in the index
           of the streamer to trigger.
-        - wait for all data to be received from the device.
-        - upload all reports to iotile.cloud securely.
+        - upload reports to iotile.cloud securely as they are received from
+          the device until all data has been sent.
 
         If you want to see details about what is happening, you can capture the
         logging output.
@@ -194,13 +321,167 @@ class CloudUploader(IOTileApp):
             acknowledge (bool): If you don't want to send all cloud acknowledgements
                 down to the device before enabling streaming, you can pass False.  The
                 default behavior is True.
+            workers (int): The maximum number of reports to upload at the same
+                time.
+            spool (path): An optional directory to use as a persistent spool
+                for reports.  Every report is saved there before it is uploaded
+                and only removed once the upload succeeds.  Reports left over
+                from previous runs are uploaded in the background.
+        """
+
+        report_spool = None
+        drainer = None
+        if spool is not None:
+            report_spool = ReportSpool(spool)
+            drainer = SpoolDrainer(report_spool, self._cloud, workers=workers)
+            drainer.start()
+
+        try:
+            with ReportUploader(self._cloud, workers=workers, spool=report_spool) as uploader:
+                futures, ignored = self._stream_to_uploader(uploader, trigger, acknowledge)
+
+                results = uploader.wait(futures)
+                stats = uploader.statistics
+        finally:
+            if drainer is not None:
+                drainer.stop()
+                report_spool.close()
+
+        self.logger.info("Uploaded %d signed reports (%d bytes, %.0f bytes/s), ignored %d realtime reports",
+                         stats['succeeded'], stats['bytes'], stats['bytes_per_second'], ignored)
+
+        failed = [x for x in results if not x.succeeded]
+        if len(failed) > 0:
+            raise ExternalError("Some reports could not be uploaded to iotile.cloud", failed_count=len(failed),
+                                errors=[x.error for x in failed], saved_in_spool=spool)
+
+    @classmethod
+    def UploadFleet(cls, hardware, device_ids, cloud=None, workers=4, trigger=None, acknowledge=True, connect_wait=None, spool=None):
+        """Collect and upload the data from many devices in parallel.
+
+        Each HardwareManager in hardware is used to process one device at a
+        time, so the number of devices handled in parallel is the number of
+        HardwareManagers passed.  The acknowledgements for every device are
+        fetched from the cloud in a single batch before any device is
+        contacted and all reports are uploaded through a single shared
+        ReportUploader while the devices are still streaming.
+
+        A failure with one device is recorded in its result and does not
+        stop the other devices from being processed.
+
+        Args:
+            hardware (list of HardwareManager): The adapters to use.  They
+                must not be connected to a device.
+            device_ids (list of int): The UUIDs of the devices to process.
+            cloud (IOTileCloud): An optional existing cloud connection.
+            workers (int): The maximum number of reports to upload at once.
+            trigger (int): An optional streamer to trigger on each device.
+            acknowledge (bool): Whether to send cloud acknowledgements to
+                each device before streaming.
+            connect_wait (float): How long to wait for each device to be
+                seen before connecting to it.
+            spool (ReportSpool): An optional spool that every report is saved
+                to until it has been uploaded.
+
+        Returns:
+            FleetUploadResult: The outcome for each device along with the
+                overall devices per hour rate.
         """
 
-        signed_reports = self.download(trigger, acknowledge)
+        if len(hardware) == 0:
+            raise ArgumentError("You must pass at least one HardwareManager to upload from a fleet")
+
+        if cloud is None:
+            cloud = IOTileCloud()
+
+        start = monotonic()
+
+        acknowledgements = {}
+        if acknowledge:
+            acknowledgements = cloud.fleet_acknowledgements(device_ids)
+
+        device_queue = Queue()
+        for i, device_id in enumerate(device_ids):
+            device_queue.put((i, device_id))
+
+        results = [None] * len(device_ids)
+        pending = [None] * len(device_ids)
+
+        with ReportUploader(cloud, workers=workers, spool=spool) as uploader:
+            def _process_devices(hw):
+                while True:
+                    try:
+                        index, device_id = device_queue.get_nowait()
+                    except Empty:
+                        return
+
+                    try:
+                        results[index], pending[index] = cls._upload_device(hw, device_id, cloud, uploader, trigger,
+                                                                            acknowledge, acknowledgements.get(device_id, []),
+                                                                            connect_wait)
+                    except Exception as exc:  #pylint:disable=broad-except;One bad device should not stop this adapter
+                        cls.logger.exception("Error processing device 0x%X", device_id)
+                        results[index] = DeviceUploadResult(device_id, error=str(exc))
+                        pending[index] = ([], monotonic())
+
+            threads = [threading.Thread(target=_process_devices, args=(x,)) for x in hardware]
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+            # Make sure every device has a result even if its adapter thread died unexpectedly
+            for i, device_id in enumerate(device_ids):
+                if results[i] is None or pending[i] is None:
+                    results[i] = DeviceUploadResult(device_id, error="Device was not processed")
+                    pending[i] = ([], start)
+
+            for result, (futures, device_start) in zip(results, pending):
+                result.uploads = [x.result() for x in futures]
+                if len(result.uploads) > 0:
+                    last_finished = max(x.finish_time for x in result.uploads)
+                    result.total_time = max(result.total_time, last_finished - device_start)
 
-        for report in signed_reports:
-            self.logger.info("Uploading report with ids in (%d, %d)", report.lowest_id, report.highest_id)
-            self._cloud.upload_report(report)
+        fleet_result = FleetUploadResult(results, monotonic() - start)
+
+        for result in results:
+            cls.logger.info("Device 0x%X: connect %.2f s, stream %.2f s, total %.2f s, %d reports, error=%s", result.device_id,
+                            result.connect_time, result.stream_time, result.total_time, len(result.uploads), result.error)
+
+        cls.logger.info("Processed %d devices (%d failed) in %.1f seconds, %.1f devices/hour", len(results),
+                        len(fleet_result.failed), fleet_result.elapsed, fleet_result.devices_per_hour)
+
+        return fleet_result
+
+    @classmethod
+    def _upload_device(cls, hw, device_id, cloud, uploader, trigger, acknowledge, acknowledgements, connect_wait):
+        """Connect to a single device and stream its reports to a shared uploader."""
+
+        start = monotonic()
+        futures = []
+
+        try:
+            hw.connect(device_id, wait=connect_wait)
+        except Exception as exc:  #pylint:disable=broad-except;One bad device should not stop the fleet
+            return DeviceUploadResult(device_id, total_time=monotonic() - start, error=str(exc)), (futures, start)
+
+        connect_time = monotonic() - start
+
+        try:
+            app = cls(hw, (None, None), (None, None), device_id, cloud=cloud)
+            futures, ignored = app._stream_to_uploader(uploader, trigger, acknowledge, acknowledgements)
+            stream_time = monotonic() - start - connect_time
+            result = DeviceUploadResult(device_id, connect_time, stream_time, monotonic() - start, ignored=ignored)
+        except Exception as exc:  #pylint:disable=broad-except;One bad device should not stop the fleet
+            result = DeviceUploadResult(device_id, connect_time, total_time=monotonic() - start, error=str(exc))
+        finally:
+            try:
+                hw.disconnect()
+            except Exception:  #pylint:disable=broad-except;The adapter must go on to its next device
+                cls.logger.exception("Error disconnecting from device 0x%X", device_id)
+
+        return result, (futures, start)
 
     @docannotate
     def get_report_size(self):
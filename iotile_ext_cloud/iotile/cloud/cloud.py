@@ -5,6 +5,8 @@ from builtins import input
 from io import BytesIO
 import getpass
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from dateutil.tz import tzutc
 import dateutil.parser
@@ -43,6 +45,11 @@ class IOTileCloud(object):
 
     DEVICE_TOKEN_TYPE = 'a-jwt'
 
+    # The maximum number of idle connections kept open to the cloud server.
+    # This should be at least as large as the number of threads that
+    # upload reports at the same time.
+    MAX_POOLED_CONNECTIONS = 16
+
     def __init__(self, domain=None, username=None):
         reg = ComponentRegistry()
         conf = ConfigManager()
@@ -73,11 +80,33 @@ class IOTileCloud(object):
 
         self.token = self.api.token
         self.token_type = self.api.token_type
+        self._session = None
+        self._session_lock = threading.Lock()
 
     @property
     def refresh_required(self):
         return self.token_type == 'jwt'
 
+    @property
+    def session(self):
+        """A persistent requests.Session used for uploads.
+
+        The session keeps connections to the cloud open so that uploading
+        many reports does not pay for a new TCP and TLS handshake each time.
+        It is safe to share between threads.
+        """
+
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.MAX_POOLED_CONNECTIONS)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+
+        return self._session
+
     def _build_streamer_slug(self, device_id, streamer_id):
         idhex = "{:04x}".format(device_id)
         streamer_hex = "{:04x}".format(streamer_id)
@@ -333,7 +362,7 @@ class IOTileCloud(object):
         authorization_str = '{0} {1}'.format(self.token_type, self.token)
         headers['Authorization'] = authorization_str
 
-        resp = requests.post(resource.url(), files=payload, headers=headers, params={'timestamp': timestamp})
+        resp = self.session.post(resource.url(), files=payload, headers=headers, params={'timestamp': timestamp})
 
         count = resource._process_response(resp)['count']
         return count
@@ -396,6 +425,73 @@ class IOTileCloud(object):
 
         return acknowledgements
 
+    def fleet_acknowledgements(self, device_ids, page_size=1000, workers=8):
+        """Get the streamer acknowledgements for many devices at once.
+
+        The streamers of each device are fetched with a query filtered by
+        device on the server, like device_acknowledgements, but the queries
+        for different devices run in parallel over the same persistent
+        session so many devices can be checked in roughly the time it takes
+        to check a few.
+
+        Args:
+            device_ids (list of int): The devices we are querying.
+            page_size (int): The number of streamer records to fetch per
+                request.
+            workers (int): The maximum number of devices to query at the
+                same time.
+
+        Returns:
+            dict: A map of each device id to its list of Acknowledgement
+                namedtuples.  Devices without any streamer records map to an
+                empty list.
+        """
+
+        if workers < 1:
+            raise ArgumentError("fleet_acknowledgements must have at least one worker", workers=workers)
+
+        device_ids = list(device_ids)
+        if len(device_ids) == 0:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(device_ids))) as executor:
+            futures = [executor.submit(self._device_streamers, x, page_size) for x in device_ids]
+            return {device_id: future.result() for device_id, future in zip(device_ids, futures)}
+
+    def _device_streamers(self, device_id, page_size):
+        """Fetch every streamer acknowledgement of a device, page by page."""
+
+        slug = device_id_to_slug(device_id)
+        resource = self.api.streamer
+
+        headers = {}
+        authorization_str = '{0} {1}'.format(self.token_type, self.token)
+        headers['Authorization'] = authorization_str
+
+        acknowledgements = []
+        page = 1
+
+        while True:
+            try:
+                resp = self.session.get(resource.url(), headers=headers,
+                                        params={'device': slug, 'page': page, 'page_size': page_size})
+                data = resource._process_response(resp)
+            except (RestHttpBaseException, requests.exceptions.RequestException) as exc:
+                raise ExternalError("Could not get streamer information from the cloud", device_id=device_id,
+                                    page=page, err=str(exc))
+
+            results = data.get('results', [])
+            for result in results:
+                acknowledgements.append(Acknowledgement(result.get("index"), result.get("last_id"), result.get("selector")))
+
+            # Only stop once the server says there is nothing more, not based on count, which is not always included
+            if len(results) < page_size or not data.get('next'):
+                break
+
+            page += 1
+
+        return acknowledgements
+
     @annotated
     def refresh_token(self):
         """Attempt to refresh out cloud token with iotile.cloud."""
@@ -0,0 +1,498 @@
+"""A durable on-disk queue of reports waiting to be uploaded to iotile.cloud.
+
+Reports that are only held in memory are lost if an upload fails and the
+process exits before it can be retried.  ReportSpool stores encoded reports
+on disk until they are known to have reached the cloud so that gateways with
+intermittent connectivity never drop data.
+
+The spool is a directory containing:
+
+    segment-XXXXXXXX.bin: Append-only segment files holding the reports.
+        Each report is stored as a 16 byte header (uint32 length, uint32
+        crc32 of the encoded report, int64 received time in microseconds
+        since the unix epoch or -1) followed by the encoded report.
+    index.bin: An append-only log of fixed size records.  An "add" record
+        describes where a report is stored along with its device, streamer
+        and reading id range.  A "done" record marks a report as uploaded.
+
+Reports are always written to their segment and flushed before their
+index record is appended, so every index entry refers to a complete report.
+When the spool is opened, only the index is read; the segments are not
+scanned.  Segments whose reports have all been uploaded are deleted and the
+index is rewritten once most of its records refer to uploaded reports.
+
+SpoolDrainer uploads the reports in a spool in the background and skips
+any that the cloud has already acknowledged.
+"""
+
+import os
+import re
+import struct
+import zlib
+import logging
+import datetime
+import threading
+from collections import namedtuple
+from iotile.core.exceptions import ArgumentError, DataError, IOTileException
+from iotile.core.hw.reports.parser import IOTileReportParser
+from .report_uploader import ReportUploader
+
+SpoolEntry = namedtuple("SpoolEntry", ["entry_id", "device", "streamer", "lowest_id", "highest_id", "segment", "offset", "length"])
+
+_INDEX_RECORD = struct.Struct("<BxHLLLLLLL")
+_RECORD_HEADER = struct.Struct("<LLq")
+
+_ADD_RECORD = 1
+_DONE_RECORD = 2
+
+_SEGMENT_NAME = re.compile(r"^segment-([0-9]{8})\.bin$")
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _encode_time(received_time):
+    if received_time is None:
+        return -1
+
+    if received_time.tzinfo is not None:
+        received_time = received_time.replace(tzinfo=None) - received_time.utcoffset()
+
+    delta = received_time - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _decode_time(encoded):
+    if encoded < 0:
+        return None
+
+    return _EPOCH + datetime.timedelta(microseconds=encoded)
+
+
+class ReportSpool(object):
+    """A persistent, thread-safe queue of reports waiting to be uploaded.
+
+    Args:
+        directory (str): The directory to store the spool in.  It is
+            created if it does not exist.
+        segment_size (int): The size in bytes after which a new segment
+            file is started.
+        sync (bool): Call fsync after every write so that reports survive
+            a power failure, not just a crash of this process.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, directory, segment_size=4*1024*1024, sync=True):
+        if segment_size <= 0:
+            raise ArgumentError("Spool segment size must be positive", segment_size=segment_size)
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sync = sync
+
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._claimed = set()
+        self._done_records = 0
+        self._next_id = 1
+
+        self._load_index()
+
+        segments = self._list_segments()
+        self._segment = max(segments) if len(segments) > 0 else 1
+        self._segment_file = self._open_append(self._segment_path(self._segment))
+
+    @classmethod
+    def _open_append(cls, path):
+        outfile = open(path, "ab")
+        outfile.seek(0, os.SEEK_END)
+        return outfile
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, "segment-%08d.bin" % segment)
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.directory, "index.bin")
+
+    def _list_segments(self):
+        segments = []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT_NAME.match(name)
+            if match is not None:
+                segments.append(int(match.group(1)))
+
+        return segments
+
+    def _load_index(self):
+        """Rebuild the list of pending reports from the index file."""
+
+        path = self._index_path
+        data = b''
+        if os.path.exists(path):
+            with open(path, "rb") as infile:
+                data = infile.read()
+
+        valid = len(data) - (len(data) % _INDEX_RECORD.size)
+        if valid != len(data):
+            self.logger.warning("Discarding partial record at end of spool index %s", path)
+
+        for offset in range(0, valid, _INDEX_RECORD.size):
+            kind, streamer, entry_id, segment, seg_offset, length, device, lowest_id, highest_id = _INDEX_RECORD.unpack_from(data, offset)
+
+            if kind == _ADD_RECORD:
+                self._entries[entry_id] = SpoolEntry(entry_id, device, streamer, lowest_id, highest_id, segment, seg_offset, length)
+            elif kind == _DONE_RECORD:
+                self._entries.pop(entry_id, None)
+                self._done_records += 1
+            else:
+                raise DataError("Corrupt record in spool index", path=path, offset=offset, kind=kind)
+
+            self._next_id = max(self._next_id, entry_id + 1)
+
+        self._index_file = self._open_append(path)
+        if valid != len(data):
+            self._index_file.truncate(valid)
+            self._index_file.seek(0, os.SEEK_END)
+
+    def _flush(self, outfile):
+        outfile.flush()
+        if self.sync:
+            os.fsync(outfile.fileno())
+
+    def add(self, report, claim=False):
+        """Durably store a report.
+
+        Args:
+            report (IOTileReport): The report to store.
+            claim (bool): Mark the report as claimed so that it is not
+                returned by claim_pending() until release() is called.  Use
+                this if you are going to upload the report yourself.
+
+        Returns:
+            SpoolEntry: The entry describing where the report is stored.
+        """
+
+        encoded = bytes(report.encode())
+        header = _RECORD_HEADER.pack(len(encoded), zlib.crc32(encoded) & 0xFFFFFFFF, _encode_time(report.received_time))
+
+        device = report.origin or 0
+        streamer = getattr(report, 'origin_streamer', None) or 0
+        lowest_id = getattr(report, 'lowest_id', None) or 0
+        highest_id = getattr(report, 'highest_id', None) or 0
+
+        with self._lock:
+            if self._segment_file.tell() > 0 and self._segment_file.tell() + len(header) + len(encoded) > self.segment_size:
+                self._segment_file.close()
+                self._segment += 1
+                self._segment_file = self._open_append(self._segment_path(self._segment))
+
+            offset = self._segment_file.tell()
+            self._segment_file.write(header)
+            self._segment_file.write(encoded)
+            self._flush(self._segment_file)
+
+            entry = SpoolEntry(self._next_id, device, streamer, lowest_id, highest_id, self._segment, offset, len(header) + len(encoded))
+            self._next_id += 1
+
+            self._index_file.write(_INDEX_RECORD.pack(_ADD_RECORD, streamer, entry.entry_id, entry.segment, offset, entry.length,
+                                                      device, lowest_id, highest_id))
+            self._flush(self._index_file)
+
+            self._entries[entry.entry_id] = entry
+            if claim:
+                self._claimed.add(entry.entry_id)
+
+        return entry
+
+    def pending(self):
+        """Get all reports that have not been uploaded yet.
+
+        Returns:
+            list of SpoolEntry: The pending entries in the order they were added.
+        """
+
+        with self._lock:
+            return sorted(self._entries.values(), key=lambda x: x.entry_id)
+
+    def claim_pending(self):
+        """Get and claim all pending reports that are not already claimed.
+
+        Returns:
+            list of SpoolEntry: The newly claimed entries in the order they
+                were added.
+        """
+
+        with self._lock:
+            entries = sorted((x for x in self._entries.values() if x.entry_id not in self._claimed), key=lambda x: x.entry_id)
+            self._claimed.update(x.entry_id for x in entries)
+
+        return entries
+
+    def release(self, entry):
+        """Release a claimed entry so that it can be claimed again."""
+
+        with self._lock:
+            self._claimed.discard(entry.entry_id)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def read(self, entry):
+        """Load a stored report.
+
+        Args:
+            entry (SpoolEntry): The entry to load.
+
+        Returns:
+            IOTileReport: The report.  It is created in lazy mode so its readings
+                are only decoded if they are accessed.
+        """
+
+        with self._lock:
+            if entry.segment == self._segment:
+                self._segment_file.flush()
+
+        with open(self._segment_path(entry.segment), "rb") as infile:
+            infile.seek(entry.offset)
+            data = infile.read(entry.length)
+
+        if len(data) != entry.length:
+            raise DataError("Spool segment is truncated", segment=entry.segment, offset=entry.offset, length=entry.length)
+
+        length, crc, received_time = _RECORD_HEADER.unpack_from(data)
+        encoded = data[_RECORD_HEADER.size:]
+
+        if length != len(encoded) or (zlib.crc32(encoded) & 0xFFFFFFFF) != crc:
+            raise DataError("Corrupt report in spool", segment=entry.segment, offset=entry.offset)
+
+        serialized = {
+            'report_format': bytearray(encoded)[0],
+            'encoded_report': encoded,
+            'received_time': _decode_time(received_time)
+        }
+
+        # Spooled reports are only uploaded as they are so there is no need to decode their readings
+        return IOTileReportParser.DeserializeReport(serialized, lazy=True)
+
+    def mark_uploaded(self, entries):
+        """Remove reports from the spool once they have reached the cloud.
+
+        Args:
+            entries (list of SpoolEntry): The entries that were uploaded.
+                A single entry may also be passed.
+        """
+
+        if isinstance(entries, SpoolEntry):
+            entries = [entries]
+
+        with self._lock:
+            self._mark_uploaded(entries)
+
+    def _mark_uploaded(self, entries):
+        """Record that entries were uploaded.  Must be called with the lock held."""
+
+        for entry in entries:
+            if self._entries.pop(entry.entry_id, None) is None:
+                continue
+
+            self._claimed.discard(entry.entry_id)
+            self._index_file.write(_INDEX_RECORD.pack(_DONE_RECORD, 0, entry.entry_id, 0, 0, 0, 0, 0, 0))
+            self._done_records += 1
+
+        self._flush(self._index_file)
+
+    def discard_acknowledged(self, device, streamer, highest_ack):
+        """Remove all reports that the cloud has already acknowledged.
+
+        Args:
+            device (int): The device whose reports should be checked.
+            streamer (int): The streamer on the device.
+            highest_ack (int): The highest reading id acknowledged by the cloud.
+
+        Returns:
+            int: The number of reports that were removed.
+        """
+
+        # Entries are chosen and removed without releasing the lock so that a drainer cannot claim them in between
+        with self._lock:
+            entries = [x for x in self._entries.values() if x.device == device and x.streamer == streamer and
+                       x.highest_id != 0 and x.highest_id <= highest_ack and x.entry_id not in self._claimed]
+            self._mark_uploaded(entries)
+
+        return len(entries)
+
+    def compact(self):
+        """Delete segments that only contain uploaded reports and shrink the index.
+
+        The index is only rewritten when most of its records describe reports
+        that have already been uploaded.
+        """
+
+        with self._lock:
+            live_segments = set(x.segment for x in self._entries.values())
+
+            for segment in self._list_segments():
+                if segment != self._segment and segment not in live_segments:
+                    os.remove(self._segment_path(segment))
+
+            if self._done_records == 0 or self._done_records < len(self._entries):
+                return
+
+            temp_path = self._index_path + ".tmp"
+            with open(temp_path, "wb") as outfile:
+                for entry in sorted(self._entries.values(), key=lambda x: x.entry_id):
+                    outfile.write(_INDEX_RECORD.pack(_ADD_RECORD, entry.streamer, entry.entry_id, entry.segment, entry.offset,
+                                                     entry.length, entry.device, entry.lowest_id, entry.highest_id))
+                self._flush(outfile)
+
+            self._index_file.close()
+
+            # Windows cannot rename over an existing file
+            if os.name == 'nt':
+                os.remove(self._index_path)
+
+            os.rename(temp_path, self._index_path)
+            self._index_file = self._open_append(self._index_path)
+            self._done_records = 0
+
+    def close(self):
+        """Close the spool's files."""
+
+        with self._lock:
+            self._segment_file.close()
+            self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SpoolDrainer(object):
+    """Upload the reports stored in a ReportSpool in the background.
+
+    Each pass claims every pending report, discards any whose readings the
+    cloud has already acknowledged and uploads the rest.  Reports that fail
+    to upload are left in the spool and retried on the next pass.
+
+    Args:
+        spool (ReportSpool): The spool to drain.
+        cloud (IOTileCloud): The cloud connection to upload with.
+        interval (float): The number of seconds to wait between passes
+            when running in the background.
+        workers (int): The maximum number of reports to upload at once.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, spool, cloud, interval=30.0, workers=4):
+        self.spool = spool
+        self.cloud = cloud
+        self.interval = interval
+        self.workers = workers
+
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def drain_once(self):
+        """Try to upload every unclaimed report in the spool.
+
+        Returns:
+            (int, int, int): The number of reports uploaded, the number
+                discarded because they were already acknowledged and the
+                number that failed and remain in the spool.
+        """
+
+        entries = self.spool.claim_pending()
+        if len(entries) == 0:
+            return 0, 0, 0
+
+        acks = {}
+        to_upload = []
+        discarded = []
+
+        for entry in entries:
+            key = (entry.device, entry.streamer)
+            if key not in acks:
+                try:
+                    acks[key] = self.cloud.highest_acknowledged(entry.device, entry.streamer)
+                except IOTileException as exc:
+                    self.logger.warning("Could not get acknowledgement for device 0x%X streamer %d: %s", entry.device, entry.streamer, str(exc))
+                    acks[key] = None
+
+            ack = acks[key]
+            if ack is not None and entry.highest_id != 0 and entry.highest_id <= ack:
+                discarded.append(entry)
+            else:
+                to_upload.append(entry)
+
+        self.spool.mark_uploaded(discarded)
+
+        uploaded = 0
+        failed = 0
+        with ReportUploader(self.cloud, workers=self.workers) as uploader:
+            futures = []
+            for entry in to_upload:
+                try:
+                    report = self.spool.read(entry)
+                except IOTileException as exc:
+                    self.logger.error("Dropping unreadable report %d from spool: %s", entry.entry_id, str(exc))
+                    self.spool.mark_uploaded(entry)
+                    continue
+
+                futures.append((entry, uploader.submit(report)))
+
+            for entry, future in futures:
+                if future.result().succeeded:
+                    self.spool.mark_uploaded(entry)
+                    uploaded += 1
+                else:
+                    self.spool.release(entry)
+                    failed += 1
+
+        self.spool.compact()
+
+        self.logger.info("Drained spool: %d uploaded, %d already acknowledged, %d failed", uploaded, len(discarded), failed)
+        return uploaded, len(discarded), failed
+
+    def start(self):
+        """Start draining the spool in a background thread."""
+
+        if self._thread is not None:
+            raise ArgumentError("SpoolDrainer is already running")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="SpoolDrainer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def wake(self):
+        """Start the next pass immediately instead of waiting for the interval."""
+
+        self._wake.set()
+
+    def stop(self):
+        """Stop the background thread after its current pass finishes."""
+
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.drain_once()
+            except Exception:  #pylint:disable=broad-except;The background thread must keep running
+                self.logger.exception("Error draining report spool")
+
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -0,0 +1,318 @@
+"""A pipelined uploader that sends many reports to iotile.cloud concurrently.
+
+IOTileCloud.upload_report sends a single report and waits for the cloud to
+respond before returning.  When a device has buffered a lot of data, it will
+send many reports in a row and uploading them one after another leaves the
+connection idle while each report is processed by the server.
+
+ReportUploader accepts reports as they arrive and uploads them on a bounded
+pool of worker threads that share IOTileCloud's persistent HTTP session, so
+TCP and TLS connections are reused between reports.  Uploads that fail
+because of a connection problem or a server error are retried with
+exponential backoff.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from monotonic import monotonic
+import requests
+from iotile_cloud.api.exceptions import HttpServerError
+from iotile.core.exceptions import ArgumentError
+
+
+class UploadResult(object):
+    """The outcome of uploading a single report.
+
+    Args:
+        report (IOTileReport): The report that was uploaded.
+        size (int): The size of the encoded report in bytes.
+        latency (float): The number of seconds from when the first upload
+            attempt started until the last attempt finished, including any
+            time spent waiting to retry.
+        attempts (int): The number of times the upload was attempted.
+        count (int): The number of new readings that the cloud accepted or
+            None if the upload failed.
+        error (str): A description of why the upload failed or None if it
+            succeeded.
+        finish_time (float): The monotonic clock time when the upload
+            finished.  Defaults to the current time.
+    """
+
+    def __init__(self, report, size, latency, attempts, count=None, error=None, finish_time=None):
+        if finish_time is None:
+            finish_time = monotonic()
+
+        self.report = report
+        self.size = size
+        self.latency = latency
+        self.attempts = attempts
+        self.count = count
+        self.error = error
+        self.finish_time = finish_time
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+    @property
+    def bytes_per_second(self):
+        """The effective upload rate of this report."""
+
+        if self.latency <= 0.0:
+            return 0.0
+
+        return self.size / self.latency
+
+
+class ReportUploader(object):
+    """Upload reports to iotile.cloud concurrently as they are received.
+
+    Reports are passed to submit() and uploaded in the background.  At most
+    max_pending reports are held at once, after which submit() blocks until
+    an upload finishes, so a fast producer cannot buffer an unbounded
+    number of reports in memory.  Call wait() to block until uploads have
+    finished and get their results.  Only counters are kept about finished
+    uploads, so a long lived uploader does not hold on to old reports.
+
+    Args:
+        cloud (IOTileCloud): The cloud connection to upload reports with.
+        workers (int): The maximum number of uploads in progress at once.
+        max_pending (int): The maximum number of reports that may be
+            submitted but not yet uploaded.  Defaults to twice the number
+            of workers.
+        retries (int): How many times a failed upload is retried before
+            giving up.
+        backoff (float): The number of seconds to wait before the first
+            retry.  The delay doubles after each failed attempt.
+        max_backoff (float): The maximum number of seconds to wait between
+            attempts.
+        spool (ReportSpool): An optional spool that every submitted report
+            is written to before it is uploaded.  Reports are removed from
+            the spool once they are uploaded, so any that fail stay on disk
+            and can be sent later by a SpoolDrainer.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    # Errors that could succeed if the upload is tried again
+    RETRYABLE_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout, HttpServerError)
+
+    def __init__(self, cloud, workers=4, max_pending=None, retries=3, backoff=0.5, max_backoff=10.0, spool=None):
+        if workers < 1:
+            raise ArgumentError("ReportUploader must have at least one worker", workers=workers)
+
+        if max_pending is None:
+            max_pending = 2 * workers
+
+        if max_pending < workers:
+            raise ArgumentError("max_pending must be at least as large as workers", workers=workers, max_pending=max_pending)
+
+        if retries < 0:
+            raise ArgumentError("retries cannot be negative", retries=retries)
+
+        self.cloud = cloud
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.spool = spool
+
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._succeeded = 0
+        self._failed = 0
+        self._bytes = 0
+        self._stop = threading.Event()
+        self._start_time = None
+        self._finish_time = None
+
+    def submit(self, report):
+        """Queue a report for upload.
+
+        This method blocks if max_pending reports are already waiting to
+        be uploaded.
+
+        Args:
+            report (IOTileReport): The report to upload.
+
+        Returns:
+            Future: A future that resolves to the report's UploadResult.
+        """
+
+        if self._start_time is None:
+            self._start_time = monotonic()
+
+        entry = None
+        if self.spool is not None:
+            entry = self.spool.add(report, claim=True)
+
+        self._pending.acquire()
+
+        try:
+            future = self._executor.submit(self._upload, report)
+        except Exception:
+            self._pending.release()
+            if entry is not None:
+                self.spool.release(entry)
+            raise
+
+        with self._lock:
+            self._in_flight.add(future)
+
+        future.add_done_callback(lambda x: self._finish(x, entry))
+        return future
+
+    def upload_all(self, reports):
+        """Upload every report from an iterable and wait for them to finish.
+
+        Reports are submitted as soon as the iterable produces them so a
+        generator that is still receiving reports can be passed.
+
+        Args:
+            reports (iterable of IOTileReport): The reports to upload.
+
+        Returns:
+            list of UploadResult: The results of every report in reports, in
+                the order they were submitted.
+        """
+
+        futures = [self.submit(report) for report in reports]
+        return self.wait(futures)
+
+    def wait(self, futures=None):
+        """Wait for reports to finish uploading.
+
+        Args:
+            futures (list of Future): The futures returned by submit() for the
+                uploads to wait for.  If None, wait for every upload that is
+                currently in progress.
+
+        Returns:
+            list of UploadResult: The results of the uploads waited for, in the
+                order of futures.
+        """
+
+        if futures is None:
+            with self._lock:
+                futures = list(self._in_flight)
+
+        return [x.result() for x in futures]
+
+    @property
+    def statistics(self):
+        """Summary statistics about all finished uploads.
+
+        Returns:
+            dict: The number of uploads that succeeded and failed, the total
+                bytes uploaded successfully, the elapsed time from when the
+                first report was submitted until the last upload finished and
+                the overall upload rate in bytes per second.
+        """
+
+        with self._lock:
+            succeeded = self._succeeded
+            failed = self._failed
+            total_bytes = self._bytes
+
+        elapsed = 0.0
+        if self._start_time is not None and self._finish_time is not None:
+            elapsed = self._finish_time - self._start_time
+
+        rate = 0.0
+        if elapsed > 0.0:
+            rate = total_bytes / elapsed
+
+        return {
+            'succeeded': succeeded,
+            'failed': failed,
+            'bytes': total_bytes,
+            'elapsed': elapsed,
+            'bytes_per_second': rate
+        }
+
+    def close(self, wait=True):
+        """Stop the worker threads.
+
+        Args:
+            wait (bool): Wait for queued uploads to finish.  If False, any
+                pending retries are abandoned and reported as failures.
+        """
+
+        if not wait:
+            self._stop.set()
+
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _finish(self, future, entry):
+        succeeded = not future.cancelled() and future.exception() is None and future.result().succeeded
+
+        with self._lock:
+            self._in_flight.discard(future)
+
+        self._pending.release()
+
+        if entry is None:
+            return
+
+        if succeeded:
+            self.spool.mark_uploaded(entry)
+        else:
+            self.spool.release(entry)
+
+    def _upload(self, report):
+        """Upload a single report, retrying if needed."""
+
+        result = self._try_upload(report)
+
+        # Count the result before the future resolves so statistics are current once wait() returns
+        with self._lock:
+            if result.succeeded:
+                self._succeeded += 1
+                self._bytes += result.size
+            else:
+                self._failed += 1
+
+            self._finish_time = monotonic()
+
+        return result
+
+    def _try_upload(self, report):
+
+        size = len(report.encode())
+        report_id = getattr(report, 'report_id', None)
+        start = monotonic()
+        delay = self.backoff
+        attempts = 0
+
+        while True:
+            attempts += 1
+
+            try:
+                count = self.cloud.upload_report(report)
+                break
+            except self.RETRYABLE_ERRORS as exc:
+                if attempts > self.retries or self._stop.is_set():
+                    self.logger.error("Giving up uploading report %s after %d attempts: %s", report_id, attempts, str(exc))
+                    return UploadResult(report, size, monotonic() - start, attempts, error=str(exc))
+
+                self.logger.warning("Error uploading report %s, retrying in %.1f seconds: %s", report_id, delay, str(exc))
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.max_backoff)
+            except Exception as exc:  #pylint:disable=broad-except;We need to report all errors in the result
+                self.logger.error("Error uploading report %s: %s", report_id, str(exc))
+                return UploadResult(report, size, monotonic() - start, attempts, error=str(exc))
+
+        result = UploadResult(report, size, monotonic() - start, attempts, count=count)
+        self.logger.info("Uploaded report %s (%d bytes) in %.3f seconds, %.0f bytes/s", report_id, size, result.latency,
+                         result.bytes_per_second)
+
+        return result
@@ -0,0 +1,101 @@
+"""A gateway agent that spools reports passing through iotile-gateway for upload to iotile.cloud."""
+
+import logging
+from iotile.core.exceptions import ArgumentError
+from iotile.core.hw.reports import SignedListReport
+from .cloud import IOTileCloud
+from .report_spool import ReportSpool, SpoolDrainer
+
+
+class CloudSpoolAgent(object):
+    """Save signed reports received by an iotile-gateway and upload them to iotile.cloud.
+
+    Every SignedListReport that one of the configured devices streams
+    through the gateway is durably stored in a ReportSpool as soon as it is
+    received.  A SpoolDrainer uploads the spooled reports in the background
+    so that reports received while the gateway has no connectivity are
+    uploaded once it comes back, including after a restart.
+
+    The agent takes the following arguments in args:
+        spool (str): The directory to store the spool in.  Required.
+        devices (list of int): The uuids of the devices whose reports should
+            be spooled.
+        interval (float): The number of seconds between upload passes.
+            Defaults to 30 seconds.  A pass is also started whenever a report
+            is spooled.
+        workers (int): The maximum number of reports to upload at once.
+            Defaults to 4.
+        domain (str): The iotile.cloud server to upload to.  Defaults to
+            the server configured in the ComponentRegistry.
+
+    Args:
+        args (dict): A dictionary of arguments for configuring this agent.
+        manager (DeviceManager): A device manager provided by iotile-gateway.
+        loop (IOLoop): A tornado IOLoop that this agent should integrate into.
+    """
+
+    def __init__(self, args, manager, loop):
+        if 'spool' not in args:
+            raise ArgumentError("You must specify a spool directory for the cloud spool agent", args=args)
+
+        self._args = args
+        self._manager = manager
+        self._loop = loop
+        self._monitors = []
+        self._logger = logging.getLogger(__name__)
+
+        self.spool = None
+        self.drainer = None
+
+    def start(self):
+        """Open the spool, start uploading and watch for reports.
+
+        Called before the event loop is running
+        """
+
+        cloud = IOTileCloud(domain=self._args.get('domain'))
+
+        self.spool = ReportSpool(self._args['spool'])
+        self.drainer = SpoolDrainer(self.spool, cloud, interval=self._args.get('interval', 30.0),
+                                    workers=self._args.get('workers', 4))
+
+        for device_uuid in self._args.get('devices', []):
+            self._monitors.append(self._manager.register_monitor(device_uuid, ['report'], self._on_report))
+
+        self._logger.info("Spooling reports from %d devices in %s, %d reports waiting to be uploaded",
+                          len(self._monitors), self._args['spool'], len(self.spool))
+        self.drainer.start()
+
+    def stop(self):
+        """Stop watching for reports and uploading them.
+
+        Called with the event loop running
+        """
+
+        for monitor in self._monitors:
+            self._manager.remove_monitor(monitor)
+
+        self._monitors = []
+
+        if self.drainer is not None:
+            self.drainer.stop()
+
+        if self.spool is not None:
+            self.spool.close()
+
+    def _on_report(self, device_uuid, event_name, report):
+        """Spool a report received from a device.
+
+        This routine is called synchronously in the event loop by the DeviceManager
+        """
+
+        if not isinstance(report, SignedListReport):
+            return
+
+        try:
+            self.spool.add(report)
+        except Exception:  #pylint:disable=broad-except;We are in the event loop with no one to raise to
+            self._logger.exception("Could not spool report from device 0x%X", device_uuid)
+            return
+
+        self.drainer.wake()
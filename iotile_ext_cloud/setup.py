@@ -9,13 +9,17 @@ setup(
     license="LGPLv3",
     install_requires=[
         "iotile-core>=3.6.2",
-        "iotile_cloud>=0.8.11"
+        "iotile_cloud>=0.8.11",
+        "requests",
+        "monotonic",
+        "futures; python_version < '3.0'"
     ],
 
     entry_points={'iotile.config_function': ['link_cloud = iotile.cloud.config:link_cloud'],
                   'iotile.config_variables': ['iotile-ext-cloud = iotile.cloud.config:get_variables'],
                   'iotile.plugin': ['cloud = iotile.cloud.plugin:setup_plugin'],
-                  'iotile.app': ['cloud_uploader = iotile.cloud.apps.cloud_uploader']},
+                  'iotile.app': ['cloud_uploader = iotile.cloud.apps.cloud_uploader'],
+                  'iotile.gateway_agent': ['cloud_spool = iotile.cloud.spool_agent:CloudSpoolAgent']},
 
     description="IOTile.cloud integration into CoreTools",
     author="Arch",
@@ -1,6 +1,10 @@
 """Local fixtures for testing iotile-ext-cloud."""
 
+import json
+import threading
 import pytest
+from pytest_localserver.http import WSGIServer
+from werkzeug.wrappers import Request, Response
 from iotile.core.dev.registry import ComponentRegistry
 from iotile.cloud.cloud import IOTileCloud
 
@@ -38,3 +42,55 @@ def basic_cloud(mock_cloud_private_nossl):
     cloud.quick_add_dt(slug="internaltestingtemplate-v0-1-1", os_tag=235)
 
     yield client, proj_id, cloud
+
+
+class FlakyReportServer(object):
+    """A stand-in report endpoint that fails the first few uploads."""
+
+    def __init__(self, failures, status=503):
+        self.failures = failures
+        self.status = status
+        self.uploads = 0
+        self.attempts = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        req = Request(environ)
+        if req.method != 'POST':
+            return Response(b"Page not found.", status=404)(environ, start_response)
+
+        with self._lock:
+            self.attempts += 1
+            fail = self.attempts <= self.failures
+            if not fail:
+                self.uploads += 1
+
+        if fail:
+            resp = Response(b"Error serving request\n", status=self.status)
+        else:
+            data = req.files['file'].read()
+            resp = Response(json.dumps({'count': (len(data) - 44) // 16}).encode('utf-8'), status=200,
+                            headers=[('Content-type', 'application/json')])
+
+        return resp(environ, start_response)
+
+
+@pytest.fixture
+def flaky_cloud(request):
+    """Create an IOTileCloud connected to a FlakyReportServer."""
+
+    failures, status = request.param
+
+    ComponentRegistry.SetBackingStore('memory')
+    reg = ComponentRegistry()
+    reg.set_config('arch:cloud_token', 'JWT_USER')
+    reg.set_config('arch:cloud_token_type', 'jwt')
+
+    app = FlakyReportServer(failures, status)
+    server = WSGIServer(application=app)
+    server.start()
+
+    try:
+        yield IOTileCloud(domain=server.url), app
+    finally:
+        server.stop()
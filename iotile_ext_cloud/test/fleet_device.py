@@ -0,0 +1,20 @@
+"""A virtual device with a single streamer for testing fleet uploads."""
+
+import struct
+import iotile.mock.devices.report_test_device as report_test_device
+from iotile.core.hw.virtual.virtualdevice import rpc
+
+
+class FleetTestDevice(report_test_device.ReportTestDevice):
+    """A ReportTestDevice that only has streamer 0 and streams signed lists."""
+
+    def __init__(self, args):
+        args.setdefault('format', 'signed_list')
+        super(FleetTestDevice, self).__init__(args)
+
+    @rpc(8, 0x200a, "H")
+    def query_streamer(self, index):
+        if index > 0:
+            return struct.pack("<L", 0x8003801f)
+
+        return struct.pack("<LLLLBBBx", 0, 0, 0, self.acks.get(index, 0), 0, 0, 0)
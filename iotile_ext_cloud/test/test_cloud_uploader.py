@@ -0,0 +1,119 @@
+"""Test uploading data from a fleet of virtual devices with CloudUploader."""
+
+import os
+import json
+import base64
+import pytest
+from iotile.core.hw.hwmanager import HardwareManager
+from iotile.cloud.apps.cloud_uploader import CloudUploader
+
+DEVICE_SCRIPT = os.path.join(os.path.dirname(__file__), 'fleet_device.py')
+
+
+def _virtual_port(device_ids, num_readings=25):
+    devices = []
+    for device_id in device_ids:
+        config = {'iotile_id': device_id, 'num_readings': num_readings, 'report_length': 10}
+        encoded = base64.b64encode(json.dumps(config).encode('utf-8')).decode('utf-8')
+        devices.append("{}@#{}".format(DEVICE_SCRIPT, encoded))
+
+    return 'virtual:' + ';'.join(devices)
+
+
+@pytest.fixture
+def adapters():
+    """Two independent adapters that can both see devices 1 through 5."""
+
+    hardware = [HardwareManager(port=_virtual_port(range(1, 6))) for _i in range(0, 2)]
+
+    yield hardware
+
+    for hw in hardware:
+        hw.close()
+
+
+def test_fleet_acknowledgements(basic_cloud):
+    """Make sure we can fetch acknowledgements for many devices at once."""
+
+    cloud, _proj_id, _server = basic_cloud
+
+    acks = cloud.fleet_acknowledgements([1, 2, 3, 10], page_size=3)
+
+    assert sorted(acks) == [1, 2, 3, 10]
+    assert acks[10] == []
+
+    for device_id in (1, 2, 3):
+        assert sorted(acks[device_id]) == sorted(cloud.device_acknowledgements(device_id))
+
+
+def test_fleet_acknowledgements_paging(basic_cloud, monkeypatch):
+    """Make sure every page is fetched when the server does not report a count."""
+
+    cloud, _proj_id, server = basic_cloud
+    paginate = server._paginate
+
+    def _paginate(results, request, default_page_size):
+        data = paginate(results, request, default_page_size)
+        del data['count']
+
+        page = int(request.args.get('page', 1))
+        page_size = int(request.args.get('page_size', default_page_size))
+        if page*page_size < len(results):
+            data['next'] = 'page {}'.format(page + 1)
+
+        return data
+
+    monkeypatch.setattr(server, '_paginate', _paginate)
+
+    acks = cloud.fleet_acknowledgements([1, 2, 10], page_size=1)
+
+    assert acks[10] == []
+    for device_id in (1, 2):
+        assert len(acks[device_id]) == 2
+        assert sorted(acks[device_id]) == sorted(cloud.device_acknowledgements(device_id))
+
+
+def test_fleet_upload(basic_cloud, adapters):
+    """Make sure we can collect and upload reports from many devices in parallel."""
+
+    cloud, _proj_id, server = basic_cloud
+
+    result = CloudUploader.UploadFleet(adapters, [1, 2, 3, 4, 5, 7], cloud=cloud, workers=3)
+
+    assert [x.device_id for x in result.devices] == [1, 2, 3, 4, 5, 7]
+
+    missing = result.devices[-1]
+    assert missing.error is not None
+    assert result.failed == [missing]
+
+    for device in result.devices[:-1]:
+        assert device.succeeded
+        assert len(device.uploads) == 3
+        assert device.total_time >= device.connect_time + device.stream_time
+
+    assert len(server.reports) == 15
+    assert result.devices_per_hour > 0
+
+    # Each device was acknowledged with the cloud's value for streamer 0
+    # before streaming so its readings started from there.
+    assert cloud.highest_acknowledged(1, 0) == 124
+
+
+def test_fleet_disconnect_error(basic_cloud, adapters, monkeypatch):
+    """Make sure an adapter keeps processing devices when disconnecting fails."""
+
+    cloud, _proj_id, server = basic_cloud
+    hw = adapters[0]
+    real_disconnect = hw.disconnect
+
+    def _failing_disconnect():
+        real_disconnect()
+        raise RuntimeError("Disconnection failed")
+
+    monkeypatch.setattr(hw, 'disconnect', _failing_disconnect)
+
+    result = CloudUploader.UploadFleet([hw], [1, 2, 3], cloud=cloud, workers=2)
+
+    assert [x.device_id for x in result.devices] == [1, 2, 3]
+    assert all(x.succeeded for x in result.devices)
+    assert len(server.reports) == 9
@@ -0,0 +1,224 @@
+"""Test the persistent report spool and its background drainer."""
+
+import os
+import time
+import pytest
+from builtins import range
+from iotile.core.exceptions import ArgumentError
+from iotile.core.hw.reports import SignedListReport, IOTileReading
+from iotile.cloud.report_spool import ReportSpool, SpoolDrainer
+from iotile.cloud.report_uploader import ReportUploader
+from iotile.cloud.spool_agent import CloudSpoolAgent
+
+
+def make_report(device_id, first_id, count, streamer=0):
+    readings = [IOTileReading(i, 0x5000, i, reading_id=first_id + i) for i in range(0, count)]
+    return SignedListReport.FromReadings(device_id, readings, report_id=first_id, streamer=streamer)
+
+
+def test_spool_roundtrip(tmpdir):
+    """Make sure reports survive closing and reopening the spool."""
+
+    path = str(tmpdir.join('spool'))
+    reports = [make_report(1, 1 + 10*i, 10) for i in range(0, 5)]
+
+    with ReportSpool(path, sync=False) as spool:
+        entries = [spool.add(x) for x in reports]
+        spool.mark_uploaded(entries[1])
+
+    with ReportSpool(path, sync=False) as spool:
+        pending = spool.pending()
+        assert [x.entry_id for x in pending] == [entries[0].entry_id] + [x.entry_id for x in entries[2:]]
+        assert pending[0].device == 1
+        assert pending[0].streamer == 0
+        assert (pending[0].lowest_id, pending[0].highest_id) == (1, 10)
+
+        loaded = spool.read(pending[-1])
+        assert isinstance(loaded, SignedListReport)
+        assert loaded.encode() == reports[-1].encode()
+        assert loaded.received_time == reports[-1].received_time
+        assert not loaded.decoded
+        assert loaded.visible_readings == reports[-1].visible_readings
+
+        new_entry = spool.add(make_report(1, 100, 1))
+        assert new_entry.entry_id > entries[-1].entry_id
+
+
+def test_spool_partial_index(tmpdir):
+    """Make sure a torn write at the end of the index is discarded."""
+
+    path = str(tmpdir.join('spool'))
+
+    with ReportSpool(path, sync=False) as spool:
+        spool.add(make_report(1, 1, 10))
+        spool.add(make_report(1, 11, 10))
+
+    with open(os.path.join(path, 'index.bin'), "ab") as outfile:
+        outfile.write(b'\x01\x00\x00')
+
+    with ReportSpool(path, sync=False) as spool:
+        assert len(spool) == 2
+        entry = spool.add(make_report(1, 21, 10))
+
+    with ReportSpool(path, sync=False) as spool:
+        assert len(spool) == 3
+        assert spool.read(entry).highest_id == 30
+
+
+def test_spool_segments(tmpdir):
+    """Make sure segments roll over and are deleted once uploaded."""
+
+    path = str(tmpdir.join('spool'))
+
+    with pytest.raises(ArgumentError):
+        ReportSpool(path, segment_size=0)
+
+    with ReportSpool(path, segment_size=200, sync=False) as spool:
+        entries = [spool.add(make_report(1, 1 + 10*i, 10)) for i in range(0, 6)]
+
+        segments = sorted(set(x.segment for x in entries))
+        assert len(segments) == 6
+
+        spool.mark_uploaded(entries[:4])
+        spool.compact()
+
+        remaining = sorted(x for x in os.listdir(path) if x.startswith('segment'))
+        assert remaining == ['segment-%08d.bin' % x for x in segments[4:]]
+
+        # The index was rewritten since most of it described uploaded reports
+        assert os.path.getsize(os.path.join(path, 'index.bin')) == 2 * 32
+
+    with ReportSpool(path, sync=False) as spool:
+        assert [x.entry_id for x in spool.pending()] == [x.entry_id for x in entries[4:]]
+        assert spool.discard_acknowledged(1, 0, 50) == 1
+        assert spool.discard_acknowledged(2, 0, 100) == 0
+        assert len(spool) == 1
+
+
+def test_discard_without_ids(tmpdir):
+    """Make sure reports without reading ids are never treated as acknowledged."""
+
+    path = str(tmpdir.join('spool'))
+    readings = [IOTileReading(i, 0x5000, i) for i in range(0, 5)]
+    no_ids = SignedListReport.FromReadings(1, readings, report_id=0, streamer=0)
+
+    with ReportSpool(path, sync=False) as spool:
+        entry = spool.add(no_ids)
+        spool.add(make_report(1, 1, 10))
+
+        assert entry.highest_id == 0
+        assert spool.discard_acknowledged(1, 0, 100) == 1
+        assert [x.entry_id for x in spool.pending()] == [entry.entry_id]
+
+
+def test_spool_drainer(basic_cloud, tmpdir):
+    """Make sure the drainer skips acknowledged reports and uploads the rest."""
+
+    cloud, _proj_id, server = basic_cloud
+
+    with ReportSpool(str(tmpdir.join('spool')), sync=False) as spool:
+        # The mock cloud has acknowledged up to 100 for streamer 0 of device 1
+        for i in range(0, 20):
+            spool.add(make_report(1, 1 + 10*i, 10))
+
+        claimed = spool.add(make_report(2, 200, 10), claim=True)
+
+        drainer = SpoolDrainer(spool, cloud)
+        assert drainer.drain_once() == (10, 10, 0)
+
+        assert len(server.reports) == 10
+        assert spool.pending() == [claimed]
+        assert cloud.highest_acknowledged(1, 0) == 200
+
+        spool.release(claimed)
+        drainer.start()
+        drainer.wake()
+        drainer.stop()
+
+        assert len(spool) == 0
+        assert len(server.reports) == 11
+
+
+@pytest.mark.parametrize('flaky_cloud', [(100, 503)], indirect=True)
+def test_uploader_spool(flaky_cloud, tmpdir):
+    """Make sure reports that fail to upload are kept in the spool."""
+
+    cloud, app = flaky_cloud
+    path = str(tmpdir.join('spool'))
+
+    with ReportSpool(path, sync=False) as spool:
+        with ReportUploader(cloud, workers=2, retries=1, backoff=0.01, spool=spool) as uploader:
+            results = uploader.upload_all([make_report(1, 1 + 10*i, 10) for i in range(0, 3)])
+
+        assert not any(x.succeeded for x in results)
+        assert len(spool.claim_pending()) == 3
+
+    app.failures = 0
+
+    with ReportSpool(path, sync=False) as spool:
+        with ReportUploader(cloud, workers=2, spool=spool) as uploader:
+            uploader.submit(make_report(1, 31, 10)).result()
+
+        assert len(spool) == 3
+
+        # The flaky server does not know about streamer acknowledgements
+        assert SpoolDrainer(spool, cloud).drain_once() == (3, 0, 0)
+        assert len(spool) == 0
+        assert app.uploads == 4
+
+
+class _MonitorManager(object):
+    """A stand-in DeviceManager that only keeps track of monitors."""
+
+    def __init__(self):
+        self.monitors = {}
+
+    def register_monitor(self, device_uuid, filter_names, callback):
+        monitor_id = "{}/{}".format(device_uuid, len(self.monitors))
+        self.monitors[monitor_id] = (device_uuid, filter_names, callback)
+        return monitor_id
+
+    def remove_monitor(self, monitor_id):
+        del self.monitors[monitor_id]
+
+    def call_monitor(self, device_uuid, event, *args):
+        for monitored_uuid, filter_names, callback in list(self.monitors.values()):
+            if monitored_uuid == device_uuid and event in filter_names:
+                callback(device_uuid, event, *args)
+
+
+def test_spool_agent(basic_cloud, tmpdir):
+    """Make sure the gateway agent spools and uploads reports from its devices."""
+
+    _cloud, _proj_id, server = basic_cloud
+    path = str(tmpdir.join('spool'))
+    manager = _MonitorManager()
+
+    agent = CloudSpoolAgent({'spool': path, 'devices': [2], 'interval': 60.0}, manager, None)
+    agent.start()
+
+    try:
+        manager.call_monitor(2, 'report', make_report(2, 101, 10))
+        manager.call_monitor(3, 'report', make_report(3, 101, 10))
+
+        # Spooling a report starts an upload pass without waiting for the interval
+        for _i in range(0, 100):
+            if len(agent.spool) == 0:
+                break
+
+            time.sleep(0.05)
+    finally:
+        agent.stop()
+
+    assert manager.monitors == {}
+    assert len(server.reports) == 1
+
+    with ReportSpool(path, sync=False) as spool:
+        assert len(spool) == 0
+
+
+def test_spool_agent_args():
+    """Make sure the agent requires a spool directory."""
+
+    with pytest.raises(ArgumentError):
+        CloudSpoolAgent({}, _MonitorManager(), None)
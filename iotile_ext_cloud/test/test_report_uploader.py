@@ -0,0 +1,106 @@
+"""Test the pipelined ReportUploader against local HTTP servers."""
+
+import pytest
+from builtins import range
+from iotile.core.exceptions import ArgumentError
+from iotile.core.hw.reports import SignedListReport, IOTileReading
+from iotile.cloud.report_uploader import ReportUploader
+
+
+def make_report(device_id, first_id, count):
+    readings = [IOTileReading(i, 0x5000, i, reading_id=first_id + i) for i in range(0, count)]
+    return SignedListReport.FromReadings(device_id, readings, report_id=first_id, streamer=0)
+
+
+def test_pipelined_upload(basic_cloud):
+    """Make sure we can upload many reports concurrently."""
+
+    cloud, _proj_id, server = basic_cloud
+
+    reports = [make_report(1, 1 + 10*i, 10) for i in range(0, 20)]
+
+    with ReportUploader(cloud, workers=4, max_pending=4) as uploader:
+        results = uploader.upload_all(x for x in reports)
+        stats = uploader.statistics
+
+    assert len(results) == 20
+    assert [x.report for x in results] == reports
+    assert all(x.succeeded for x in results)
+    assert all(x.count == 10 and x.attempts == 1 for x in results)
+    assert all(x.bytes_per_second > 0 for x in results)
+
+    assert len(server.reports) == 20
+    assert stats['succeeded'] == 20
+    assert stats['failed'] == 0
+    assert stats['bytes'] == sum(len(x.encode()) for x in reports)
+    assert stats['bytes_per_second'] > 0
+
+    assert cloud.highest_acknowledged(1, 0) == 200
+
+
+@pytest.mark.parametrize('flaky_cloud', [(2, 503)], indirect=True)
+def test_upload_retry(flaky_cloud):
+    """Make sure server errors are retried with backoff."""
+
+    cloud, app = flaky_cloud
+
+    with ReportUploader(cloud, workers=1, retries=3, backoff=0.01) as uploader:
+        result = uploader.submit(make_report(1, 1, 5)).result()
+
+    assert result.succeeded
+    assert result.attempts == 3
+    assert result.count == 5
+    assert app.uploads == 1
+
+
+@pytest.mark.parametrize('flaky_cloud', [(10, 503), (1, 400)], indirect=True)
+def test_upload_failure(flaky_cloud):
+    """Make sure failures are reported and client errors are not retried."""
+
+    cloud, app = flaky_cloud
+
+    with ReportUploader(cloud, workers=2, retries=2, backoff=0.01) as uploader:
+        results = uploader.upload_all([make_report(1, 1, 5)])
+
+    assert len(results) == 1
+    assert not results[0].succeeded
+    assert results[0].count is None
+
+    if app.status == 400:
+        assert results[0].attempts == 1
+    else:
+        assert results[0].attempts == 3
+
+    assert app.uploads == 0
+
+
+def test_uploader_arguments(basic_cloud):
+    """Make sure invalid uploader settings are rejected."""
+
+    cloud, _proj_id, _server = basic_cloud
+
+    with pytest.raises(ArgumentError):
+        ReportUploader(cloud, workers=0)
+
+    with pytest.raises(ArgumentError):
+        ReportUploader(cloud, workers=4, max_pending=2)
+
+    with pytest.raises(ArgumentError):
+        ReportUploader(cloud, retries=-1)
+
+
+def test_uploader_releases_reports(basic_cloud):
+    """Make sure finished uploads are not kept by a long lived uploader."""
+
+    cloud, _proj_id, _server = basic_cloud
+
+    with ReportUploader(cloud, workers=2) as uploader:
+        futures = [uploader.submit(make_report(1, 1 + 10*i, 10)) for i in range(0, 5)]
+        results = uploader.wait(futures)
+
+        assert all(x.succeeded for x in results)
+        assert uploader.statistics['succeeded'] == 5
+
+    # Once the workers have stopped every finished upload must have been released
+    assert len(uploader._in_flight) == 0
+    assert uploader.wait() == []
@@ -1 +1 @@
-version = "0.5.0"
+version = "0.6.0"
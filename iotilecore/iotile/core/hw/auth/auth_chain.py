@@ -1,6 +1,7 @@
 """An ordered list of authentication providers that are checked in turn to attempt a crypto operation
 """
 
+import threading
 import pkg_resources
 from iotile.core.exceptions import NotFoundError, ExternalError
 from .auth_provider import AuthProvider
@@ -18,18 +19,28 @@ class ChainedAuthProvider(AuthProvider):
     be tuples of (priority, auth_provider_class, arg_dict) where priority is an integer,
     auth_provider_class is an AuthProvider subclass and arg_dict is a dictionary of
     arguments passed to the constructor of auth_provider.
+
+    Scanning the installed entry points is slow so the results are cached
+    for the life of the process.  Most users should not construct their own
+    ChainedAuthProvider but should instead use the shared instance returned
+    by ChainedAuthProvider.Default().  If auth provider plugins are installed
+    or removed while the process is running, call ClearDefault() to force the
+    entry points to be scanned again.
     """
 
+    _lock = threading.Lock()
+    _installed_providers = None
+    _default_providers = None
+    _default_instance = None
+
     def __init__(self, args=None):
         super(ChainedAuthProvider, self).__init__(args)
 
         #FIXME: Allow overwriting default providers via args
-        self._load_installed_providers()
+        self._auth_factories, default_providers = self._load_installed_providers()
 
         sub_providers = []
-        for entry in pkg_resources.iter_entry_points('iotile.default_auth_providers'):
-            priority, provider, args = entry.load()
-
+        for priority, provider, args in default_providers:
             if provider not in self._auth_factories:
                 raise ExternalError("Default authentication provider list references unknown auth provider", provider_name=provider, known_providers=self._auth_factories.keys())
             configured = self._auth_factories[provider](args)
@@ -38,11 +49,75 @@ class ChainedAuthProvider(AuthProvider):
         sub_providers.sort(key=lambda x: x[0])
         self.providers = sub_providers
 
-    def _load_installed_providers(self):
-        self._auth_factories = {}
+    @classmethod
+    def _load_installed_providers(cls):
+        """Scan the installed auth provider entry points once per process.
+
+        Returns:
+            (dict, list): A map of auth provider names to classes and the
+                list of (priority, name, args) tuples for the default chain.
+        """
+
+        with cls._lock:
+            if cls._installed_providers is None:
+                factories = {}
+                for entry in pkg_resources.iter_entry_points('iotile.auth_provider'):
+                    factories[entry.name] = entry.load()
+
+                default_providers = [entry.load() for entry in pkg_resources.iter_entry_points('iotile.default_auth_providers')]
+
+                cls._installed_providers = factories
+                cls._default_providers = default_providers
+
+            return dict(cls._installed_providers), list(cls._default_providers)
+
+    @classmethod
+    def Default(cls):
+        """Get the shared, process-wide default ChainedAuthProvider.
+
+        The instance is created the first time it is needed and reused
+        until ClearDefault() is called.  It is safe to use from multiple
+        threads.
+
+        Returns:
+            ChainedAuthProvider: The shared default auth provider chain.
+        """
+
+        instance = cls._default_instance
+        if instance is not None:
+            return instance
+
+        instance = ChainedAuthProvider()
+
+        with cls._lock:
+            if cls._default_instance is None:
+                cls._default_instance = instance
+
+            return cls._default_instance
+
+    @classmethod
+    def ClearDefault(cls):
+        """Discard the shared default provider and the cached entry point scan.
+
+        The next call to Default() or ChainedAuthProvider() will rescan the
+        installed entry points and build a new provider chain.
+        """
+
+        with cls._lock:
+            cls._installed_providers = None
+            cls._default_providers = None
+            cls._default_instance = None
 
-        for entry in pkg_resources.iter_entry_points('iotile.auth_provider'):
-            self._auth_factories[entry.name] = entry.load()
+    def invalidate_keys(self, device_id=None):
+        """Forget any keys cached by any of our subproviders.
+
+        Args:
+            device_id (int): The device whose keys should be forgotten.  If
+                None, all cached keys are forgotten.
+        """
+
+        for _priority, provider in self.providers:
+            provider.invalidate_keys(device_id)
 
     def encrypt_report(self, device_id, root, data, **kwargs):
         """Encrypt a buffer of report data on behalf of a device.
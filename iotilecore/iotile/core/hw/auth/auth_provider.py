@@ -81,6 +81,19 @@ class AuthProvider(object):
         hmac_calc = hmac.new(root_key, signed_data, hashlib.sha256)
         return bytearray(hmac_calc.digest())
 
+    def invalidate_keys(self, device_id=None):
+        """Forget any keys cached by this auth provider.
+
+        Auth providers that cache root or derived keys must override this
+        method.  It should be called whenever device keys are rotated.
+
+        Args:
+            device_id (int): The device whose keys should be forgotten.  If
+                None, all cached keys are forgotten.
+        """
+
+        pass
+
     def encrypt_report(self, device_id, root, data, **kwargs):
         """Encrypt a buffer of report data on behalf of a device.
 
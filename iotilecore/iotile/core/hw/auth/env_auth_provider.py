@@ -2,10 +2,9 @@
 
 import hashlib
 import hmac
-import binascii
-import os
 from iotile.core.exceptions import NotFoundError
 from .auth_provider import AuthProvider
+from .key_provider import EnvKeyProvider, FileKeyProvider, LRUCache
 
 
 class EnvAuthProvider(AuthProvider):
@@ -17,34 +16,61 @@ class EnvAuthProvider(AuthProvider):
     for the environment variable USER_KEY_000000AB.
 
     The key must be a 64 character hex string that is decoded to create a 32 byte key.
+
+    Keys can also come from somewhere other than the environment by passing a
+    KeyProvider in args['key_provider'] or the path to a json key file in
+    args['key_file'] (see iotile.core.hw.auth.key_provider).
+
+    Per report keys are derived from the root key for every report that is
+    signed, verified, encrypted or decrypted.  Derived keys are kept in a
+    bounded LRU cache keyed by (device_id, report_id, sent_timestamp) so that
+    signing and then verifying the same report only derives its key once.  The
+    cache is checked against the device's current root key on every use so a
+    rotated key is never used, however if the key provider caches root keys
+    itself, invalidate_keys() must be called when keys are rotated.
+
+    Args:
+        args (dict): Optional configuration.  Supported keys are
+            key_provider (KeyProvider), key_file (str) and
+            cache_size (int), the maximum number of derived report keys to
+            cache (default 1024).
     """
 
-    @classmethod
-    def _get_key(cls, device_id):
-        """Attempt to get a user key from an environment variable
-        """
+    def __init__(self, args=None):
+        super(EnvAuthProvider, self).__init__(args)
 
-        var_name = "USER_KEY_{0:08X}".format(device_id)
+        key_provider = self.args.get('key_provider')
+        if key_provider is None and self.args.get('key_file') is not None:
+            key_provider = FileKeyProvider(self.args['key_file'])
+        elif key_provider is None:
+            key_provider = EnvKeyProvider()
 
-        if var_name not in os.environ:
-            raise NotFoundError("No user key could be found for devices", device_id=device_id, expected_variable_name=var_name)
+        self.key_provider = key_provider
+        self._report_keys = LRUCache(self.args.get('cache_size', 1024))
 
-        key_var = os.environ[var_name]
-        if len(key_var) != 64:
-            raise NotFoundError("User key in variable is not the correct length, should be 64 hex characters", device_id=device_id, key_value=key_var)
+    def invalidate_keys(self, device_id=None):
+        """Forget cached root and report keys.
 
-        try:
-            key = binascii.unhexlify(key_var)
-        except ValueError:
-            raise NotFoundError("User key in variable could not be decoded from hex", device_id=device_id, key_value=key_var)
+        Call this when device keys are rotated.
 
-        if len(key) != 32:
-            raise NotFoundError("User key in variable is not the correct length, should be 64 hex characters", device_id=device_id, key_value=key_var)
+        Args:
+            device_id (int): The device whose keys should be forgotten.  If
+                None, all cached keys are forgotten.
+        """
 
-        return key
+        self.key_provider.invalidate(device_id)
 
-    @classmethod
-    def _verify_derive_key(cls, device_id, root, **kwargs):
+        if device_id is None:
+            self._report_keys.clear()
+        else:
+            self._report_keys.remove_if(lambda x: x[0] == device_id)
+
+    def _get_key(self, device_id):
+        """Attempt to get a user key for a device from our key provider."""
+
+        return self.key_provider.get_key(device_id)
+
+    def _verify_derive_key(self, device_id, root, **kwargs):
         report_id = kwargs.get('report_id', None)
         sent_timestamp = kwargs.get('sent_timestamp', None)
 
@@ -56,8 +82,15 @@ class EnvAuthProvider(AuthProvider):
         if root != AuthProvider.UserKey:
             raise NotFoundError('unsupported root key in EnvAuthProvider', root_key=root)
 
-        root_key = cls._get_key(device_id)
+        root_key = self._get_key(device_id)
+
+        cache_key = (device_id, report_id, sent_timestamp)
+        cached = self._report_keys.get(cache_key)
+        if cached is not None and cached[0] == root_key:
+            return cached[1]
+
         report_key = AuthProvider.DeriveReportKey(root_key, report_id, sent_timestamp)
+        self._report_keys.put(cache_key, (root_key, report_key))
 
         return report_key
 
@@ -0,0 +1,258 @@
+"""Sources of per-device root keys for auth providers.
+
+An auth provider that signs or verifies data on behalf of devices needs to
+look up each device's root key.  KeyProvider objects encapsulate where those
+keys come from so that the same auth provider can be used with keys stored
+in environment variables, a key file or an in-memory keystore.
+
+All key providers are safe to use from multiple threads.
+"""
+
+import binascii
+import json
+import os
+import threading
+from collections import OrderedDict
+from iotile.core.exceptions import NotFoundError, ArgumentError
+
+
+class LRUCache(object):
+    """A small thread-safe least recently used cache.
+
+    Args:
+        max_size (int): The maximum number of entries to keep.
+    """
+
+    def __init__(self, max_size):
+        if max_size < 1:
+            raise ArgumentError("LRUCache must be able to hold at least one entry", max_size=max_size)
+
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Get an entry and mark it as recently used."""
+
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                return default
+
+            self._entries[key] = value
+            return value
+
+    def put(self, key, value):
+        """Add or replace an entry, evicting the oldest entry if needed."""
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def remove_if(self, predicate):
+        """Remove all entries whose key matches a predicate."""
+
+        with self._lock:
+            for key in [x for x in self._entries if predicate(x)]:
+                del self._entries[key]
+
+    def clear(self):
+        """Remove all entries."""
+
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def decode_key(device_id, key_string, source):
+    """Decode a 64 character hex string into a 32 byte root key.
+
+    Args:
+        device_id (int): The device the key belongs to, for error messages.
+        key_string (str): The hex encoded key.
+        source (str): Where the key came from, for error messages.
+
+    Returns:
+        bytes: The 32 byte key.
+
+    Raises:
+        NotFoundError: If the key is not a valid 64 character hex string.
+    """
+
+    if len(key_string) != 64:
+        raise NotFoundError("User key is not the correct length, should be 64 hex characters", device_id=device_id, key_value=key_string, source=source)
+
+    try:
+        key = binascii.unhexlify(key_string)
+    except (ValueError, TypeError):
+        raise NotFoundError("User key could not be decoded from hex", device_id=device_id, key_value=key_string, source=source)
+
+    return key
+
+
+class KeyProvider(object):
+    """Base class for all objects that can look up device root keys."""
+
+    def get_key(self, device_id):
+        """Get the root key for a device.
+
+        Args:
+            device_id (int): The uuid of the device.
+
+        Returns:
+            bytes: The device's 32 byte root key.
+
+        Raises:
+            NotFoundError: If there is no valid key for the device.
+        """
+
+        raise NotFoundError("get_key is not implemented")
+
+    def invalidate(self, device_id=None):
+        """Forget any cached key information.
+
+        This must be called when keys are rotated in the underlying storage
+        if the provider cannot detect the change itself.
+
+        Args:
+            device_id (int): The device whose key should be forgotten.  If
+                None, all cached keys are forgotten.
+        """
+
+        pass
+
+
+class EnvKeyProvider(KeyProvider):
+    """Look up keys stored in environment variables.
+
+    Keys must be defined in environment variables with the naming scheme:
+    USER_KEY_ABCDEFGH where ABCDEFGH is the device uuid in hex prepended with 0s
+    and expressed in capital letters.  So the device with UUID 0xab would look
+    for the environment variable USER_KEY_000000AB.
+
+    Decoded keys are kept in a bounded LRU cache.  The cache remembers the
+    raw environment value that each key was decoded from so changing an
+    environment variable is detected automatically.
+
+    Args:
+        cache_size (int): The maximum number of decoded keys to cache.
+    """
+
+    def __init__(self, cache_size=1024):
+        self._cache = LRUCache(cache_size)
+
+    def get_key(self, device_id):
+        var_name = "USER_KEY_{0:08X}".format(device_id)
+
+        key_var = os.environ.get(var_name)
+        if key_var is None:
+            raise NotFoundError("No user key could be found for devices", device_id=device_id, expected_variable_name=var_name)
+
+        cached = self._cache.get(device_id)
+        if cached is not None and cached[0] == key_var:
+            return cached[1]
+
+        key = decode_key(device_id, key_var, var_name)
+        self._cache.put(device_id, (key_var, key))
+        return key
+
+    def invalidate(self, device_id=None):
+        if device_id is None:
+            self._cache.clear()
+        else:
+            self._cache.remove_if(lambda x: x == device_id)
+
+
+class InMemoryKeyProvider(KeyProvider):
+    """A keystore that holds keys in memory.
+
+    Args:
+        keys (dict): An optional map of device ids to 32 byte keys or 64
+            character hex strings to initialize the keystore with.
+    """
+
+    def __init__(self, keys=None):
+        self._keys = {}
+        self._lock = threading.Lock()
+
+        if keys is not None:
+            for device_id, key in keys.items():
+                self.set_key(device_id, key)
+
+    def set_key(self, device_id, key):
+        """Add or replace the key for a device.
+
+        Args:
+            device_id (int): The uuid of the device.
+            key (bytes or str): The 32 byte key or a 64 character hex string.
+        """
+
+        if len(key) == 64:
+            key = decode_key(device_id, key, 'InMemoryKeyProvider')
+
+        if len(key) != 32:
+            raise ArgumentError("Device keys must be 32 bytes long", device_id=device_id, length=len(key))
+
+        with self._lock:
+            self._keys[device_id] = bytes(key)
+
+    def remove_key(self, device_id):
+        """Remove the key for a device if there is one."""
+
+        with self._lock:
+            self._keys.pop(device_id, None)
+
+    def get_key(self, device_id):
+        key = self._keys.get(device_id)
+        if key is None:
+            raise NotFoundError("No user key could be found for device in memory keystore", device_id=device_id)
+
+        return key
+
+
+class FileKeyProvider(InMemoryKeyProvider):
+    """Load keys from a json file.
+
+    The file must contain a json object mapping device ids (as hex strings
+    like "0x1a" or decimal integers) to 64 character hex encoded keys.  The
+    file is read when the provider is created and again whenever
+    invalidate() is called.
+
+    Args:
+        path (str): The path to the json key file.
+    """
+
+    def __init__(self, path):
+        super(FileKeyProvider, self).__init__()
+        self.path = path
+        self.reload()
+
+    def reload(self):
+        """Reread all keys from the key file."""
+
+        try:
+            with open(self.path, "r") as infile:
+                entries = json.load(infile)
+        except (IOError, OSError, ValueError) as exc:
+            raise ArgumentError("Could not load key file", path=self.path, error=str(exc))
+
+        keys = {}
+        for device_id, key in entries.items():
+            try:
+                device_id = int(device_id, 0)
+            except ValueError:
+                raise ArgumentError("Invalid device id in key file", path=self.path, device_id=device_id)
+
+            keys[device_id] = decode_key(device_id, key, self.path)
+
+        with self._lock:
+            self._keys = keys
+
+    def invalidate(self, device_id=None):
+        self.reload()
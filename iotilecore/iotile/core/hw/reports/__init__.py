@@ -1,9 +1,10 @@
 from .individual_format import IndividualReadingReport
 from .report import IOTileReading, IOTileReport
+from .reading_batch import ReadingBatch
 from .signed_list_format import SignedListReport
 from .broadcast import BroadcastReport
 from .parser import IOTileReportParser
 from .flexible_dictionary import FlexibleDictionaryReport
 
 
-__all__ = ['IndividualReadingReport', 'IOTileReport', 'IOTileReading', 'BroadcastReport', 'SignedListReport', 'FlexibleDictionaryReport', 'IOTileReportParser']
+__all__ = ['IndividualReadingReport', 'IOTileReport', 'IOTileReading', 'ReadingBatch', 'BroadcastReport', 'SignedListReport', 'FlexibleDictionaryReport', 'IOTileReportParser']
@@ -18,6 +18,7 @@ from collections import namedtuple
 import datetime
 from iotile.core.exceptions import DataError
 from .report import IOTileReading, IOTileReport
+from .reading_batch import ReadingBatch, pack_readings
 
 BroadcastHeader = namedtuple('BroadcastHeader', ['auth_type', 'reading_length', 'uuid', 'sent_timestamp', 'reserved'])
 
@@ -45,7 +46,7 @@ class BroadcastReport(IOTileReport):
     ReportType = 3
 
     def __init__(self, rawreport, **kwargs):
-        super(BroadcastReport, self).__init__(rawreport, signed=False, encrypted=False)
+        super(BroadcastReport, self).__init__(rawreport, signed=False, encrypted=False, **kwargs)
 
     @classmethod
     def _parse_header(cls, header):
@@ -86,18 +87,23 @@ class BroadcastReport(IOTileReport):
 
         header = struct.pack("<BBHLLL", cls.ReportType, 0, len(readings)*16, uuid, sent_timestamp, 0)
 
-        packed_readings = bytearray()
+        packed_readings = pack_readings(readings)
+        return BroadcastReport(bytearray(header) + packed_readings)
 
-        for reading in readings:
-            packed_reading = struct.pack("<HHLLL", reading.stream, 0, reading.reading_id, reading.raw_time, reading.value)
-            packed_readings += bytearray(packed_reading)
+    def decode_header(self):
+        """Parse the header fields of this report without decoding its readings."""
 
-        return BroadcastReport(bytearray(header) + packed_readings)
+        parsed_header = self._parse_header(self.raw_report[:self._HEADER_LENGTH])
+
+        self.sent_timestamp = parsed_header.sent_timestamp
+        self.origin = parsed_header.uuid
+
+        return parsed_header
 
     def decode(self):
         """Decode this report into a list of visible readings."""
 
-        parsed_header = self._parse_header(self.raw_report[:self._HEADER_LENGTH])
+        parsed_header = self.decode_header()
 
         auth_size = self._AUTH_BLOCK_LENGTHS.get(parsed_header.auth_type)
         assert auth_size is not None
@@ -106,16 +112,5 @@ class BroadcastReport(IOTileReport):
         time_base = self.received_time - datetime.timedelta(seconds=parsed_header.sent_timestamp)
 
         readings = self.raw_report[self._HEADER_LENGTH:self._HEADER_LENGTH + parsed_header.reading_length]
-        parsed_readings = []
-
-        for i in range(0, len(readings), 16):
-            reading = readings[i:i+16]
-            stream, _, reading_id, timestamp, value = struct.unpack("<HHLLL", reading)
-
-            parsed = IOTileReading(timestamp, stream, value, time_base=time_base, reading_id=reading_id)
-            parsed_readings.append(parsed)
-
-        self.sent_timestamp = parsed_header.sent_timestamp
-        self.origin = parsed_header.uuid
-
+        parsed_readings = ReadingBatch.FromPacked(readings, time_base)
         return parsed_readings, []
@@ -49,6 +49,15 @@ class IndividualReadingReport(IOTileReport):
         data = struct.pack("<BBHLLLL", 0, 0, reading.stream, uuid, 0, reading.raw_time, reading.value)
         return IndividualReadingReport(data)
 
+    def decode_header(self):
+        """Parse the header fields of this report without decoding its reading."""
+
+        fmt, _, _stream, uuid, sent_timestamp, _reading_timestamp, _reading_value = unpack("<BBHLLLL", self.raw_report)
+        assert fmt == 0
+
+        self.origin = uuid
+        self.sent_timestamp = sent_timestamp
+
     def decode(self):
         """Decode this report into a single reading
         """
@@ -1,6 +1,7 @@
 """State machine for parsing IOTile reports coming in on a streaming basis
 """
 
+import threading
 import pkg_resources
 from iotile.core.exceptions import ArgumentError
 
@@ -19,6 +20,16 @@ class IOTileReportParser (object):
         error_callback (callable): A function to be called every time an error occurs.
             The signature should be error_callback(error_code, message, context).  If a fatal
             error occurs, further parsing of reports will be stopped.
+        lazy (bool): Create reports in lazy mode so that only their headers are parsed
+            until their readings are accessed.  This is useful when reports are only
+            being forwarded.  Note that in lazy mode, errors in the body of a report
+            are raised when its readings are accessed rather than passed to error_callback.
+
+    The installed report formats are found by scanning the iotile.report_format
+    entry point group.  The scan is slow so it is done once per process and the
+    result shared by every parser and by DeserializeReport.  If report format
+    plugins are installed or removed while the process is running, call
+    RefreshFormats() so that parsers created afterwards see the change.
     """
 
     #States for parser state machine
@@ -32,11 +43,21 @@ class IOTileReportParser (object):
     ErrorParsingReportHeader = 2
     ErrorParsingCompleteReport = 3
 
-    def __init__(self, report_callback=None, error_callback=None):
+    # Consumed data is only removed from the front of the buffer once at least
+    # this many bytes have been consumed and they make up at least half of the
+    # buffer, so the cost of compaction is amortized over the data parsed.
+    CompactionThreshold = 4096
+
+    _formats_lock = threading.Lock()
+    _known_formats = None
+
+    def __init__(self, report_callback=None, error_callback=None, lazy=False):
         self.report_callback = report_callback
         self.error_callback = error_callback
+        self.lazy = lazy
 
-        self.raw_data = bytearray()
+        self._buffer = bytearray()
+        self._read_offset = 0
         self.state = IOTileReportParser.WaitingForReportType
 
         self.current_type = 0
@@ -58,12 +79,30 @@ class IOTileReportParser (object):
         if self.state == self.ErrorState:
             return
 
-        self.raw_data += bytearray(data)
+        self._buffer.extend(data)
 
         still_processing = True
         while still_processing:
             still_processing = self.process_data()
 
+        self._compact()
+
+    @property
+    def raw_data(self):
+        """The data that has been received but not yet parsed into a report."""
+
+        return self._buffer[self._read_offset:]
+
+    def _compact(self):
+        """Drop consumed data from the front of our buffer if it is worth it."""
+
+        if self._read_offset == len(self._buffer):
+            del self._buffer[:]
+            self._read_offset = 0
+        elif self._read_offset >= self.CompactionThreshold and 2 * self._read_offset >= len(self._buffer):
+            del self._buffer[:self._read_offset]
+            self._read_offset = 0
+
     def process_data(self):
         """Attempt to extract a report from the current data stream contents
 
@@ -73,9 +112,11 @@ class IOTileReportParser (object):
         """
 
         further_processing = False
+        start = self._read_offset
+        available = len(self._buffer) - start
 
-        if self.state == self.WaitingForReportType and len(self.raw_data) > 0:
-            self.current_type = self.raw_data[0]
+        if self.state == self.WaitingForReportType and available > 0:
+            self.current_type = self._buffer[start]
 
             try:
                 self.current_header_size = self.calculate_header_size(self.current_type)
@@ -89,9 +130,10 @@ class IOTileReportParser (object):
                 else:
                     raise
 
-        if self.state == self.WaitingForReportHeader and len(self.raw_data) >= self.current_header_size:
+        if self.state == self.WaitingForReportHeader and available >= self.current_header_size:
             try:
-                self.current_report_size = self.calculate_report_size(self.current_type, self.raw_data[:self.current_header_size])
+                header = self._buffer[start:start + self.current_header_size]
+                self.current_report_size = self.calculate_report_size(self.current_type, header)
                 self.state = self.WaitingForCompleteReport
                 further_processing = True
             except Exception as exc:
@@ -102,10 +144,10 @@ class IOTileReportParser (object):
                 else:
                     raise
 
-        if self.state == self.WaitingForCompleteReport and len(self.raw_data) >= self.current_report_size:
+        if self.state == self.WaitingForCompleteReport and available >= self.current_report_size:
             try:
-                report_data = self.raw_data[:self.current_report_size]
-                self.raw_data = self.raw_data[self.current_report_size:]
+                report_data = self._buffer[start:start + self.current_report_size]
+                self._read_offset += self.current_report_size
 
                 report = self.parse_report(self.current_type, report_data)
                 self._handle_report(report)
@@ -140,6 +182,10 @@ class IOTileReportParser (object):
         """
 
         fmt = self.known_formats[current_type]
+
+        if self.lazy:
+            return fmt(report_data, lazy=True)
+
         return fmt(report_data)
 
     def _handle_report(self, report):
@@ -156,9 +202,29 @@ class IOTileReportParser (object):
 
     @classmethod
     def _build_type_map(cls):
-        """Build a map of all of the known report format processors
+        """Get the map of all of the known report format processors
+
+        The map is built the first time it is needed and then shared for
+        the life of the process.  It must not be modified.
+
+        Returns:
+            dict: A map of report type ids to IOTileReport subclasses.
         """
 
+        formats = cls._known_formats
+        if formats is not None:
+            return formats
+
+        with cls._formats_lock:
+            if cls._known_formats is None:
+                cls._known_formats = cls._scan_formats()
+
+            return cls._known_formats
+
+    @classmethod
+    def _scan_formats(cls):
+        """Load all of the report formats installed as entry points."""
+
         formats = {}
 
         for entry in pkg_resources.iter_entry_points('iotile.report_format'):
@@ -168,11 +234,31 @@ class IOTileReportParser (object):
         return formats
 
     @classmethod
-    def DeserializeReport(cls, serialized):
+    def RefreshFormats(cls):
+        """Scan the installed report format plugins again.
+
+        Parsers that already exist keep using the formats that were known
+        when they were created.
+
+        Returns:
+            dict: The new map of report type ids to IOTileReport subclasses.
+        """
+
+        formats = cls._scan_formats()
+
+        with cls._formats_lock:
+            cls._known_formats = formats
+
+        return formats
+
+    @classmethod
+    def DeserializeReport(cls, serialized, lazy=False):
         """Deserialize a report that has been serialized by calling report.serialize()
 
         Args:
             serialized (dict): A serialized report object
+            lazy (bool): Only parse the report's header until its readings are
+                accessed.  See IOTileReport for details.
         """
 
         type_map = cls._build_type_map()
@@ -180,7 +266,12 @@ class IOTileReportParser (object):
         if serialized['report_format'] not in type_map:
             raise ArgumentError("Unknown report format in DeserializeReport", format=serialized['report_format'])
 
-        report = type_map[serialized['report_format']](serialized['encoded_report'])
+        report_format = type_map[serialized['report_format']]
+        if lazy:
+            report = report_format(serialized['encoded_report'], lazy=True)
+        else:
+            report = report_format(serialized['encoded_report'])
+
         report.received_time = serialized['received_time']
 
         return report
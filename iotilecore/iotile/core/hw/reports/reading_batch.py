@@ -0,0 +1,167 @@
+"""A compact, lazily materialized list of readings decoded from a report.
+
+Report formats like SignedListReport and BroadcastReport store readings as
+packed 16 byte records.  Decoding them one at a time into IOTileReading
+objects, each with its own datetime calculation, dominates the cost of
+parsing large reports.  ReadingBatch unpacks all of the records with a
+single struct call and only builds an IOTileReading when it is accessed.
+"""
+
+import datetime
+import struct
+from builtins import range
+from iotile.core.exceptions import ArgumentError
+from iotile.core.utilities.packed import unpack
+from .report import IOTileReading, IOTileEvent
+
+try:
+    from collections.abc import Sequence
+except ImportError:
+    from collections import Sequence
+
+# Each packed reading is: stream, reserved, reading_id, raw_time, value
+_READING_FORMAT = "HHLLL"
+_READING_SIZE = 16
+_FIELDS = 5
+_STREAM, _READING_ID, _RAW_TIME, _VALUE = 0, 2, 3, 4
+
+
+def pack_readings(readings):
+    """Pack a list of readings into 16 byte records.
+
+    Args:
+        readings (list of IOTileReading): The readings to pack.
+
+    Returns:
+        bytearray: The packed readings.
+    """
+
+    values = []
+    for reading in readings:
+        values.extend((reading.stream, 0, reading.reading_id, reading.raw_time, reading.value))
+
+    return bytearray(struct.pack("<" + _READING_FORMAT * len(readings), *values))
+
+
+class ReadingBatch(Sequence):
+    """A read-only list of IOTileReading objects backed by packed data.
+
+    The batch behaves like a list of readings.  Each IOTileReading is
+    created the first time it is accessed and then cached so that repeated
+    accesses return the same object.  The raw columns can be accessed
+    without creating any IOTileReading objects using the streams,
+    reading_ids, raw_times and values properties.
+
+    Args:
+        fields (tuple): The flat tuple of unpacked reading fields, 5 per
+            reading in the order stream, reserved, reading_id, raw_time,
+            value.
+        time_base (datetime): An optional estimate of when the device was
+            last turned on, used to compute each reading's reading_time.
+    """
+
+    def __init__(self, fields, time_base=None):
+        if len(fields) % _FIELDS != 0:
+            raise ArgumentError("Reading fields must be a multiple of 5 long", length=len(fields))
+
+        self._fields = fields
+        self._count = len(fields) // _FIELDS
+        self._readings = [None] * self._count
+        self.time_base = time_base
+
+    @classmethod
+    def FromPacked(cls, data, time_base=None):
+        """Decode a block of packed 16 byte readings.
+
+        Args:
+            data (bytearray): The packed readings.  Its length must be a
+                multiple of 16.
+            time_base (datetime): An optional estimate of when the device
+                was last turned on.
+
+        Returns:
+            ReadingBatch: The decoded readings.
+        """
+
+        if len(data) % _READING_SIZE != 0:
+            raise ArgumentError("Packed readings must be a multiple of 16 bytes long", length=len(data))
+
+        count = len(data) // _READING_SIZE
+        fields = unpack("<" + _READING_FORMAT * count, data)
+        return ReadingBatch(fields, time_base)
+
+    @property
+    def streams(self):
+        return self._fields[_STREAM::_FIELDS]
+
+    @property
+    def reading_ids(self):
+        return self._fields[_READING_ID::_FIELDS]
+
+    @property
+    def raw_times(self):
+        return self._fields[_RAW_TIME::_FIELDS]
+
+    @property
+    def values(self):
+        return self._fields[_VALUE::_FIELDS]
+
+    def _materialize(self, index):
+        reading = self._readings[index]
+        if reading is not None:
+            return reading
+
+        base = index * _FIELDS
+        fields = self._fields
+        raw_time = fields[base + _RAW_TIME]
+
+        reading = IOTileReading(raw_time, fields[base + _STREAM], fields[base + _VALUE], reading_id=fields[base + _READING_ID])
+        if self.time_base is not None and raw_time != IOTileEvent.InvalidRawTime:
+            reading.reading_time = self.time_base + datetime.timedelta(seconds=raw_time)
+
+        self._readings[index] = reading
+        return reading
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._materialize(i) for i in range(*index.indices(self._count))]
+
+        if index < 0:
+            index += self._count
+
+        if index < 0 or index >= self._count:
+            raise IndexError("ReadingBatch index out of range")
+
+        return self._materialize(index)
+
+    def __iter__(self):
+        for i in range(0, self._count):
+            yield self._materialize(i)
+
+    def __eq__(self, other):
+        if isinstance(other, ReadingBatch):
+            return self.streams == other.streams and self.reading_ids == other.reading_ids and \
+                self.raw_times == other.raw_times and self.values == other.values
+
+        try:
+            if len(other) != self._count:
+                return False
+        except TypeError:
+            return NotImplemented
+
+        return all(x == y for x, y in zip(self, other))
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "ReadingBatch(%d readings)" % self._count
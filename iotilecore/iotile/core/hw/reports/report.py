@@ -215,6 +215,10 @@ class IOTileReport(object):
     - instance method decode(self):
         function that decodes a report into a series of IOTileReading objects. The function
         should return a list of readings.
+    - instance method decode_header(self): (optional)
+        function that cheaply parses only the report's header fields, like origin, without
+        verifying or decoding its readings.  This is used by lazy reports.  If it is not
+        overridden, the entire report is decoded.
     - instance method serialize(self):
         function that should turn the report into a serialized bytearray that could be
         decoded with decode().
@@ -225,11 +229,18 @@ class IOTileReport(object):
         encrypted (bool): Whether this report is encrypted
         received_time (datetime): The time in UTC when this report was received from a device.
             If not received, the time is assumed to be utcnow().
+        lazy (bool): Only parse the report header when the report is created.  The report
+            is verified and its readings are decoded the first time visible_readings,
+            visible_events or verified is accessed.  This saves all of the decoding work
+            for reports that are only forwarded using encode() or serialize().  Any
+            errors in the report body are raised on first access rather than here.
     """
 
-    def __init__(self, rawreport, signed, encrypted, received_time=None):
-        self.visible_readings = []
-        self.visible_events = []
+    def __init__(self, rawreport, signed, encrypted, received_time=None, lazy=False):
+        self._visible_readings = []
+        self._visible_events = []
+        self._verified = False
+        self._decoded = False
 
         self.origin = None
 
@@ -241,11 +252,60 @@ class IOTileReport(object):
         self.raw_report = rawreport
         self.signed = signed
         self.encrypted = encrypted
-        self.verified = False
 
-        # We may not have any visible readings if our report is encrypted
-        # and we do not have access to the decryption key.
-        self.visible_readings, self.visible_events = self.decode()
+        if lazy:
+            self.decode_header()
+        else:
+            self._ensure_decoded()
+
+    def _ensure_decoded(self):
+        """Decode this report if it has not been decoded yet."""
+
+        if self._decoded:
+            return
+
+        self._decoded = True
+
+        try:
+            # We may not have any visible readings if our report is encrypted
+            # and we do not have access to the decryption key.
+            self._visible_readings, self._visible_events = self.decode()
+        except Exception:
+            self._decoded = False
+            raise
+
+    @property
+    def decoded(self):
+        """Whether this report has been verified and its readings decoded."""
+
+        return self._decoded
+
+    @property
+    def visible_readings(self):
+        self._ensure_decoded()
+        return self._visible_readings
+
+    @visible_readings.setter
+    def visible_readings(self, value):
+        self._visible_readings = value
+
+    @property
+    def visible_events(self):
+        self._ensure_decoded()
+        return self._visible_events
+
+    @visible_events.setter
+    def visible_events(self, value):
+        self._visible_events = value
+
+    @property
+    def verified(self):
+        self._ensure_decoded()
+        return self._verified
+
+    @verified.setter
+    def verified(self, value):
+        self._verified = value
 
     @classmethod
     def HeaderLength(cls):
@@ -270,6 +330,16 @@ class IOTileReport(object):
 
         raise NotFoundError("IOTileReport decode needs to be overriden")
 
+    def decode_header(self):
+        """Parse only the header fields of this report.
+
+        Subclasses should override this to set origin and any other header
+        fields without verifying the report or decoding its readings.  The
+        default implementation just decodes the entire report.
+        """
+
+        self._ensure_decoded()
+
     def encode(self):
         """Encode this report into a binary blob that could be decoded by a report format's decode method."""
 
@@ -305,13 +375,18 @@ class IOTileReport(object):
         return info
 
     def __str__(self):
+        if self.encrypted:
+            enc = "encrypted"
+        else:
+            enc = "not encrypted"
+
+        # Logging a lazy report should not decode it
+        if not self._decoded:
+            return "IOTile Report (length: %d, not decoded yet and %s)" % (len(self.raw_report), enc)
+
         if self.verified:
             verified = "verified"
         else:
             verified = "not verified"
 
-        if self.encrypted:
-            enc = "encrypted"
-        else:
-            enc = "not encrypted"
         return "IOTile Report (length: %d, visible readings: %d, visible events: %d, %s and %s)" % (len(self.raw_report), len(self.visible_readings), len(self.visible_events), verified, enc)
@@ -1,10 +1,10 @@
 """IOTileReport subclass for readings packaged as individual readings
 """
 
-from builtins import range
 import datetime
 import struct
 from .report import IOTileReport, IOTileReading
+from .reading_batch import ReadingBatch, pack_readings
 from iotile.core.utilities.packed import unpack
 from iotile.core.exceptions import ArgumentError, NotFoundError, ExternalError
 from iotile.core.hw.auth.auth_provider import AuthProvider
@@ -57,7 +57,7 @@ class SignedListReport(IOTileReport):
             root_key (int): The key that should be used to sign the report (must be supported
                 by an auth_provider)
             signer (AuthProvider): An optional preconfigured AuthProvider that should be used to sign this
-                report.  If no AuthProvider is provided, the default ChainedAuthProvider is used.
+                report.  If no AuthProvider is provided, the shared default ChainedAuthProvider is used.
             report_id (int): The id of the report.  If not provided it defaults to IOTileReading.InvalidReadingID.
                 Note that you can specify anything you want for the report id but for actual IOTile devices
                 the report id will always be greater than the id of all of the readings contained in the report
@@ -83,16 +83,11 @@ class SignedListReport(IOTileReport):
         header = struct.pack("<BBHLLLBBH", cls.ReportType, len_low, len_high, uuid, report_id, sent_timestamp, root_key, streamer, selector)
         header = bytearray(header)
 
-        packed_readings = bytearray()
-
-        for reading in readings:
-            packed_reading = struct.pack("<HHLLL", reading.stream, 0, reading.reading_id, reading.raw_time, reading.value)
-            packed_readings += bytearray(packed_reading)
-
+        packed_readings = pack_readings(readings)
         footer_stats = struct.pack("<LL", lowest_id, highest_id)
 
         if signer is None:
-            signer = ChainedAuthProvider()
+            signer = ChainedAuthProvider.Default()
 
         # If we are supposed to encrypt this report, do the encryption
         if root_key != signer.NoKey:
@@ -118,9 +113,8 @@ class SignedListReport(IOTileReport):
         data = signed_data + footer
         return SignedListReport(data)
 
-    def decode(self):
-        """Decode this report into a list of readings
-        """
+    def decode_header(self):
+        """Parse the header and footer fields of this report without verifying it."""
 
         fmt, len_low, len_high, device_id, report_id, sent_timestamp, signature_flags, origin_streamer, streamer_selector = unpack("<BBHLLLBBH", self.raw_report[:20])
 
@@ -135,27 +129,35 @@ class SignedListReport(IOTileReport):
         self.signature_flags = signature_flags
 
         assert len(self.raw_report) == length
+        assert len(self.raw_report) >= 44
 
-        remaining = self.raw_report[20:]
-        assert len(remaining) >= 24
-        readings = remaining[:-24]
-        footer = remaining[-24:]
-
-        lowest_id, highest_id, signature = unpack("<LL16s", footer)
-        signature = bytearray(signature)
+        lowest_id, highest_id, signature = unpack("<LL16s", self.raw_report[-24:])
 
         self.lowest_id = lowest_id
         self.highest_id = highest_id
-        self.signature = signature
-
-        signed_data = self.raw_report[:-16]
-        signer = ChainedAuthProvider()
+        self.signature = bytearray(signature)
 
         if signature_flags == AuthProvider.NoKey:
             self.encrypted = False
         else:
             self.encrypted = True
 
+    def decode(self):
+        """Decode this report into a list of readings
+        """
+
+        self.decode_header()
+
+        device_id = self.origin
+        report_id = self.report_id
+        sent_timestamp = self.sent_timestamp
+        signature_flags = self.signature_flags
+        signature = self.signature
+        readings = self.raw_report[20:-24]
+
+        signed_data = self.raw_report[:-16]
+        signer = ChainedAuthProvider.Default()
+
         try:
             verification = signer.verify_report(device_id, signature_flags, signed_data, signature, report_id=report_id, sent_timestamp=sent_timestamp)
             self.verified = verification['verified']
@@ -180,13 +182,4 @@ class SignedListReport(IOTileReport):
         assert (len(readings) % 16) == 0
 
         time_base = self.received_time - datetime.timedelta(seconds=sent_timestamp)
-        parsed_readings = []
-
-        for i in range(0, len(readings), 16):
-            reading = readings[i:i+16]
-            stream, _, reading_id, timestamp, value = unpack("<HHLLL", reading)
-
-            parsed = IOTileReading(timestamp, stream, value, time_base=time_base, reading_id=reading_id)
-            parsed_readings.append(parsed)
-
-        return parsed_readings, []
+        return ReadingBatch.FromPacked(readings, time_base), []
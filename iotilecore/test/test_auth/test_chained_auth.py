@@ -38,3 +38,33 @@ def test_key_finding(monkeypatch):
 
     #Make sure we also find the hash only auth module
     auth.sign_report(2, 0, data, report_id=0, sent_timestamp=0)
+
+
+def test_default_provider_cache(monkeypatch):
+    """Make sure the default provider chain and entry point scan are cached."""
+
+    import pkg_resources
+
+    scans = []
+    real_iter = pkg_resources.iter_entry_points
+
+    def _counting_iter(group, *args, **kwargs):
+        scans.append(group)
+        return real_iter(group, *args, **kwargs)
+
+    monkeypatch.setattr(pkg_resources, 'iter_entry_points', _counting_iter)
+    ChainedAuthProvider.ClearDefault()
+
+    default = ChainedAuthProvider.Default()
+    assert ChainedAuthProvider.Default() is default
+    assert len(scans) == 2
+
+    # New instances reuse the cached entry point scan
+    other = ChainedAuthProvider()
+    assert other is not default
+    assert [type(x) for _prio, x in other.providers] == [type(x) for _prio, x in default.providers]
+    assert len(scans) == 2
+
+    ChainedAuthProvider.ClearDefault()
+    assert ChainedAuthProvider.Default() is not default
+    assert len(scans) == 4
@@ -3,6 +3,7 @@
 import pytest
 from iotile.core.exceptions import NotFoundError
 from iotile.core.hw.auth.env_auth_provider import EnvAuthProvider
+from iotile.core.hw.auth.auth_provider import AuthProvider
 
 
 def test_key_finding(monkeypatch):
@@ -53,3 +54,41 @@ def test_unsupported_methods():
 
     with pytest.raises(NotFoundError):
         auth.verify_report(1, 2, data, bytearray(), report_id=0, sent_timestamp=0)
+
+
+def test_report_key_cache(monkeypatch):
+    """Make sure derived keys are cached and key rotation is detected."""
+
+    key1 = '00' * 32
+    key2 = '11' * 32
+    data = bytearray("what do ya want for nothing?".encode('utf-8'))
+
+    derived = []
+    real_derive = AuthProvider.DeriveReportKey
+
+    def _counting_derive(root_key, report_id, sent_timestamp):
+        derived.append(report_id)
+        return real_derive(root_key, report_id, sent_timestamp)
+
+    monkeypatch.setattr(AuthProvider, 'DeriveReportKey', staticmethod(_counting_derive))
+    monkeypatch.setenv('USER_KEY_00000001', key1)
+
+    auth = EnvAuthProvider({'cache_size': 2})
+
+    sig = auth.sign_report(1, 1, data, report_id=1, sent_timestamp=0)['signature']
+    assert auth.verify_report(1, 1, data, sig, report_id=1, sent_timestamp=0)['verified']
+    assert derived == [1]
+
+    # Make sure the cache is bounded
+    auth.sign_report(1, 1, data, report_id=2, sent_timestamp=0)
+    auth.sign_report(1, 1, data, report_id=3, sent_timestamp=0)
+    auth.sign_report(1, 1, data, report_id=1, sent_timestamp=0)
+    assert derived == [1, 2, 3, 1]
+
+    # Make sure a rotated key is never used
+    monkeypatch.setenv('USER_KEY_00000001', key2)
+    assert not auth.verify_report(1, 1, data, sig, report_id=1, sent_timestamp=0)['verified']
+
+    auth.invalidate_keys(1)
+    monkeypatch.setenv('USER_KEY_00000001', key1)
+    assert auth.verify_report(1, 1, data, sig, report_id=1, sent_timestamp=0)['verified']
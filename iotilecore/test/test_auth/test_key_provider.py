@@ -0,0 +1,104 @@
+"""Tests for the sources of device root keys."""
+
+import json
+import pytest
+from iotile.core.exceptions import NotFoundError, ArgumentError
+from iotile.core.hw.auth.key_provider import LRUCache, InMemoryKeyProvider, FileKeyProvider, EnvKeyProvider
+from iotile.core.hw.auth.env_auth_provider import EnvAuthProvider
+from iotile.core.hw.auth.auth_chain import ChainedAuthProvider
+
+KEY1 = '01' * 32
+KEY2 = '02' * 32
+
+
+def test_lru_cache():
+    """Make sure the LRU cache evicts the least recently used entry."""
+
+    cache = LRUCache(2)
+    cache.put(1, 'a')
+    cache.put(2, 'b')
+    assert cache.get(1) == 'a'
+
+    cache.put(3, 'c')
+    assert cache.get(2) is None
+    assert cache.get(1) == 'a'
+    assert len(cache) == 2
+
+    cache.remove_if(lambda x: x == 1)
+    assert cache.get(1) is None
+
+    with pytest.raises(ArgumentError):
+        LRUCache(0)
+
+
+def test_env_provider(monkeypatch):
+    """Make sure env keys are cached but changes are noticed."""
+
+    monkeypatch.setenv('USER_KEY_00000001', KEY1)
+    provider = EnvKeyProvider()
+
+    assert provider.get_key(1) == bytes(bytearray([1] * 32))
+
+    monkeypatch.setenv('USER_KEY_00000001', KEY2)
+    assert provider.get_key(1) == bytes(bytearray([2] * 32))
+
+    monkeypatch.delenv('USER_KEY_00000001')
+    with pytest.raises(NotFoundError):
+        provider.get_key(1)
+
+
+def test_memory_provider():
+    """Make sure we can sign with keys from an in memory keystore."""
+
+    keys = InMemoryKeyProvider({1: KEY1})
+    keys.set_key(2, bytes(bytearray([2] * 32)))
+
+    assert keys.get_key(1) == bytes(bytearray([1] * 32))
+
+    with pytest.raises(ArgumentError):
+        keys.set_key(3, b'short')
+
+    auth = EnvAuthProvider({'key_provider': keys})
+    data = bytearray(b'hello')
+
+    sig = auth.sign_report(2, 1, data, report_id=1, sent_timestamp=0)['signature']
+    assert auth.verify_report(2, 1, data, sig, report_id=1, sent_timestamp=0)['verified']
+
+    keys.remove_key(2)
+    with pytest.raises(NotFoundError):
+        auth.sign_report(2, 1, data, report_id=1, sent_timestamp=0)
+
+
+def test_file_provider(tmpdir):
+    """Make sure we can load keys from a file and reload them."""
+
+    path = tmpdir.join('keys.json')
+    path.write(json.dumps({'0x1': KEY1, '10': KEY2}))
+
+    auth = EnvAuthProvider({'key_file': str(path)})
+    assert auth.key_provider.get_key(1) == bytes(bytearray([1] * 32))
+    assert auth.key_provider.get_key(10) == bytes(bytearray([2] * 32))
+
+    data = bytearray(b'hello')
+    sig = auth.sign_report(1, 1, data, report_id=1, sent_timestamp=0)['signature']
+
+    path.write(json.dumps({'0x1': KEY2}))
+    auth.invalidate_keys()
+
+    assert not auth.verify_report(1, 1, data, sig, report_id=1, sent_timestamp=0)['verified']
+    with pytest.raises(NotFoundError):
+        auth.key_provider.get_key(10)
+
+    path.write('not json')
+    with pytest.raises(ArgumentError):
+        FileKeyProvider(str(path))
+
+
+def test_chain_invalidation(monkeypatch):
+    """Make sure invalidating the default chain reaches its providers."""
+
+    calls = []
+    monkeypatch.setattr(EnvAuthProvider, 'invalidate_keys', lambda self, device_id=None: calls.append(device_id))
+
+    ChainedAuthProvider.Default().invalidate_keys(5)
+    assert calls == [5]
@@ -0,0 +1,101 @@
+"""Microbenchmarks for performance sensitive parts of report handling.
+
+These tests print timing information when run with pytest -s but only
+assert on deterministic properties so that they are stable on slow or
+heavily loaded machines.
+"""
+
+from __future__ import print_function
+import timeit
+from iotile.core.hw.auth.auth_chain import ChainedAuthProvider
+from iotile.core.hw.reports import SignedListReport, IOTileReading
+
+
+def _make_report(count):
+    readings = [IOTileReading(i, 0x5000, i, reading_id=i + 1) for i in range(0, count)]
+    return SignedListReport.FromReadings(1, readings, report_id=count + 1).encode()
+
+
+def test_signed_report_decode():
+    """Compare decode throughput with and without the cached auth chain."""
+
+    for count in (1, 100):
+        encoded = _make_report(count)
+
+        def _uncached():
+            ChainedAuthProvider.ClearDefault()
+            return SignedListReport(encoded)
+
+        uncached = timeit.timeit(_uncached, number=50) / 50
+        cached = timeit.timeit(lambda: SignedListReport(encoded), number=50) / 50
+
+        print("%d readings: %.1f reports/s uncached, %.1f reports/s cached" % (count, 1.0 / uncached, 1.0 / cached))
+
+        report = SignedListReport(encoded)
+        assert report.verified
+        assert len(report.visible_readings) == count
+
+
+def test_user_key_verify(monkeypatch):
+    """Measure verifying user key signed reports with the report key cache."""
+
+    from iotile.core.hw.auth.env_auth_provider import EnvAuthProvider
+
+    devices = 100
+    for device in range(1, devices + 1):
+        monkeypatch.setenv('USER_KEY_{0:08X}'.format(device), '{0:064X}'.format(device))
+
+    readings = [IOTileReading(i, 0x5000, i, reading_id=i + 1) for i in range(0, 10)]
+    encoded = [SignedListReport.FromReadings(x, readings, root_key=EnvAuthProvider.UserKey, report_id=11).encode() for x in range(1, devices + 1)]
+
+    def _verify_all():
+        for report in encoded:
+            assert SignedListReport(report).verified
+
+    cold = timeit.timeit(lambda: (ChainedAuthProvider.Default().invalidate_keys(), _verify_all()), number=5) / 5
+    warm = timeit.timeit(_verify_all, number=5) / 5
+
+    print("user key verify: %.1f reports/s cold, %.1f reports/s warm" % (devices / cold, devices / warm))
+
+
+def _make_stream(count):
+    from iotile.core.hw.reports import IndividualReadingReport
+
+    stream = bytearray()
+    for i in range(0, count):
+        stream += IndividualReadingReport.FromReadings(1, [IOTileReading(i, 0x5000, i)]).encode()
+
+        if i % 100 == 0:
+            stream += _make_report(10)
+
+    return stream
+
+
+def test_report_parser_framing():
+    """Measure framing a large multi-report stream delivered in small chunks."""
+
+    from iotile.core.hw.reports import IOTileReportParser
+
+    for count in (1000, 10000):
+        stream = _make_stream(count)
+        chunks = [stream[i:i + 20] for i in range(0, len(stream), 20)]
+
+        def _parse_chunks():
+            parser = IOTileReportParser(lazy=True)
+            for chunk in chunks:
+                parser.add_data(chunk)
+            return parser
+
+        def _parse_burst():
+            parser = IOTileReportParser(lazy=True)
+            parser.add_data(stream)
+            return parser
+
+        chunk_time = timeit.timeit(_parse_chunks, number=1)
+        burst_time = timeit.timeit(_parse_burst, number=1)
+
+        print("%d reports (%d bytes): %.1f ms in 20 byte chunks, %.1f ms in one burst" % (count, len(stream), chunk_time * 1000, burst_time * 1000))
+
+        for parser in (_parse_chunks(), _parse_burst()):
+            assert len(parser.reports) == count + (count + 99) // 100
+            assert len(parser.raw_data) == 0
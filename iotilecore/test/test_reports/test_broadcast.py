@@ -1,5 +1,6 @@
 """Tests to ensure that BroadcastReport parsing and creation works."""
 
+import datetime
 from iotile.core.hw.reports import BroadcastReport, IOTileReading, IOTileReportParser
 
 
@@ -28,3 +29,43 @@ def test_report_parser():
 
     assert len(parser.reports) == 1
     assert parser.reports[0].visible_readings == report.visible_readings
+
+
+def test_lazy_errors():
+    """Make sure errors in the body of lazy reports are raised on access."""
+
+    import struct
+    import pytest
+
+    encoded = bytearray(struct.pack("<BBHLLL", BroadcastReport.ReportType, 0, 15, 1, 0, 0)) + bytearray(15)
+
+    report = BroadcastReport(encoded, lazy=True)
+    assert report.origin == 1
+
+    for _i in range(0, 2):
+        with pytest.raises(AssertionError):
+            report.visible_readings
+
+    with pytest.raises(AssertionError):
+        BroadcastReport(encoded)
+
+
+def test_lazy_parser():
+    """Make sure IOTileReportParser can create lazy reports."""
+
+    reading = IOTileReading(0, 0x5000, 100)
+    encoded = BroadcastReport.FromReadings(1, [reading, reading], sent_timestamp=10).encode()
+
+    parser = IOTileReportParser(lazy=True)
+    parser.add_data(encoded)
+
+    report = parser.reports[0]
+    assert report.decoded is False
+    assert report.origin == 1
+    assert report.sent_timestamp == 10
+    assert report.visible_readings == [reading, reading]
+
+    serialized = report.serialize()
+    deserialized = IOTileReportParser.DeserializeReport(serialized, lazy=True)
+    assert deserialized.decoded is False
+    assert deserialized.visible_readings[0].reading_time == serialized['received_time'] - datetime.timedelta(seconds=10)
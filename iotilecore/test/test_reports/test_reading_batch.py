@@ -0,0 +1,64 @@
+"""Tests for lazily decoded batches of readings."""
+
+import datetime
+import pytest
+from iotile.core.exceptions import ArgumentError
+from iotile.core.hw.reports import ReadingBatch, IOTileReading, SignedListReport, BroadcastReport
+from iotile.core.hw.reports.reading_batch import pack_readings
+
+
+def _make_readings(count):
+    return [IOTileReading(i, 0x5000 + (i % 3), i * 2, reading_id=i + 1) for i in range(0, count)]
+
+
+def test_round_trip():
+    """Make sure packed readings decode to the same values."""
+
+    readings = _make_readings(100)
+    batch = ReadingBatch.FromPacked(pack_readings(readings))
+
+    assert len(batch) == 100
+    assert batch == readings
+    assert readings == batch
+    assert batch != readings[:-1]
+    assert batch.streams[:3] == (0x5000, 0x5001, 0x5002)
+    assert batch.values[-1] == 198
+    assert batch.raw_times == tuple(range(0, 100))
+    assert batch.reading_ids[0] == 1
+    assert batch[-1].reading_id == 100
+    assert [x.value for x in batch[10:13]] == [20, 22, 24]
+
+    with pytest.raises(IndexError):
+        batch[100]
+
+    with pytest.raises(ArgumentError):
+        ReadingBatch.FromPacked(bytearray(15))
+
+
+def test_lazy_materialization():
+    """Make sure readings are only created on access and then cached."""
+
+    time_base = datetime.datetime(2018, 1, 1)
+    batch = ReadingBatch.FromPacked(pack_readings(_make_readings(10)), time_base)
+
+    assert batch._readings == [None] * 10
+
+    reading = batch[5]
+    assert reading is batch[5]
+    assert reading.reading_time == time_base + datetime.timedelta(seconds=5)
+    assert len([x for x in batch._readings if x is not None]) == 1
+
+
+def test_report_decode():
+    """Make sure report formats return reading batches."""
+
+    readings = _make_readings(1000)
+
+    signed = SignedListReport(SignedListReport.FromReadings(1, readings).encode())
+    broadcast = BroadcastReport(BroadcastReport.FromReadings(1, readings).encode())
+
+    assert isinstance(signed.visible_readings, ReadingBatch)
+    assert isinstance(broadcast.visible_readings, ReadingBatch)
+    assert signed.visible_readings == readings
+    assert broadcast.visible_readings == signed.visible_readings
+    assert signed.visible_readings[10].reading_time == signed.received_time - datetime.timedelta(seconds=signed.sent_timestamp - 10)
@@ -137,3 +137,51 @@ class TestReportParser(unittest.TestCase):
             assert reading.raw_time == i
             assert reading.reading_id == i+1
             assert reading.stream == 2
+
+    def test_compaction(self):
+        """Make sure partial reports survive buffer compaction
+        """
+
+        stream = bytearray()
+        for i in range(0, 500):
+            stream += make_report(10, 1, i, 3, 4)
+            stream += make_sequential(1, 2, 5, True)
+
+        # Feed the data in chunks that never line up with report boundaries
+        for i in range(0, len(stream), 37):
+            self.parser.add_data(stream[i:i+37])
+            assert len(self.parser.raw_data) < 250
+
+        assert len(self.parser.reports) == 1000
+        assert len(self.parser.raw_data) == 0
+        assert self.parser.reports[-2].visible_readings[0].value == 499
+        assert self.parser.reports[-1].visible_readings[4].value == 4
+
+    def test_shared_formats(self):
+        """Make sure report formats are only scanned once per process
+        """
+
+        parser2 = IOTileReportParser()
+        assert parser2.known_formats is self.parser.known_formats
+
+        report = SignedListReport(make_sequential(1, 2, 5, True))
+        scans = []
+
+        def _scan_formats():
+            scans.append(True)
+            return {}
+
+        original = IOTileReportParser.__dict__['_scan_formats']
+        IOTileReportParser._scan_formats = staticmethod(_scan_formats)
+        try:
+            IOTileReportParser()
+            decoded = IOTileReportParser.DeserializeReport(report.serialize())
+        finally:
+            IOTileReportParser._scan_formats = original
+
+        assert len(scans) == 0
+        assert decoded.visible_readings == report.visible_readings
+
+        formats = IOTileReportParser.RefreshFormats()
+        assert formats == self.parser.known_formats
+        assert IOTileReportParser().known_formats is formats
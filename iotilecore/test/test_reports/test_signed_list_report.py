@@ -87,3 +87,42 @@ def test_str_conversion():
 
     str_report = str(report)
     assert str_report == 'IOTile Report (length: 204, visible readings: 10, visible events: 0, verified and not encrypted)'
+
+
+def test_lazy_decoding(monkeypatch):
+    """Make sure lazy reports only parse their header until accessed."""
+
+    from iotile.core.hw.auth.auth_chain import ChainedAuthProvider
+
+    encoded = make_sequential(1, 0x1000, 10, give_ids=True).encode()
+
+    verifications = []
+    provider = ChainedAuthProvider.Default()
+    real_verify = provider.verify_report
+
+    def _counting_verify(*args, **kwargs):
+        verifications.append(args[0])
+        return real_verify(*args, **kwargs)
+
+    monkeypatch.setattr(provider, 'verify_report', _counting_verify)
+
+    report = SignedListReport(encoded, lazy=True)
+    assert report.origin == 1
+    assert report.lowest_id == 1
+    assert report.highest_id == 10
+    assert report.encrypted is False
+    assert report.decoded is False
+    assert report.encode() == encoded
+    assert report.serialize()['origin'] == 1
+    assert 'not decoded' in str(report)
+    assert verifications == []
+
+    assert report.verified is True
+    assert len(report.visible_readings) == 10
+    assert report.decoded is True
+    assert verifications == [1]
+
+    eager = SignedListReport(encoded)
+    assert eager.decoded is True
+    assert eager.visible_readings == report.visible_readings
+
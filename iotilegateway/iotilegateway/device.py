@@ -1,5 +1,7 @@
 import logging
 import copy
+import heapq
+import itertools
 import datetime
 import tornado.ioloop
 import tornado.gen
@@ -7,6 +9,36 @@ import uuid
 from future.utils import viewvalues, viewitems
 from iotile.core.hw.reports import BroadcastReport
 from iotile.core.exceptions import ArgumentError
+from .event_queue import EventQueue
+
+
+class ReadOnlyDict(dict):
+    """A dictionary that cannot be modified.
+
+    DeviceManager shares these between every caller that asks for the list
+    of scanned devices so they must not be changed.  Copying one with
+    copy.copy, copy.deepcopy or dict() produces a normal, mutable dict.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("This dictionary is read-only, make a copy with dict() if you need to modify it")
+
+    __setitem__ = _readonly
+    __delitem__ = _readonly
+    clear = _readonly
+    pop = _readonly
+    popitem = _readonly
+    setdefault = _readonly
+    update = _readonly
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
 
 
 class DeviceManager(object):
@@ -23,10 +55,30 @@ class DeviceManager(object):
     of 'signal_strength' that is reported by each DeviceAdapter and used to rank which one
     has a better route to a given device.
 
+    Monitors are stored in a routing table keyed by (device uuid, event name) so
+    that delivering an event only touches the monitors that want to receive it,
+    even when many clients are monitoring other devices or events.
+
+    The information about each scanned device is kept in an index that is
+    updated incrementally as devices are seen and expire, so looking up the
+    scanned devices is cheap no matter how many devices are visible.  Expiration
+    times are kept in a heap so that only the records that have actually expired
+    are touched by the periodic expiry callback.
+
+    Events from DeviceAdapters arrive on the adapters' own threads.  They are passed to the
+    IOLoop through a bounded EventQueue that runs them in batches, so a burst of scan results
+    or reports does not wake the loop once per event.  See EventQueue for what happens when
+    events arrive faster than the loop can handle them.
+
     Args:
         loop (tornado.ioloop.IOLoop): A tornado IOLoop object that this DeviceManager will run
             itself in.  It is up to the caller to make sure the loop is started and run.  The
             DeviceManager will run forever until the loop is stopped.
+        max_queued_events (int): The maximum number of adapter events waiting to be processed
+            by the loop.
+        event_batch_size (int): The maximum number of adapter events processed at once.
+        overflow_policy (str): What to do with new adapter events when the queue is full,
+            one of EventQueue.Block, EventQueue.DropOldest or EventQueue.DropNewest.
     """
 
     ConnectionIdleState = 0
@@ -35,15 +87,22 @@ class DeviceManager(object):
     DisconnectionStartedState = 4
     DisconnectedState = 5
 
-    def __init__(self, loop):
+    def __init__(self, loop, max_queued_events=10000, event_batch_size=100, overflow_policy=EventQueue.Block):
         self.monitors = {}
+        self._monitor_routes = {}
         self._scanned_devices = {}
+        self._device_index = {}
+        self._device_snapshot = None
+        self._expiry_heap = []
+        self._expiry_counter = itertools.count()
         self.adapters = {}
         self.connections = {}
         self._loop = loop
         self._logger = logging.getLogger(__name__)
         self._logger.setLevel(logging.DEBUG)
         self._next_conn_id = 0
+        self.event_queue = EventQueue(loop, max_size=max_queued_events, batch_size=event_batch_size,
+                                      policy=overflow_policy)
 
         tornado.ioloop.PeriodicCallback(self.device_expiry_callback, 1000, self._loop).start()
 
@@ -52,6 +111,10 @@ class DeviceManager(object):
         self.adapters[adapter_id] = man
         man.set_id(adapter_id)
 
+        # Reports are only forwarded to agents, which send them on with encode() or serialize(),
+        # so adapters that support it should not verify and decode every report they receive
+        man.set_config('lazy_reports', True)
+
         man.add_callback('on_scan', self.device_found_callback)
         man.add_callback('on_disconnect', self.device_disconnected_callback)
         man.add_callback('on_report', self.report_received_callback)
@@ -74,47 +137,55 @@ class DeviceManager(object):
     def scanned_devices(self):
         """Return a dictionary of all scanned devices across all connected DeviceAdapters
 
+        The result is a read-only snapshot that is shared between callers and only
+        rebuilt when the set of scanned devices changes.  Copy it with dict() if you
+        need to modify it.
+
         Returns:
             dict: A dictionary mapping UUIDs to device information dictionaries
         """
 
-        devs = {}
+        if self._device_snapshot is None:
+            self._device_snapshot = ReadOnlyDict(self._device_index)
 
-        for device_id, adapters in viewitems(self._scanned_devices):
-            dev = None
-            max_signal = None
-            best_adapter = None
+        return self._device_snapshot
 
-            for adapter_id, devinfo in viewitems(adapters):
-                connstring = "{0}/{1}".format(adapter_id, devinfo['connection_string'])
-                if dev is None:
-                    dev = copy.deepcopy(devinfo)
-                    del dev['connection_string']
+    def _update_device_index(self, uuid):
+        """Rebuild the scanned device information for a single device
 
-                if 'adapters' not in dev:
-                    dev['adapters'] = []
-                    best_adapter = adapter_id
+        This must be called every time the adapter records for a device change.
+        If the device is no longer seen by any adapter, it is removed.
+
+        Args:
+            uuid (int): The device whose records have changed.
+        """
 
-                dev['adapters'].append((adapter_id, devinfo['signal_strength'], connstring))
+        self._device_snapshot = None
 
-                if max_signal is None:
-                    max_signal = devinfo['signal_strength']
-                elif devinfo['signal_strength'] > max_signal:
-                    max_signal = devinfo['signal_strength']
-                    best_adapter = adapter_id
+        adapters = self._scanned_devices.get(uuid)
+        if not adapters:
+            self._scanned_devices.pop(uuid, None)
+            self._device_index.pop(uuid, None)
+            return
 
-            # If device has been seen in no adapters, it will get expired
-            # don't return it
+        dev = None
+        routes = []
+        for adapter_id, devinfo in viewitems(adapters):
             if dev is None:
-                continue
+                dev = dict(devinfo)
+                del dev['connection_string']
 
-            dev['adapters'] = sorted(dev['adapters'], key=lambda x: x[1], reverse=True)
-            dev['best_adapter'] = best_adapter
-            dev['signal_strength'] = max_signal
+            connstring = "{0}/{1}".format(adapter_id, devinfo['connection_string'])
+            routes.append((adapter_id, devinfo['signal_strength'], connstring))
 
-            devs[device_id] = dev
+        # The sort is stable so ties are broken by the first adapter to see the device
+        routes.sort(key=lambda x: x[1], reverse=True)
 
-        return devs
+        dev['adapters'] = tuple(routes)
+        dev['best_adapter'] = routes[0][0]
+        dev['signal_strength'] = routes[0][1]
+
+        self._device_index[uuid] = ReadOnlyDict(dev)
 
     @tornado.gen.coroutine
     def connect(self, uuid):
@@ -132,15 +203,15 @@ class DeviceManager(object):
                     future on success
         """
 
-        devs = self.scanned_devices
+        dev = self._device_index.get(uuid)
 
-        if uuid not in devs:
+        if dev is None:
             raise tornado.gen.Return({'success': False, 'reason': 'Could not find UUID'})
 
         adapter_id = None
         connection_string = None
         # Find the best adapter to use based on the first adapter with an open connection spot
-        for adapter, signal, connstring in devs[uuid]['adapters']:
+        for adapter, signal, connstring in dev['adapters']:
             if self.adapters[adapter].can_connect():
                 adapter_id = adapter
                 connection_string = connstring
@@ -221,6 +292,7 @@ class DeviceManager(object):
             self.monitors[device_uuid] = {}
 
         self.monitors[device_uuid][monitor_uuid.hex] = (filters, callback)
+        self._add_monitor_routes(device_uuid, monitor_uuid.hex, filters, callback)
 
         self._logger.debug("Registered monitor, device=%s, filters=%s, uuid=%s", device_uuid, filter_names, monitor_uuid)
 
@@ -246,12 +318,17 @@ class DeviceManager(object):
 
 
         filters, callback = self.monitors[dev_uuid][monitor_name]
+        old_filters = set(filters)
 
+        # Events are added before they are removed so an event in both lists is not received
         if add_events is not None:
             filters.update(add_events)
         if remove_events is not None:
             filters.difference_update(remove_events)
 
+        self._remove_monitor_routes(dev_uuid, monitor_name, old_filters.difference(filters))
+        self._add_monitor_routes(dev_uuid, monitor_name, filters.difference(old_filters), callback)
+
         self.monitors[dev_uuid][monitor_name] = (filters, callback)
 
     def remove_monitor(self, monitor_id):
@@ -269,7 +346,34 @@ class DeviceManager(object):
         if dev_uuid not in self.monitors or monitor_name not in self.monitors[dev_uuid]:
             raise ArgumentError("Could not find monitor by name", monitor_id=monitor_id)
 
-        del self.monitors[dev_uuid][monitor_name]
+        filters, _callback = self.monitors[dev_uuid].pop(monitor_name)
+        self._remove_monitor_routes(dev_uuid, monitor_name, filters)
+
+        if len(self.monitors[dev_uuid]) == 0:
+            del self.monitors[dev_uuid]
+
+    def _add_monitor_routes(self, device_uuid, monitor_name, events, callback):
+        """Add a monitor to the routing table for each of the given events."""
+
+        for event in events:
+            key = (device_uuid, event)
+            if key not in self._monitor_routes:
+                self._monitor_routes[key] = {}
+
+            self._monitor_routes[key][monitor_name] = callback
+
+    def _remove_monitor_routes(self, device_uuid, monitor_name, events):
+        """Remove a monitor from the routing table for each of the given events."""
+
+        for event in events:
+            key = (device_uuid, event)
+            route = self._monitor_routes.get(key)
+            if route is None:
+                continue
+
+            route.pop(monitor_name, None)
+            if len(route) == 0:
+                del self._monitor_routes[key]
 
     def call_monitor(self, device_uuid, event, *args):
         """Call a monitoring function for an event on device
@@ -283,12 +387,13 @@ class DeviceManager(object):
         if device_uuid is None:
             device_uuid = '*'
 
-        if device_uuid not in self.monitors:
+        route = self._monitor_routes.get((device_uuid, event))
+        if route is None:
             return
 
-        for listeners, monitor in viewvalues(self.monitors[device_uuid]):
-            if event in listeners:
-                monitor(device_uuid, event, *args)
+        # Copy the callbacks since a monitor is allowed to add or remove monitors
+        for monitor in list(viewvalues(route)):
+            monitor(device_uuid, event, *args)
 
     @tornado.gen.coroutine
     def connect_direct(self, connection_string):
@@ -577,7 +682,7 @@ class DeviceManager(object):
         def sync_device_disconnected_callback(self, adapter, connection_id):
             pass
 
-        self._loop.add_callback(sync_device_disconnected_callback, self, adapter, connection_id)
+        self.event_queue.put(sync_device_disconnected_callback, self, adapter, connection_id)
 
     def device_found_callback(self, ad, inf, exp):
         """Add or update a device record in scanned_devices
@@ -594,19 +699,41 @@ class DeviceManager(object):
                 If expires==0 then the record will never expire on its own,
         """
 
-        def sync_device_found_callback(self, adapter, info, expires):
-            uuid = info['uuid']
+        self.event_queue.put(self._on_device_found, ad, inf, exp)
 
-            if expires > 0:
-                info['expires'] = datetime.datetime.now() + datetime.timedelta(seconds=expires)
+    def _on_device_found(self, adapter, info, expires):
+        """Record that a device was seen, on the main tornado ioloop."""
 
-            if uuid not in self._scanned_devices:
-                self._scanned_devices[uuid] = {}
+        uuid = info['uuid']
 
-            devrecord = self._scanned_devices[uuid]
-            devrecord[adapter] = info
+        if expires > 0:
+            info['expires'] = datetime.datetime.now() + datetime.timedelta(seconds=expires)
+            heapq.heappush(self._expiry_heap, (info['expires'], next(self._expiry_counter), uuid, adapter, info))
 
-        self._loop.add_callback(sync_device_found_callback, self, ad, inf, exp)
+            # Every time a device is seen again, its previous heap entry becomes stale.
+            # Rebuild the heap if stale entries start to dominate it.
+            if len(self._expiry_heap) > 2 * len(self._device_index) + 1024:
+                self._rebuild_expiry_heap()
+
+        if uuid not in self._scanned_devices:
+            self._scanned_devices[uuid] = {}
+
+        devrecord = self._scanned_devices[uuid]
+        devrecord[adapter] = info
+
+        self._update_device_index(uuid)
+
+    def _rebuild_expiry_heap(self):
+        """Drop all stale entries from the expiry heap."""
+
+        heap = []
+        for uuid, adapters in viewitems(self._scanned_devices):
+            for adapter, info in viewitems(adapters):
+                if 'expires' in info:
+                    heap.append((info['expires'], next(self._expiry_counter), uuid, adapter, info))
+
+        heapq.heapify(heap)
+        self._expiry_heap = heap
 
     def device_lost_callback(self, adapter, uuid):
         """Remove a device record from scanned_devices
@@ -635,6 +762,7 @@ class DeviceManager(object):
             return
 
         del devrecord[adapter]
+        self._update_device_index(uuid)
 
     def trace_received_callback(self, connection_id, trace):
         """Callback when tracing data has been received for a connection
@@ -657,7 +785,7 @@ class DeviceManager(object):
                     connection_id
                 )
 
-        self._loop.add_callback(sync_trace_received_callback, self, connection_id, trace)
+        self.event_queue.put(sync_trace_received_callback, self, connection_id, trace)
 
     def report_received_callback(self, connection_id, report):
         """Callback when a report has been received.
@@ -689,27 +817,30 @@ class DeviceManager(object):
             except KeyError:
                 self._logger.warn('Dropping report for a connection that has no associated UUID %d', connection_id)
 
-        self._loop.add_callback(sync_reported_received_callback, self, connection_id, report)
+        self.event_queue.put(sync_reported_received_callback, self, connection_id, report)
 
     def device_expiry_callback(self):
         """Periodic callback to remove expired devices from scanned_devices list
         """
 
         expired = 0
-        for uuid, adapters in viewitems(self._scanned_devices):
-            to_remove = []
-            now = datetime.datetime.now()
+        changed = set()
+        now = datetime.datetime.now()
 
-            for adapter, dev in viewitems(adapters):
-                if 'expires' not in dev:
-                    continue
+        while len(self._expiry_heap) > 0 and now > self._expiry_heap[0][0]:
+            expires, _counter, uuid, adapter, info = heapq.heappop(self._expiry_heap)
+
+            # Skip entries for records that have since been refreshed or removed
+            adapters = self._scanned_devices.get(uuid)
+            if adapters is None or adapters.get(adapter) is not info or info.get('expires') != expires:
+                continue
 
-                if now > dev['expires']:
-                    to_remove.append(adapter)
+            del adapters[adapter]
+            changed.add(uuid)
+            expired += 1
 
-            for x in to_remove:
-                del adapters[x]
-                expired += 1
+        for uuid in changed:
+            self._update_device_index(uuid)
 
         if expired > 0:
             self._logger.info('Expired %d devices' % expired)
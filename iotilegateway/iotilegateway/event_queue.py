@@ -0,0 +1,188 @@
+"""A bounded queue that hands events from adapter threads to the gateway's IOLoop in batches.
+
+DeviceAdapters call DeviceManager from their own threads every time a device
+is scanned or a report or trace is received.  Scheduling a separate IOLoop
+callback for each of these events makes the loop wake up once per event,
+which wastes most of its time when thousands of events arrive per second.
+
+EventQueue collects events from any thread and schedules a single drain
+callback on the IOLoop that delivers up to batch_size events at a time.  If
+more events are waiting after a batch, the drain callback is scheduled again
+so that other work on the loop can run in between batches.
+"""
+
+import logging
+import threading
+from collections import deque
+from monotonic import monotonic
+import tornado.ioloop
+from iotile.core.exceptions import ArgumentError
+
+
+class EventQueue(object):
+    """A bounded, thread-safe queue of callbacks to run on a tornado IOLoop.
+
+    Events are added with put() from any thread and run in the order they were
+    added on the IOLoop.  When the queue is full, the overflow policy decides
+    what happens to a new event:
+
+    - DropNewest: The new event is discarded.
+    - DropOldest: The oldest queued event is discarded to make room.
+    - Block: The calling thread waits up to block_timeout seconds for room in
+      the queue and discards the new event if none becomes available.  Events
+      put from the IOLoop's own thread are never blocked since that would
+      deadlock the loop, they are discarded instead.
+
+    Every discarded event is counted in the queue's statistics.
+
+    Args:
+        loop (tornado.ioloop.IOLoop): The loop that events should be run on.
+        max_size (int): The maximum number of events that can be queued.
+        batch_size (int): The maximum number of events to run each time the
+            loop drains the queue.
+        policy (str): What to do when the queue is full, one of DropNewest,
+            DropOldest or Block.
+        block_timeout (float): The maximum number of seconds to block for when
+            the policy is Block.
+    """
+
+    DropNewest = 'drop_newest'
+    DropOldest = 'drop_oldest'
+    Block = 'block'
+
+    def __init__(self, loop, max_size=10000, batch_size=100, policy=Block, block_timeout=1.0):
+        if max_size < 1:
+            raise ArgumentError("EventQueue must be able to hold at least one event", max_size=max_size)
+
+        if batch_size < 1:
+            raise ArgumentError("EventQueue batch_size must be at least 1", batch_size=batch_size)
+
+        if policy not in (self.DropNewest, self.DropOldest, self.Block):
+            raise ArgumentError("Unknown EventQueue overflow policy", policy=policy)
+
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        self._loop = loop
+        self._logger = logging.getLogger(__name__)
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._space_available = threading.Condition(self._lock)
+        self._scheduled = False
+
+        self._max_depth = 0
+        self._queued = 0
+        self._delivered = 0
+        self._dropped = 0
+        self._batches = 0
+
+    @property
+    def depth(self):
+        """The number of events waiting to be run."""
+
+        return len(self._events)
+
+    @property
+    def statistics(self):
+        """Counters describing the traffic through this queue.
+
+        Returns:
+            dict: The current and maximum queue depth and the number of events
+                that were queued, delivered and dropped and the number of
+                batches they were delivered in.
+        """
+
+        with self._lock:
+            return {
+                'depth': len(self._events),
+                'max_depth': self._max_depth,
+                'queued': self._queued,
+                'delivered': self._delivered,
+                'dropped': self._dropped,
+                'batches': self._batches
+            }
+
+    def put(self, callback, *args):
+        """Queue a callback to be run on the IOLoop.
+
+        This method is safe to call from any thread.
+
+        Args:
+            callback (callable): The function to run.
+            *args: The arguments to pass to callback.
+
+        Returns:
+            bool: True if the event was queued, False if it was dropped.
+        """
+
+        schedule = False
+        with self._lock:
+            if len(self._events) >= self.max_size and not self._make_room():
+                self._dropped += 1
+                return False
+
+            self._events.append((callback, args))
+            self._queued += 1
+            self._max_depth = max(self._max_depth, len(self._events))
+
+            if not self._scheduled:
+                self._scheduled = True
+                schedule = True
+
+        if schedule:
+            self._loop.add_callback(self._drain)
+
+        return True
+
+    def _make_room(self):
+        """Try to make room for a new event in a full queue.
+
+        Must be called with the lock held.
+
+        Returns:
+            bool: True if there is room for the event.
+        """
+
+        if self.policy == self.DropOldest:
+            self._events.popleft()
+            self._dropped += 1
+            return True
+
+        if self.policy == self.DropNewest or tornado.ioloop.IOLoop.current(instance=False) is self._loop:
+            return False
+
+        end_time = monotonic() + self.block_timeout
+        while len(self._events) >= self.max_size:
+            remaining = end_time - monotonic()
+            if remaining <= 0.0:
+                return False
+
+            self._space_available.wait(remaining)
+
+        return True
+
+    def _drain(self):
+        """Run up to batch_size events on the IOLoop."""
+
+        with self._lock:
+            count = min(self.batch_size, len(self._events))
+            batch = [self._events.popleft() for _i in range(0, count)]
+            self._space_available.notify_all()
+
+        for callback, args in batch:
+            try:
+                callback(*args)
+            except Exception:  #pylint:disable=broad-except;One bad event should not stop the others
+                self._logger.exception("Error running queued event %s", callback)
+
+        with self._lock:
+            self._delivered += len(batch)
+            self._batches += 1
+
+            if len(self._events) == 0:
+                self._scheduled = False
+                return
+
+        self._loop.add_callback(self._drain)
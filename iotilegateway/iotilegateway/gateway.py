@@ -52,6 +52,10 @@ class IOTileGateway(threading.Thread):
             adapters (list):
                 a list of dictionaries with the device adapters to add into the gateway
                 and any arguments that should be use to create each one.
+
+            It may also contain an optional event_queue key with a dictionary of keyword
+            arguments for DeviceManager that control how events from device adapters are
+            queued: max_queued_events, event_batch_size and overflow_policy.
     """
 
     def __init__(self, config):
@@ -77,7 +81,7 @@ class IOTileGateway(threading.Thread):
         """Start the gateway and run it to completion in another thread."""
 
         self.loop = tornado.ioloop.IOLoop(make_current=True)  # To create a loop for each thread
-        self.device_manager = device.DeviceManager(self.loop)
+        self.device_manager = device.DeviceManager(self.loop, **self._config.get('event_queue', {}))
 
         # If we have an initialization error, stop trying to initialize more things and
         # just shut down cleanly
@@ -5,10 +5,13 @@ import os
 import struct
 import logging
 import sys
+import copy
+import time
 from iotile.mock.mock_iotile import MockIOTileDevice
 from iotile.mock.mock_adapter import MockDeviceAdapter
 from iotile.core.hw.reports.individual_format import IndividualReadingReport
 from iotile.core.hw.reports.report import IOTileReading
+from iotile.core.hw.reports import BroadcastReport
 from iotilegateway.device import DeviceManager
 import threading
 from tornado.ioloop import IOLoop
@@ -59,11 +62,107 @@ class TestDeviceManager(tornado.testing.AsyncTestCase):
         assert len(res['payload']) == 6
         assert res['payload'] == b'TestCN'
 
+    def test_lazy_reports(self):
+        """Make sure adapters are asked not to decode the reports that are only forwarded."""
+
+        assert self.adapter.get_config('lazy_reports') is True
+
     def test_monitors(self):
         mon_id = self.manager.register_monitor(10, ['report'], lambda x,y: x)
         self.manager.adjust_monitor(mon_id, add_events=['connection'], remove_events=['report'])
         self.manager.remove_monitor(mon_id)
 
+    def test_monitor_routing(self):
+        """Make sure events are only routed to monitors that want them."""
+
+        events = []
+
+        def _callback(dev_uuid, event, *args):
+            events.append((dev_uuid, event))
+
+        mon_id = self.manager.register_monitor(10, ['report'], _callback)
+        self.manager.register_monitor(11, ['report', 'trace'], _callback)
+        self.manager.register_monitor(None, ['broadcast'], _callback)
+
+        self.manager.call_monitor(10, 'report')
+        self.manager.call_monitor(10, 'trace')
+        self.manager.call_monitor(11, 'trace')
+        self.manager.call_monitor(None, 'broadcast')
+        assert events == [(10, 'report'), (11, 'trace'), ('*', 'broadcast')]
+
+        del events[:]
+        self.manager.adjust_monitor(mon_id, add_events=['trace'], remove_events=['report'])
+        self.manager.call_monitor(10, 'report')
+        self.manager.call_monitor(10, 'trace')
+        assert events == [(10, 'trace')]
+
+        # Events are added before they are removed so an event in both lists is dropped
+        del events[:]
+        self.manager.adjust_monitor(mon_id, add_events=['report', 'trace'], remove_events=['trace'])
+        self.manager.call_monitor(10, 'report')
+        self.manager.call_monitor(10, 'trace')
+        assert events == [(10, 'report')]
+
+        del events[:]
+        self.manager.remove_monitor(mon_id)
+        self.manager.call_monitor(10, 'report')
+        assert events == []
+        assert (10, 'report') not in self.manager._monitor_routes
+        assert (10, 'trace') not in self.manager._monitor_routes
+
+    @tornado.testing.gen_test
+    def test_monitor_load(self):
+        """Make sure reports are routed correctly with thousands of monitors."""
+
+        device_count = 1000
+        monitors_per_device = 5
+        broadcast_monitors = 1000
+        reports_per_device = 3
+
+        received = {}
+        broadcasts = [0]
+
+        def _on_report(dev_uuid, event, report):
+            received[dev_uuid] = received.get(dev_uuid, 0) + 1
+
+        def _on_broadcast(dev_uuid, event, report):
+            broadcasts[0] += 1
+
+        conns = []
+        for i in range(0, device_count):
+            dev_uuid = 100 + i
+            for _j in range(0, monitors_per_device):
+                self.manager.register_monitor(dev_uuid, ['report'], _on_report)
+
+            # Monitors for other events should never be called
+            self.manager.register_monitor(dev_uuid, ['trace', 'connection'], None)
+
+            conn_id = self.manager._get_connection_id()
+            self.manager._update_connection_data(conn_id, 'uuid', dev_uuid)
+            conns.append(conn_id)
+
+        for _i in range(0, broadcast_monitors):
+            self.manager.register_monitor(None, ['broadcast'], _on_broadcast)
+
+        report = IndividualReadingReport.FromReadings(100, [IOTileReading(0, 1, 2)])
+        for _i in range(0, reports_per_device):
+            for conn_id in conns:
+                self.manager.report_received_callback(conn_id, report)
+
+        broadcast = BroadcastReport.FromReadings(100, [IOTileReading(0, 1, 2)])
+        self.manager.report_received_callback(None, broadcast)
+
+        while self.manager.event_queue.depth > 0:
+            yield tornado.gen.moment
+
+        stats = self.manager.event_queue.statistics
+        assert stats['dropped'] == 0
+        assert stats['batches'] > 1
+
+        assert len(received) == device_count
+        assert all(x == monitors_per_device * reports_per_device for x in received.values())
+        assert broadcasts[0] == broadcast_monitors
+
     def test_scan(self):
         devs = self.manager.scanned_devices
         assert len(devs) == 0
@@ -109,3 +208,55 @@ class TestDeviceManager(tornado.testing.AsyncTestCase):
 
         assert len(self.reports) == 1
         print(self.reports[0])
+
+    def test_scan_index(self):
+        """Make sure the best route to a device is tracked across adapters."""
+
+        self.manager._on_device_found(0, {'uuid': 5, 'connection_string': 'a', 'signal_strength': -80}, 0)
+        self.manager._on_device_found(1, {'uuid': 5, 'connection_string': 'b', 'signal_strength': -50}, 0)
+
+        devs = self.manager.scanned_devices
+        assert devs is self.manager.scanned_devices
+        assert devs[5]['best_adapter'] == 1
+        assert devs[5]['signal_strength'] == -50
+        assert [x[2] for x in devs[5]['adapters']] == ['1/b', '0/a']
+        assert 'connection_string' not in devs[5]
+
+        with pytest.raises(TypeError):
+            devs[5]['signal_strength'] = 0
+
+        with pytest.raises(TypeError):
+            del devs[5]
+
+        modifiable = copy.deepcopy(devs)
+        modifiable[5]['signal_strength'] = 0
+        del modifiable[5]
+
+        self.manager.device_lost_callback(1, 5)
+        devs2 = self.manager.scanned_devices
+        assert devs2 is not devs
+        assert devs2[5]['best_adapter'] == 0
+        assert len(devs[5]['adapters']) == 2
+
+        self.manager.device_lost_callback(0, 5)
+        assert len(self.manager.scanned_devices) == 0
+
+    def test_scan_expiry(self):
+        """Make sure only expired device records are removed."""
+
+        self.manager._on_device_found(0, {'uuid': 5, 'connection_string': 'a', 'signal_strength': -50}, 0.05)
+        self.manager._on_device_found(1, {'uuid': 5, 'connection_string': 'b', 'signal_strength': -80}, 60)
+        self.manager._on_device_found(0, {'uuid': 6, 'connection_string': 'c', 'signal_strength': -50}, 0.05)
+        self.manager._on_device_found(0, {'uuid': 7, 'connection_string': 'd', 'signal_strength': -50}, 0)
+
+        # Seeing the device again should replace its old expiration time
+        self.manager._on_device_found(0, {'uuid': 6, 'connection_string': 'c', 'signal_strength': -50}, 60)
+
+        time.sleep(0.1)
+        self.manager.device_expiry_callback()
+
+        devs = self.manager.scanned_devices
+        assert sorted(devs) == [5, 6, 7]
+        assert devs[5]['best_adapter'] == 1
+        assert len(devs[5]['adapters']) == 1
+        assert len(self.manager._expiry_heap) == 2
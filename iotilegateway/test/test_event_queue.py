@@ -0,0 +1,126 @@
+import threading
+import pytest
+import tornado.gen
+import tornado.testing
+from iotile.core.exceptions import ArgumentError
+from iotilegateway.event_queue import EventQueue
+
+
+class TestEventQueue(tornado.testing.AsyncTestCase):
+    def setUp(self):
+        super(TestEventQueue, self).setUp()
+        self.events = []
+
+    def _record(self, value):
+        self.events.append(value)
+
+    @tornado.gen.coroutine
+    def _wait_drained(self, queue):
+        while queue.depth > 0:
+            yield tornado.gen.moment
+
+        # Let the final batch finish running
+        yield tornado.gen.moment
+
+    def _put_from_thread(self, queue, values):
+        results = []
+
+        def _producer():
+            for value in values:
+                results.append(queue.put(self._record, value))
+
+        thread = threading.Thread(target=_producer)
+        thread.start()
+        return thread, results
+
+    @tornado.testing.gen_test
+    def test_batching(self):
+        """Make sure events from another thread are delivered in order and in batches."""
+
+        queue = EventQueue(self.io_loop, batch_size=10)
+        thread, results = self._put_from_thread(queue, range(0, 95))
+        thread.join()
+
+        yield self._wait_drained(queue)
+
+        assert all(results)
+        assert self.events == list(range(0, 95))
+
+        stats = queue.statistics
+        assert stats['queued'] == 95
+        assert stats['delivered'] == 95
+        assert stats['dropped'] == 0
+        assert stats['depth'] == 0
+        assert stats['batches'] == 10
+
+    @tornado.testing.gen_test
+    def test_drop_policies(self):
+        """Make sure full queues drop the right events."""
+
+        newest = EventQueue(self.io_loop, max_size=5, policy=EventQueue.DropNewest)
+        oldest = EventQueue(self.io_loop, max_size=5, policy=EventQueue.DropOldest)
+
+        results = [newest.put(self._record, ('newest', i)) for i in range(0, 8)]
+        assert results == [True]*5 + [False]*3
+
+        results = [oldest.put(self._record, ('oldest', i)) for i in range(0, 8)]
+        assert all(results)
+
+        yield self._wait_drained(newest)
+        yield self._wait_drained(oldest)
+
+        assert [x[1] for x in self.events if x[0] == 'newest'] == [0, 1, 2, 3, 4]
+        assert [x[1] for x in self.events if x[0] == 'oldest'] == [3, 4, 5, 6, 7]
+        assert newest.statistics['dropped'] == 3
+        assert oldest.statistics['dropped'] == 3
+        assert oldest.statistics['max_depth'] == 5
+
+    @tornado.testing.gen_test
+    def test_block_policy(self):
+        """Make sure producer threads wait for room instead of dropping events."""
+
+        queue = EventQueue(self.io_loop, max_size=5, batch_size=2, policy=EventQueue.Block, block_timeout=10.0)
+        thread, results = self._put_from_thread(queue, range(0, 50))
+
+        while thread.is_alive():
+            yield tornado.gen.moment
+
+        yield self._wait_drained(queue)
+
+        assert all(results)
+        assert self.events == list(range(0, 50))
+        assert queue.statistics['dropped'] == 0
+        assert queue.statistics['max_depth'] <= 5
+
+        # Events put from the loop itself must never block
+        results = [queue.put(self._record, i) for i in range(0, 8)]
+        assert results == [True]*5 + [False]*3
+        assert queue.statistics['dropped'] == 3
+
+    @tornado.testing.gen_test
+    def test_event_errors(self):
+        """Make sure an exception in one event does not stop the others."""
+
+        def _fail(value):
+            raise ValueError(value)
+
+        queue = EventQueue(self.io_loop)
+        queue.put(self._record, 1)
+        queue.put(_fail, 2)
+        queue.put(self._record, 3)
+
+        yield self._wait_drained(queue)
+        assert self.events == [1, 3]
+        assert queue.statistics['delivered'] == 3
+
+    def test_arguments(self):
+        """Make sure invalid settings are rejected."""
+
+        with pytest.raises(ArgumentError):
+            EventQueue(self.io_loop, max_size=0)
+
+        with pytest.raises(ArgumentError):
+            EventQueue(self.io_loop, batch_size=0)
+
+        with pytest.raises(ArgumentError):
+            EventQueue(self.io_loop, policy='unknown')
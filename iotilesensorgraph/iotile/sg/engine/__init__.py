@@ -1,3 +1,4 @@
 from .in_memory import InMemoryStorageEngine
+from .ring_buffer import RingBufferStorageEngine
 
-__all__ = ['InMemoryStorageEngine']
+__all__ = ['InMemoryStorageEngine', 'RingBufferStorageEngine']
@@ -15,6 +15,8 @@ class InMemoryStorageEngine(object):
             be seen on an actual device.
     """
 
+    absolute_indexing = False
+
     def __init__(self, model):
         self.model = model
         self.storage_length = model.get(u'max_storage_buffer')
@@ -0,0 +1,207 @@
+"""A fixed capacity ring buffer storage engine for sensor graph."""
+
+from builtins import str
+from iotile.sg import DataStream
+from iotile.sg.exceptions import StorageFullError, StreamEmptyError
+
+
+class _RingBuffer(object):
+    """A preallocated circular buffer addressed by monotonic absolute indices.
+
+    The first reading ever pushed has index 0 and every subsequent reading
+    gets the next integer.  Indices are never reused or shifted when old
+    readings are dropped so anyone holding an index does not need to be
+    told when the buffer rolls over.
+
+    Args:
+        capacity (int): The maximum number of readings that can be stored.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.start = 0
+        self.end = 0
+        self._data = [None] * capacity
+
+    def __len__(self):
+        return self.end - self.start
+
+    def full(self):
+        return (self.end - self.start) == self.capacity
+
+    def append(self, value):
+        self._data[self.end % self.capacity] = value
+        self.end += 1
+        return self.end - 1
+
+    def get(self, index):
+        return self._data[index % self.capacity]
+
+    def drop(self, count):
+        """Drop and return the oldest count values."""
+
+        dropped = []
+        for index in range(self.start, self.start + count):
+            slot = index % self.capacity
+            dropped.append(self._data[slot])
+            self._data[slot] = None
+
+        self.start += count
+        return dropped
+
+    def clear(self):
+        self._data = [None] * self.capacity
+        self.start = 0
+        self.end = 0
+
+
+class RingBufferStorageEngine(object):
+    """A storage engine backed by fixed size ring buffers.
+
+    This engine is a drop-in replacement for InMemoryStorageEngine that
+    performs push, get and popn without copying the rest of the buffer,
+    so its cost does not grow with the size of the device's storage
+    area.
+
+    In addition to the relative offsets used by InMemoryStorageEngine,
+    every reading is addressable by an absolute index that does not
+    change when older readings are erased.  Stream walkers that use
+    absolute indices (see start_index, end_index and get_absolute) do not
+    need to have their offsets fixed up on every rollover.
+
+    Args:
+        model (DeviceModel): A model for the device type that we are
+            emulating so that we can constrain our total memory
+            size appropriately to get the same behavior that would
+            be seen on an actual device.
+    """
+
+    absolute_indexing = True
+
+    def __init__(self, model):
+        self.model = model
+        self.storage_length = model.get(u'max_storage_buffer')
+        self.streaming_length = model.get(u'max_streaming_buffer')
+        self.streaming_data = _RingBuffer(self.streaming_length)
+        self.storage_data = _RingBuffer(self.storage_length)
+
+    def _buffer(self, buffer_type):
+        if buffer_type == u'streaming':
+            return self.streaming_data
+
+        return self.storage_data
+
+    def count(self):
+        """Count the number of readings.
+
+        Returns:
+            (int, int): The number of readings in storage and streaming
+        """
+
+        return (len(self.storage_data), len(self.streaming_data))
+
+    def clear(self):
+        """Clear all data from this storage engine."""
+
+        self.storage_data.clear()
+        self.streaming_data.clear()
+
+    def push(self, value):
+        """Store a new value for the given stream.
+
+        Args:
+            value (IOTileReading): The value to store.  The stream
+                parameter must have the correct value
+
+        Returns:
+            int: The absolute index assigned to the value.
+        """
+
+        stream = DataStream.FromEncoded(value.stream)
+
+        if stream.stream_type == DataStream.OutputType:
+            if self.streaming_data.full():
+                raise StorageFullError('Streaming buffer full')
+
+            return self.streaming_data.append(value)
+
+        if self.storage_data.full():
+            raise StorageFullError('Storage buffer full')
+
+        return self.storage_data.append(value)
+
+    def start_index(self, buffer_type):
+        """Get the absolute index of the oldest reading in a buffer.
+
+        Args:
+            buffer_type (str): The buffer to query (either u"storage" or u"streaming")
+
+        Returns:
+            int: The absolute index of the oldest reading still stored.
+        """
+
+        return self._buffer(buffer_type).start
+
+    def end_index(self, buffer_type):
+        """Get the absolute index that the next reading pushed will receive.
+
+        Args:
+            buffer_type (str): The buffer to query (either u"storage" or u"streaming")
+
+        Returns:
+            int: One past the absolute index of the newest reading.
+        """
+
+        return self._buffer(buffer_type).end
+
+    def get_absolute(self, buffer_type, index):
+        """Get a reading from the buffer by its absolute index.
+
+        Args:
+            buffer_type (str): The buffer to get from (either u"storage" or u"streaming")
+            index (int): The absolute index of the reading to get
+        """
+
+        chosen_buffer = self._buffer(buffer_type)
+
+        if index < chosen_buffer.start or index >= chosen_buffer.end:
+            raise StreamEmptyError("Invalid index given in get command", requested=index, start=chosen_buffer.start, end=chosen_buffer.end, buffer=buffer_type)
+
+        return chosen_buffer.get(index)
+
+    def get(self, buffer_type, offset):
+        """Get a reading from the buffer at offset.
+
+        Offset is specified relative to the start of the data buffer in
+        the same way as InMemoryStorageEngine.get.
+
+        Args:
+            buffer_type (str): The buffer to get from (either u"storage" or u"streaming")
+            offset (int): The offset of the reading to get
+        """
+
+        chosen_buffer = self._buffer(buffer_type)
+
+        if offset >= len(chosen_buffer):
+            raise StreamEmptyError("Invalid index given in get command", requested=offset, stored=len(chosen_buffer), buffer=buffer_type)
+
+        return chosen_buffer.get(chosen_buffer.start + offset)
+
+    def popn(self, buffer_type, count):
+        """Remove and return the oldest count values from the named buffer
+
+        Args:
+            buffer_type (str): The buffer to pop from (either u"storage" or u"streaming")
+            count (int): The number of readings to pop
+
+        Returns:
+            list(IOTileReading): The values popped from the buffer
+        """
+
+        buffer_type = str(buffer_type)
+        chosen_buffer = self._buffer(buffer_type)
+
+        if count > len(chosen_buffer):
+            raise StreamEmptyError("Not enough data in buffer for popn command", requested=count, stored=len(chosen_buffer), buffer=buffer_type)
+
+        return chosen_buffer.drop(count)
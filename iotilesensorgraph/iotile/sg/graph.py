@@ -34,6 +34,8 @@ class SensorGraph(object):
         self.sensor_log = sensor_log
         self.model = model
 
+        self._execution_plan = None
+
     def add_node(self, node_descriptor):
         """Add a node to the sensor graph based on the description given.
 
@@ -85,6 +87,9 @@ class SensorGraph(object):
         node.set_func(processor, func)
         self.nodes.append(node)
 
+        # Any previously compiled plan no longer reflects the graph
+        self._execution_plan = None
+
     def add_config(self, slot, config_id, config_type, value):
         """Add a config variable assignment to this sensor graph.
 
@@ -270,6 +275,34 @@ class SensorGraph(object):
         except ArgumentError:
             return 0
 
+    def compile_execution_plan(self):
+        """Compile this sensor graph into a faster, table driven form.
+
+        Once compiled, all calls to process_input are executed using the
+        compiled ExecutionPlan, which produces exactly the same results as
+        the reference interpreter in process_input but avoids rebuilding
+        its internal data structures for every input.
+
+        This must be called once the graph is complete (including any
+        optimization passes) since the plan is a snapshot of the graph's
+        structure.  Adding a node discards the plan.
+
+        Returns:
+            ExecutionPlan: The compiled plan.
+        """
+
+        # Delayed import to avoid a circular dependency
+        from .plan import ExecutionPlan
+
+        self._execution_plan = ExecutionPlan(self)
+        return self._execution_plan
+
+    @property
+    def compiled(self):
+        """Whether process_input uses a compiled execution plan."""
+
+        return self._execution_plan is not None
+
     def process_input(self, stream, value, rpc_executor):
         """Process an input through this sensor graph.
 
@@ -283,6 +316,10 @@ class SensorGraph(object):
                 in case we need to do that.
         """
 
+        if self._execution_plan is not None:
+            self._execution_plan.process_input(stream, value, rpc_executor)
+            return
+
         self.sensor_log.push(stream, value)
 
         to_check = deque([x for x in self.roots])
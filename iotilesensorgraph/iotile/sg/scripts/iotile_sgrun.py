@@ -3,10 +3,13 @@
 import sys
 import argparse
 from builtins import str
+from monotonic import monotonic
 from iotile.core.exceptions import ArgumentError, IOTileException
-from iotile.sg import DeviceModel, DataStreamSelector, SlotIdentifier
-from iotile.sg.sim import SensorGraphSimulator
+from iotile.sg import DeviceModel, DataStream, DataStreamSelector
+from iotile.sg.sim import SensorGraphSimulator, parse_mock_rpc
 from iotile.sg.sim.hosted_executor import SemihostedRPCExecutor
+from iotile.sg.sim.batch import load_manifest, run_batch
+from iotile.sg.sim.trace import compare_trace_files
 from iotile.sg.parser import SensorGraphFileParser
 from iotile.sg.known_constants import user_connected
 from iotile.sg.optimizer import SensorGraphOptimizer
@@ -54,6 +57,20 @@ examples:
     iotile-sgrun -i "input 1 = 5" <sensor_graph file> -s "run_time 1 minute"
         This will run the simulation for exactly 60 simulated seconds and begin
         the simulation by injecting the value 5 onto input 1 exactly once.
+
+    iotile-sgrun -s "run_time 1 day" -t out.bin <sensor_graph file>
+        This will save a trace of all output streams in the compact binary
+        trace format, which is much faster to save and load than json for
+        long simulations.
+
+    iotile-sgrun --diff expected.json out.bin
+        This will compare two saved traces, in any combination of formats,
+        and print the first reading where they differ.
+
+    iotile-sgrun --batch jobs.json -j 4
+        This will run every simulation listed in the manifest file jobs.json
+        using 4 worker processes and print how long each one took.  See
+        iotile.sg.sim.batch for the manifest format.
 """
 
 
@@ -61,58 +78,94 @@ def build_args():
     """Create command line argument parser."""
 
     parser = argparse.ArgumentParser(description=DESCRIPTION, formatter_class=argparse.RawDescriptionHelpFormatter)
-    parser.add_argument(u'sensor_graph', type=str, help=u"The sensor graph file to load and run.")
+    parser.add_argument(u'sensor_graph', type=str, nargs=u'?', help=u"The sensor graph file to load and run.")
     parser.add_argument(u'--stop', u'-s', action=u"append", default=[], type=str, help=u"A stop condition for when the simulation should end.")
     parser.add_argument(u'--realtime', u'-r', action=u"store_true", help=u"Do not accelerate the simulation, pin the ticks to wall clock time")
     parser.add_argument(u'--watch', u'-w', action=u"append", default=[], help=u"A stream to watch and print whenever writes are made.")
     parser.add_argument(u'--trace', u'-t', help=u"Trace all writes to output streams to a file")
+    parser.add_argument(u'--trace-format', choices=[u'json', u'binary'], default=None, help=u"The format of the trace file (defaults to binary for .bin or .sgtr files, otherwise json)")
+    parser.add_argument(u'--diff', nargs=2, metavar=(u'TRACE_A', u'TRACE_B'), help=u"Compare two saved trace files (json or binary) instead of running a simulation")
     parser.add_argument(u'--disable-optimizer', action="store_true", help=u"disable the sensor graph optimizer completely")
     parser.add_argument(u"--mock-rpc", u"-m", action=u"append", type=str, default=[], help=u"mock an rpc, format should be <slot id>:<rpc_id> = value.  For example -m \"slot 1:0x500a = 10\"")
     parser.add_argument(u"--port", u"-p", help=u"The port to use to connect to a device if we are semihosting")
     parser.add_argument(u"--semihost-device", u"-d", type=lambda x: int(x, 0), help=u"The device id of the device we should semihost this sensor graph on.")
     parser.add_argument(u"-c", u"--connected", action="store_true", help=u"Simulate with a user connected to the device (to enable realtime outputs)")
+    parser.add_argument(u"--batch", u"-b", help=u"Run all of the simulation jobs in a json manifest file instead of a single sensor graph")
+    parser.add_argument(u"--processes", u"-j", type=int, default=None, help=u"The number of worker processes to use in batch mode (defaults to the number of CPUs)")
     parser.add_argument(u"-i", u"--stimulus", action=u"append", default=[], help="Push a value to an input stream at the specified time (or before starting).  The syntax is [time: ][system ]input X = Y where X and Y are integers")
     return parser
 
 
-def process_mock_rpc(input_string):
-    """Process a mock RPC argument.
+def run_batch_manifest(manifest_path, processes):
+    """Run all of the jobs in a batch manifest and print their results.
 
     Args:
-        input_string (str): The input string that should be in the format
-            <slot id>:<rpc id> = value
+        manifest_path (str): The path to the json manifest file.
+        processes (int): The number of worker processes to use or None
+            to use one per CPU.
+
+    Returns:
+        int: 0 if all jobs succeeded, otherwise 1.
     """
 
-    spec, equals, value = input_string.partition(u'=')
+    jobs = load_manifest(manifest_path)
 
-    if len(equals) == 0:
-        print("Could not parse mock RPC argument: {}".format(input_string))
-        sys.exit(1)
+    start = monotonic()
+    results = run_batch(jobs, processes)
+    elapsed = monotonic() - start
 
-    try:
-        value = int(value.strip(), 0)
-    except ValueError as exc:
-        print("Could not parse mock RPC value: {}".format(str(exc)))
-        sys.exit(1)
+    failed = 0
+    total_time = 0.0
+    total_readings = 0
 
-    slot, part, rpc_id = spec.partition(u":")
-    if len(part) == 0:
-        print("Could not parse mock RPC slot/rpc definition: {}".format(spec))
-        sys.exit(1)
+    for result in results:
+        if not result.succeeded:
+            failed += 1
+            print("{}: FAILED ({})".format(result.name, result.error))
+            continue
 
-    try:
-        slot = SlotIdentifier.FromString(slot)
-    except ArgumentError as exc:
-        print("Could not parse slot id in mock RPC definition: {}".format(exc.msg))
-        sys.exit(1)
+        total_time += result.wall_time
+        total_readings += result.readings
+        print("{}: {:.3f} s, {} ticks, {} readings ({:.0f} readings/s), {} traced".format(
+            result.name, result.wall_time, result.ticks, result.readings, result.readings_per_second, result.traced))
 
-    try:
-        rpc_id = int(rpc_id, 0)
-    except ValueError as exc:
-        print("Could not parse mock RPC number: {}".format(str(exc)))
-        sys.exit(1)
+    print("Ran {} jobs ({} failed), {} readings in {:.3f} s ({:.3f} s total job run time)".format(
+        len(results), failed, total_readings, elapsed, total_time))
+
+    if failed > 0:
+        return 1
+
+    return 0
+
+
+def diff_traces(path_a, path_b):
+    """Compare two trace files and print the first difference.
+
+    Args:
+        path_a (str): The path to the first trace file.
+        path_b (str): The path to the second trace file.
+
+    Returns:
+        int: 0 if the traces are identical, otherwise 1.
+    """
+
+    difference = compare_trace_files(path_a, path_b)
+    if difference is None:
+        print("Traces are identical")
+        return 0
+
+    index, reading_a, reading_b = difference
+    print("Traces differ at reading {}".format(index))
+
+    for path, reading in ((path_a, reading_a), (path_b, reading_b)):
+        if reading is None:
+            print("  {}: <end of trace>".format(path))
+        else:
+            print("  {}: ({: 8} s) {}: {} (id {})".format(path, reading.raw_time, DataStream.FromEncoded(reading.stream),
+                                                       reading.value, reading.reading_id))
+
+    return 1
 
-    return slot, rpc_id, value
 
 def watch_printer(watch, value):
     """Print a watched value.
@@ -146,6 +199,15 @@ def main(argv=None):
         parser = build_args()
         args = parser.parse_args(args=argv)
 
+        if args.diff is not None:
+            return diff_traces(*args.diff)
+
+        if args.batch is not None:
+            return run_batch_manifest(args.batch, args.processes)
+
+        if args.sensor_graph is None:
+            parser.error(u"You must specify a sensor graph file to run (or use --batch or --diff)")
+
         model = DeviceModel()
 
         parser = SensorGraphFileParser()
@@ -172,7 +234,12 @@ def main(argv=None):
             sim.rpc_executor = executor
 
         for mock in args.mock_rpc:
-            slot, rpc_id, value = process_mock_rpc(mock)
+            try:
+                slot, rpc_id, value = parse_mock_rpc(mock)
+            except ArgumentError as exc:
+                print("Could not parse mock RPC argument {}: {}".format(mock, exc.msg))
+                return 1
+
             sim.rpc_executor.mock(slot, rpc_id, value)
 
         for stim in args.stimulus:
@@ -187,12 +254,12 @@ def main(argv=None):
             if args.connected:
                 sim.step(user_connected, 8)
 
-            sim.run(accelerated=not args.realtime)
+            sim.run(accelerated=not args.realtime, skip_idle_ticks=not args.realtime)
         except KeyboardInterrupt:
             pass
 
         if args.trace is not None:
-            sim.trace.save(args.trace)
+            sim.trace.save(args.trace, format=args.trace_format)
     finally:
         if executor is not None:
             executor.hw.close()
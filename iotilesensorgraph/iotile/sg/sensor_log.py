@@ -9,12 +9,30 @@ a hard cap on storage requirements.
 import copy
 from .engine import InMemoryStorageEngine
 from .stream import DataStreamSelector, DataStream
-from .walker import VirtualStreamWalker, CounterStreamWalker, BufferedStreamWalker
+from .walker import VirtualStreamWalker, CounterStreamWalker, BufferedStreamWalker, RingBufferStreamWalker
 from .exceptions import StreamEmptyError, StorageFullError
 from iotile.sg.model import DeviceModel
 from iotile.core.exceptions import ArgumentError
 
 
+def _copy_reading(reading):
+    """Make a shallow copy of a reading.
+
+    This is equivalent to copy.copy(reading) but is significantly faster
+    for normal objects since it does not go through the pickle protocol.
+    It is called on every reading pushed into the sensor log.
+    """
+
+    try:
+        state = reading.__dict__
+    except AttributeError:
+        return copy.copy(reading)
+
+    new_reading = reading.__class__.__new__(reading.__class__)
+    new_reading.__dict__.update(state)
+    return new_reading
+
+
 class SensorLog(object):
     """A storage engine holding multiple named FIFOs.
 
@@ -24,7 +42,9 @@ class SensorLog(object):
             This can either be a simple, in memory data store, or
             a more complicated persistent storage setup depending on
             needs.  If not specified, a temporary in memory engine
-            is used.
+            is used.  Engines that support absolute indexing, like
+            RingBufferStorageEngine, get walkers that do not need to
+            be updated reading by reading when the buffer rolls over.
 
         model (DeviceModel): An optional device model specifying the
             constraints of the device that we are emulating.  If not
@@ -38,6 +58,11 @@ class SensorLog(object):
         self._virtual_walkers = []
         self._queue_walkers = []
 
+        # Cache of which monitors and walkers need to be notified when a
+        # given stream is pushed, keyed by encoded stream id.  It is
+        # rebuilt lazily whenever a walker or monitor is added or removed.
+        self._dispatch = {}
+
         if model is None:
             model = DeviceModel()
 
@@ -46,6 +71,7 @@ class SensorLog(object):
 
         self._engine = engine
         self._model = model
+        self._absolute_indexing = getattr(engine, 'absolute_indexing', False)
 
     def watch(self, selector, callback):
         """Call a function whenever a stream changes.
@@ -61,6 +87,7 @@ class SensorLog(object):
             self._monitors[selector] = set()
 
         self._monitors[selector].add(callback)
+        self._dispatch = {}
 
     def create_walker(self, selector):
         """Create a stream walker based on the given selector.
@@ -79,8 +106,13 @@ class SensorLog(object):
         """
 
         if selector.buffered:
-            walker = BufferedStreamWalker(selector, self._engine)
+            if self._absolute_indexing:
+                walker = RingBufferStreamWalker(selector, self._engine)
+            else:
+                walker = BufferedStreamWalker(selector, self._engine)
+
             self._queue_walkers.append(walker)
+            self._dispatch = {}
             return walker
 
         if selector.match_type == DataStream.CounterType:
@@ -89,6 +121,7 @@ class SensorLog(object):
             walker = VirtualStreamWalker(selector)
 
         self._virtual_walkers.append(walker)
+        self._dispatch = {}
 
         return walker
 
@@ -105,6 +138,8 @@ class SensorLog(object):
         else:
             self._virtual_walkers.remove(walker)
 
+        self._dispatch = {}
+
     def clear(self):
         """Clear all data from this sensor_log.
 
@@ -129,37 +164,60 @@ class SensorLog(object):
         """
 
         # Make sure the stream is correct
-        reading = copy.copy(reading)
-        reading.stream = stream.encode()
+        encoded = stream.encode()
+        reading = _copy_reading(reading)
+        reading.stream = encoded
 
-        if stream.buffered:
-            output_buffer = stream.output
+        dispatch = self._dispatch.get(encoded)
+        if dispatch is None:
+            dispatch = self._build_dispatch(stream)
+            self._dispatch[encoded] = dispatch
+
+        callbacks, virtual_walkers, queue_walkers = dispatch
 
+        if stream.buffered:
             try:
                 self._engine.push(reading)
             except StorageFullError:
                 self._erase_buffer(stream.output)
                 self._engine.push(reading)
 
-            for walker in self._queue_walkers:
-                # Only notify the walkers that are on this queue
-                if walker.selector.output == output_buffer:
-                    walker.notify_added(stream)
+            for walker in queue_walkers:
+                walker.notify_added(stream)
 
         # Activate any monitors we have for this stream
-        for selector in self._monitors:
-            if selector.matches(stream):
-                for callback in self._monitors[selector]:
-                    callback(stream, reading)
+        for callback in callbacks:
+            callback(stream, reading)
 
         # Virtual streams live only in their walkers, so update each walker
         # that contains this stream.
-        for walker in self._virtual_walkers:
-            if walker.matches(stream):
-                walker.push(stream, reading)
+        for walker in virtual_walkers:
+            walker.push(stream, reading)
 
         self._last_values[stream] = reading
 
+    def _build_dispatch(self, stream):
+        """Find all of the monitors and walkers that match a stream.
+
+        Args:
+            stream (DataStream): The stream that is being pushed.
+
+        Returns:
+            (list, list, list): The monitor callbacks, virtual walkers and
+                buffered walkers that need to be notified when a reading is
+                pushed to this stream.
+        """
+
+        callbacks = []
+        for selector in self._monitors:
+            if selector.matches(stream):
+                callbacks.extend(self._monitors[selector])
+
+        virtual_walkers = [walker for walker in self._virtual_walkers if walker.matches(stream)]
+        queue_walkers = [walker for walker in self._queue_walkers if walker.matches(stream)]
+
+        return callbacks, virtual_walkers, queue_walkers
+
     def _erase_buffer(self, output_buffer):
         """Erase readings in the specified buffer to make space."""
 
@@ -169,6 +227,16 @@ class SensorLog(object):
         if output_buffer:
             buffer_type = 'streaming'
 
+        if self._absolute_indexing:
+            start = self._engine.start_index(buffer_type)
+            old_readings = self._engine.popn(buffer_type, erase_size)
+
+            for walker in self._queue_walkers:
+                if walker.selector.output == output_buffer:
+                    walker.notify_erased(start, old_readings)
+
+            return
+
         old_readings = self._engine.popn(buffer_type, erase_size)
 
         # Now go through all of our walkers that could match and
@@ -1,6 +1,7 @@
 from .simulator import SensorGraphSimulator
+from .executor import parse_mock_rpc
 
 # FIXME: add this back once we merge the port of py36 compatible typedargs
 # from .hosted_executor import SemihostedRPCExecutor
 
-__all__ = ['SensorGraphSimulator']#, 'SemihostedRPCExecutor']
+__all__ = ['SensorGraphSimulator', 'parse_mock_rpc']#, 'SemihostedRPCExecutor']
@@ -0,0 +1,301 @@
+"""Run many sensor graph simulations in parallel from a job manifest.
+
+A batch is a list of BatchSimulationJob objects, each of which describes a
+single simulation: the sensor graph file to load, the stimuli to inject,
+the stop conditions and mock RPCs to use and where to save the resulting
+SimulationTrace.  Jobs are distributed across a pool of worker processes.
+
+Parsing and optimizing a sensor graph is usually much more expensive than
+simulating it, so each worker process keeps a cache of pristine, compiled
+SensorGraph objects keyed by file and makes a deep copy of the cached graph
+for every job instead of parsing the file again.
+
+A manifest is a json file with the following structure.  Relative paths
+are interpreted relative to the directory containing the manifest:
+
+    {
+        "jobs": [
+            {
+                "name": "basic-1",
+                "sensor_graph": "graphs/basic.sgf",
+                "stop": ["run_time 1 day"],
+                "stimuli": ["1 minute: input 1 = 5"],
+                "mock_rpcs": ["slot 1:0x8000 = 10"],
+                "connected": false,
+                "disable_optimizer": false,
+                "trace": "traces/basic-1.json"
+            }
+        ]
+    }
+"""
+
+from __future__ import (unicode_literals, absolute_import, print_function)
+import os
+import copy
+import json
+import multiprocessing
+from builtins import str
+from monotonic import monotonic
+from iotile.core.exceptions import ArgumentError, IOTileException
+from ..model import DeviceModel
+from ..stream import DataStreamSelector
+from ..known_constants import user_connected
+from ..parser import SensorGraphFileParser
+from ..optimizer import SensorGraphOptimizer
+from .simulator import SensorGraphSimulator
+from .executor import parse_mock_rpc
+
+_COUNTED_STREAMS = [u'all combined buffered', u'all combined unbuffered', u'all combined constants',
+                    u'all combined inputs', u'all combined counters', u'all combined outputs']
+
+# Per-process cache of compiled sensor graphs that have never been run
+_graph_cache = {}
+
+
+class BatchSimulationJob(object):
+    """A single simulation that should be run as part of a batch.
+
+    Args:
+        sensor_graph (str): The path to the sensor graph file to simulate.
+        stop (list of str): The stop conditions for the simulation.  At
+            least one is required.
+        stimuli (list of str): Stimuli to inject into the simulation in the
+            format accepted by SensorGraphSimulator.stimulus.
+        mock_rpcs (list of str): RPCs to mock in the format
+            <slot id>:<rpc id> = value.
+        name (str): A name for this job used in reports.  Defaults to the
+            sensor graph file name.
+        trace (str): An optional path where the SimulationTrace of this job
+            should be saved.
+        connected (bool): Simulate with a user connected to the device.
+        disable_optimizer (bool): Do not optimize the sensor graph before
+            running it.
+    """
+
+    def __init__(self, sensor_graph, stop, stimuli=None, mock_rpcs=None, name=None, trace=None,
+                 connected=False, disable_optimizer=False):
+        if stimuli is None:
+            stimuli = []
+        if mock_rpcs is None:
+            mock_rpcs = []
+        if name is None:
+            name = os.path.basename(sensor_graph)
+
+        if len(stop) == 0:
+            raise ArgumentError("A batch simulation job must have at least one stop condition", name=name)
+
+        self.name = name
+        self.sensor_graph = sensor_graph
+        self.stop = list(stop)
+        self.stimuli = list(stimuli)
+        self.mock_rpcs = [parse_mock_rpc(x) for x in mock_rpcs]
+        self.trace = trace
+        self.connected = connected
+        self.disable_optimizer = disable_optimizer
+
+    @classmethod
+    def FromDict(cls, desc, base_dir=None):
+        """Create a job from its manifest description.
+
+        Args:
+            desc (dict): The job entry from a manifest file.
+            base_dir (str): The directory that relative paths in the
+                job description are relative to.
+
+        Returns:
+            BatchSimulationJob: The decoded job.
+        """
+
+        if base_dir is None:
+            base_dir = os.getcwd()
+
+        known_keys = set(['name', 'sensor_graph', 'stop', 'stimuli', 'mock_rpcs', 'trace', 'connected', 'disable_optimizer'])
+        unknown_keys = set(desc) - known_keys
+        if len(unknown_keys) > 0:
+            raise ArgumentError("Unknown keys in batch simulation job", unknown_keys=sorted(unknown_keys), job=desc)
+
+        if 'sensor_graph' not in desc:
+            raise ArgumentError("Batch simulation job is missing a sensor_graph", job=desc)
+
+        trace = desc.get('trace')
+        if trace is not None:
+            trace = os.path.join(base_dir, trace)
+
+        return BatchSimulationJob(os.path.join(base_dir, desc['sensor_graph']), desc.get('stop', []),
+                                  stimuli=desc.get('stimuli'), mock_rpcs=desc.get('mock_rpcs'),
+                                  name=desc.get('name'), trace=trace, connected=desc.get('connected', False),
+                                  disable_optimizer=desc.get('disable_optimizer', False))
+
+
+class BatchSimulationResult(object):
+    """The outcome of running a single BatchSimulationJob.
+
+    Args:
+        name (str): The name of the job that was run.
+        wall_time (float): How long the job took to run in seconds, not
+            including the time needed to load its sensor graph.
+        ticks (int): The number of simulated seconds that passed.
+        readings (int): The total number of readings pushed into the
+            sensor log during the simulation.
+        traced (int): The number of readings recorded in the trace.
+        error (str): A description of why the job failed or None if it
+            succeeded.
+    """
+
+    def __init__(self, name, wall_time=0.0, ticks=0, readings=0, traced=0, error=None):
+        self.name = name
+        self.wall_time = wall_time
+        self.ticks = ticks
+        self.readings = readings
+        self.traced = traced
+        self.error = error
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+    @property
+    def readings_per_second(self):
+        """The number of readings produced per second of wall time."""
+
+        if self.wall_time <= 0.0:
+            return 0.0
+
+        return self.readings / self.wall_time
+
+
+def load_manifest(path):
+    """Load a list of batch simulation jobs from a manifest file.
+
+    Args:
+        path (str): The path to the json manifest file.
+
+    Returns:
+        list of BatchSimulationJob: The jobs in the manifest in order.
+    """
+
+    with open(path, "r") as infile:
+        manifest = json.load(infile)
+
+    if not isinstance(manifest, dict) or 'jobs' not in manifest:
+        raise ArgumentError("Invalid batch manifest, it must be a json object with a list of jobs", path=path)
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    return [BatchSimulationJob.FromDict(x, base_dir) for x in manifest['jobs']]
+
+
+def _load_graph(path, optimize):
+    """Get a fresh copy of a compiled sensor graph, parsing it only once per process."""
+
+    key = (os.path.abspath(path), optimize)
+
+    template = _graph_cache.get(key)
+    if template is None:
+        model = DeviceModel()
+        parser = SensorGraphFileParser()
+        parser.parse_file(path)
+        parser.compile(model)
+
+        if optimize:
+            SensorGraphOptimizer().optimize(parser.sensor_graph, model=model)
+
+        template = parser.sensor_graph
+        template.compile_execution_plan()
+        _graph_cache[key] = template
+
+    return copy.deepcopy(template)
+
+
+def run_job(job):
+    """Run a single batch simulation job in this process.
+
+    Failures are reported in the returned result rather than raised so
+    that one bad job does not abort the rest of a batch.
+
+    Args:
+        job (BatchSimulationJob): The job to run.
+
+    Returns:
+        BatchSimulationResult: The outcome of the job.
+    """
+
+    try:
+        graph = _load_graph(job.sensor_graph, not job.disable_optimizer)
+        sim = SensorGraphSimulator(graph)
+
+        for stop in job.stop:
+            sim.stop_condition(stop)
+
+        for stim in job.stimuli:
+            sim.stimulus(stim)
+
+        for slot, rpc_id, value in job.mock_rpcs:
+            sim.rpc_executor.mock(slot, rpc_id, value)
+
+        readings = [0]
+
+        def _count_reading(_stream, _reading):
+            readings[0] += 1
+
+        for selector in _COUNTED_STREAMS:
+            graph.sensor_log.watch(DataStreamSelector.FromString(selector), _count_reading)
+
+        sim.record_trace()
+        graph.load_constants()
+
+        start = monotonic()
+        if job.connected:
+            sim.step(user_connected, 8)
+
+        sim.run(skip_idle_ticks=True)
+        wall_time = monotonic() - start
+
+        if job.trace is not None:
+            sim.trace.save(job.trace)
+    except (IOTileException, EnvironmentError) as exc:
+        return BatchSimulationResult(job.name, error=str(exc))
+
+    return BatchSimulationResult(job.name, wall_time, sim.tick_count, readings[0], len(sim.trace))
+
+
+def run_batch(jobs, processes=None):
+    """Run a list of simulation jobs across a pool of worker processes.
+
+    Args:
+        jobs (list of BatchSimulationJob): The jobs that should be run.
+        processes (int): The number of worker processes to use.  Defaults
+            to the number of CPUs on this computer.  If 1 is passed, all
+            jobs are run in the current process without creating a pool.
+
+    Returns:
+        list of BatchSimulationResult: The result of each job, in the same
+            order as jobs.
+    """
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    if processes < 1:
+        raise ArgumentError("You must use at least one process to run a batch", processes=processes)
+
+    processes = min(processes, len(jobs))
+    if processes <= 1:
+        return [run_job(x) for x in jobs]
+
+    # Keep jobs for the same file together so each worker parses as few
+    # distinct sensor graphs as possible.
+    order = sorted(range(len(jobs)), key=lambda i: (jobs[i].sensor_graph, jobs[i].disable_optimizer))
+    chunksize = max(1, len(jobs) // (processes * 4))
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        sorted_results = pool.map(run_job, [jobs[i] for i in order], chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+    results = [None] * len(jobs)
+    for index, result in zip(order, sorted_results):
+        results[index] = result
+
+    return results
@@ -0,0 +1,242 @@
+"""A compact binary columnar file format for simulation traces.
+
+The json format used by SimulationTrace stores a stringified stream name
+and a dictionary for every reading, which makes large traces slow to save
+and load and very expensive to hold in memory.  The binary format stores
+each field of the readings as its own contiguous little endian array so
+that a trace can be memory mapped and its columns used directly without
+decoding every reading up front.
+
+File layout (all values little endian):
+
+    header (16 bytes): magic "SGTR", uint8 version, uint8 reserved,
+                       uint16 selector count, uint64 reading count
+    selectors:         uint16 encoded selector * selector count
+    streams column:    uint16 encoded stream * reading count
+    time column:       uint32 raw time * reading count
+    value column:      int64 value * reading count
+    reading id column: uint32 reading id * reading count
+
+Every section starts on an 8 byte boundary.
+"""
+
+from __future__ import (unicode_literals, absolute_import, print_function)
+import sys
+import mmap
+import struct
+from builtins import zip, range
+from iotile.core.hw.reports import IOTileReading
+from iotile.core.exceptions import ArgumentError
+from ..stream import DataStreamSelector
+
+MAGIC = b'SGTR'
+VERSION = 1
+
+_HEADER = struct.Struct(str('<4sBBHQ'))
+
+# (struct code, item size) for each column in the order they are stored
+_COLUMNS = (('H', 2), ('I', 4), ('q', 8), ('I', 4))
+
+# Number of readings encoded at a time when saving so that huge traces do
+# not need a temporary copy of every column in memory at once.
+_CHUNK_SIZE = 65536
+
+# Columns can be used directly out of the mapped file only if memoryview
+# supports casting and we are on a little endian machine.
+_ZERO_COPY = sys.byteorder == 'little' and hasattr(memoryview, 'cast')
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _column_offsets(selector_count, reading_count):
+    offset = _align(_HEADER.size + 2 * selector_count)
+    offsets = []
+
+    for _code, size in _COLUMNS:
+        offsets.append(offset)
+        offset = _align(offset + size * reading_count)
+
+    return offsets, offset
+
+
+def is_binary_trace(path):
+    """Check if a file contains a binary simulation trace.
+
+    Args:
+        path (str): The path to the file to check.
+
+    Returns:
+        bool: Whether the file starts with the binary trace magic number.
+    """
+
+    with open(path, "rb") as infile:
+        return infile.read(len(MAGIC)) == MAGIC
+
+
+def save_binary_trace(out_path, readings, selectors):
+    """Save a list of readings in the binary trace format.
+
+    Args:
+        out_path (str): The path of the file to create.
+        readings (list of IOTileReading): The readings to save.
+        selectors (list of DataStreamSelector): The selectors that produced
+            the readings.
+    """
+
+    count = len(readings)
+    offsets, _end = _column_offsets(len(selectors), count)
+    getters = (lambda x: x.stream, lambda x: x.raw_time, lambda x: x.value, lambda x: x.reading_id)
+
+    with open(out_path, "wb") as outfile:
+        outfile.write(_HEADER.pack(MAGIC, VERSION, 0, len(selectors), count))
+        outfile.write(struct.pack(str('<{}H').format(len(selectors)), *[x.encode() for x in selectors]))
+
+        for (code, _size), offset, getter in zip(_COLUMNS, offsets, getters):
+            outfile.write(b'\0' * (offset - outfile.tell()))
+
+            for start in range(0, count, _CHUNK_SIZE):
+                chunk = readings[start:start + _CHUNK_SIZE]
+
+                try:
+                    outfile.write(struct.pack(str('<{}{}').format(len(chunk), code), *[getter(x) for x in chunk]))
+                except struct.error as exc:
+                    raise ArgumentError("Reading cannot be stored in a binary trace", error=str(exc))
+
+
+class _PackedColumn(object):
+    """A column that is unpacked from the mapped file as it is accessed.
+
+    This is used when the column cannot be cast directly out of the map,
+    i.e. on python 2 or a big endian machine.  Iterating over the column
+    only unpacks _CHUNK_SIZE items at a time so it does not need a copy of
+    the entire column in memory.  Slicing the column returns a list.
+    """
+
+    def __init__(self, data, code, size, offset, count):
+        self._data = data
+        self._code = code
+        self._size = size
+        self._offset = offset
+        self._count = count
+        self._item = struct.Struct(str('<') + code)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+
+        if index < 0:
+            index += self._count
+
+        if index < 0 or index >= self._count:
+            raise IndexError("Binary trace column index out of range")
+
+        return self._item.unpack_from(self._data, self._offset + index * self._size)[0]
+
+    def __iter__(self):
+        for start in range(0, self._count, _CHUNK_SIZE):
+            length = min(_CHUNK_SIZE, self._count - start)
+            fmt = str('<{}{}').format(length, self._code)
+
+            for value in struct.unpack_from(fmt, self._data, self._offset + start * self._size):
+                yield value
+
+
+class BinaryTraceFile(object):
+    """A memory mapped, read-only view of a binary simulation trace.
+
+    Readings are only decoded when they are accessed so iterating over a
+    trace of any size uses a constant amount of memory.  The raw columns
+    are available as the streams, times, values and reading_ids
+    properties, which support len() and indexing.
+
+    Args:
+        path (str): The path to the binary trace file to open.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._map = None
+        self._views = []
+        self._file = open(path, "rb")
+
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, EnvironmentError):
+            self._file.close()
+            raise ArgumentError("Could not map binary trace file, it may be empty", path=path)
+
+        if len(self._map) < _HEADER.size:
+            self.close()
+            raise ArgumentError("Binary trace file is truncated", path=path)
+
+        magic, version, _reserved, selector_count, count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ArgumentError("File is not a supported binary trace", path=path, magic=magic, version=version)
+
+        offsets, _end = _column_offsets(selector_count, count)
+        end = offsets[-1] + _COLUMNS[-1][1] * count
+        actual = len(self._map)
+        if actual < end:
+            self.close()
+            raise ArgumentError("Binary trace file is truncated", path=path, expected=end, actual=actual)
+
+        encoded = struct.unpack_from(str('<{}H').format(selector_count), self._map, _HEADER.size)
+        self.selectors = [DataStreamSelector.FromEncoded(x) for x in encoded]
+
+        self._count = count
+        self._columns = [self._column(code, size, offset) for (code, size), offset in zip(_COLUMNS, offsets)]
+        self.streams, self.times, self.values, self.reading_ids = self._columns
+
+    def _column(self, code, size, offset):
+        """Get a sequence object for one column of readings."""
+
+        if _ZERO_COPY:
+            view = memoryview(self._map)[offset:offset + size * self._count].cast(str(code))
+            self._views.append(view)
+            return view
+
+        return _PackedColumn(self._map, code, size, offset, self._count)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+
+        if index < 0 or index >= self._count:
+            raise IndexError("Binary trace index out of range")
+
+        return IOTileReading(self.times[index], self.streams[index], self.values[index], reading_id=self.reading_ids[index])
+
+    def __iter__(self):
+        for raw_time, stream, value, reading_id in zip(self.times, self.streams, self.values, self.reading_ids):
+            yield IOTileReading(raw_time, stream, value, reading_id=reading_id)
+
+    def close(self):
+        """Release the memory map and close the underlying file."""
+
+        for view in self._views:
+            view.release()
+
+        self._views = []
+        self._columns = []
+        self.streams = self.times = self.values = self.reading_ids = None
+
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
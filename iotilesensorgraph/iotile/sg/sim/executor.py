@@ -8,7 +8,34 @@ locally in a simulated device or just mock the response as needed.
 """
 
 import struct
-from iotile.core.exceptions import InternalError, HardwareError
+from iotile.core.exceptions import ArgumentError, InternalError, HardwareError
+from ..slot import SlotIdentifier
+
+
+def parse_mock_rpc(input_string):
+    """Parse a mock RPC description.
+
+    Args:
+        input_string (str): The input string that should be in the format
+            <slot id>:<rpc id> = value
+
+    Returns:
+        (SlotIdentifier, int, int): The slot, rpc id and value to return.
+    """
+
+    spec, equals, value = input_string.partition(u'=')
+    slot, colon, rpc_id = spec.partition(u':')
+
+    if len(equals) == 0 or len(colon) == 0:
+        raise ArgumentError("Could not parse mock RPC, format should be <slot id>:<rpc id> = value", mock_rpc=input_string)
+
+    try:
+        value = int(value.strip(), 0)
+        rpc_id = int(rpc_id.strip(), 0)
+    except ValueError:
+        raise ArgumentError("Could not parse mock RPC id or value as an integer", mock_rpc=input_string)
+
+    return SlotIdentifier.FromString(slot.strip()), rpc_id, value
 
 
 class RPCExecutor(object):
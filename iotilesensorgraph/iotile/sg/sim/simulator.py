@@ -107,7 +107,7 @@ class SensorGraphSimulator(object):
         reading = IOTileReading(input_stream.encode(), self.tick_count, value)
         self.sensor_graph.process_input(input_stream, reading, self.rpc_executor)
 
-    def run(self, include_reset=True, accelerated=True):
+    def run(self, include_reset=True, accelerated=True, skip_idle_ticks=False):
         """Run this sensor graph until a stop condition is hit.
 
         Multiple calls to this function are useful only if
@@ -121,6 +121,13 @@ class SensorGraphSimulator(object):
             accelerated (bool): Whether to run this sensor graph as
                 fast as possible or to delay tick events to simulate
                 the actual passage of wall clock time.
+            skip_idle_ticks (bool): Instead of advancing one second at a
+                time, jump directly to the next tick where an input, user
+                tick, system tick or stimulus will fire.  The results are
+                identical to stepping every second.  This only takes effect
+                when accelerated is True and every stop condition can
+                predict when it will stop (see StopCondition.ticks_until_stop),
+                otherwise the simulation steps one second at a time.
         """
 
         self._start_tick = self.tick_count
@@ -132,16 +139,11 @@ class SensorGraphSimulator(object):
             pass  # TODO: include a reset event here
 
         # Process all stimuli that occur at the start of the simulation
-        i = None
-        for i, stim in enumerate(self.stimuli):
-            if stim.time != 0:
-                break
+        self._process_stimuli(0)
 
-            reading = IOTileReading(self.tick_count, stim.stream.encode(), stim.value)
-            self.sensor_graph.process_input(stim.stream, reading, self.rpc_executor)
-
-        if i is not None and i > 0:
-            self.stimuli = self.stimuli[i:]
+        if accelerated and skip_idle_ticks and self._can_skip_ticks():
+            self._run_skipping()
+            return
 
         while not self._check_stop_conditions(self.sensor_graph):
             # Process one more one second tick
@@ -151,35 +153,116 @@ class SensorGraphSimulator(object):
             # To match what is done in actual hardware, we increment tick count so the first tick
             # is 1.
             self.tick_count += 1
+            self._process_tick(self.tick_count)
 
-            # Process all stimuli that occur at this tick of the simulation
-            i = None
-            for i, stim in enumerate(self.stimuli):
-                if stim.time != self.tick_count:
-                    break
+            now = monotonic()
 
-                reading = IOTileReading(self.tick_count, stim.stream.encode(), stim.value)
-                self.sensor_graph.process_input(stim.stream, reading, self.rpc_executor)
+            # If we are trying to execute this sensor graph in realtime, wait for
+            # the remaining slice of this tick.
+            if (not accelerated) and (now < next_tick):
+                time.sleep(next_tick - now)
 
-            if i is not None and i > 0:
-                self.stimuli = self.stimuli[i:]
+    def _run_skipping(self):
+        """Run the simulation jumping directly between ticks where something happens."""
 
-            self._check_additional_ticks(self.tick_count)
+        while not self._check_stop_conditions(self.sensor_graph):
+            next_event = self._next_event_tick(self.tick_count)
+            stop_tick = self._next_stop_tick()
 
-            if (self.tick_count % 10) == 0:
-                reading = IOTileReading(self.tick_count, system_tick.encode(), self.tick_count)
-                self.sensor_graph.process_input(system_tick, reading, self.rpc_executor)
+            if stop_tick is not None and stop_tick < next_event:
+                # Nothing happens before we stop so there is nothing to process
+                self.tick_count = stop_tick
+                continue
 
-                # Every 10 seconds the battery voltage is reported in 16.16 fixed point format in volts
-                reading = IOTileReading(self.tick_count, battery_voltage.encode(), int(self.voltage * 65536))
-                self.sensor_graph.process_input(battery_voltage, reading, self.rpc_executor)
+            self.tick_count = next_event
+            self._process_tick(self.tick_count)
 
-            now = monotonic()
+    def _can_skip_ticks(self):
+        """Check if all of our stop conditions can tell us in advance when they will stop."""
 
-            # If we are trying to execute this sensor graph in realtime, wait for
-            # the remaining slice of this tick.
-            if (not accelerated) and (now < next_tick):
-                time.sleep(next_tick - now)
+        for stop in self.stop_conditions:
+            if stop.ticks_until_stop(self.tick_count, self.tick_count - self._start_tick) is None:
+                return False
+
+        return True
+
+    def _next_stop_tick(self):
+        """Find the first tick at which a stop condition will be met.
+
+        Returns:
+            int: The tick or None if there are no stop conditions.
+        """
+
+        stop_tick = None
+
+        for stop in self.stop_conditions:
+            remaining = stop.ticks_until_stop(self.tick_count, self.tick_count - self._start_tick)
+            tick = self.tick_count + max(remaining, 1)
+
+            if stop_tick is None or tick < stop_tick:
+                stop_tick = tick
+
+        return stop_tick
+
+    def _next_event_tick(self, tick_value):
+        """Find the first tick after tick_value where an input will be generated.
+
+        Args:
+            tick_value (int): The last tick that was processed.
+
+        Returns:
+            int: The next tick that needs to be processed.
+        """
+
+        # System ticks happen every 10 seconds so there is always a next event
+        next_tick = (tick_value // 10 + 1) * 10
+
+        for name in ('fast', 'user1', 'user2'):
+            interval = self.sensor_graph.get_tick(name)
+            if interval != 0:
+                next_tick = min(next_tick, (tick_value // interval + 1) * interval)
+
+        if len(self.stimuli) > 0 and self.stimuli[0].time > tick_value:
+            next_tick = min(next_tick, self.stimuli[0].time)
+
+        return next_tick
+
+    def _process_stimuli(self, tick_value):
+        """Apply all stimuli scheduled at this tick.
+
+        Any stimuli scheduled before this tick can never fire anymore so they
+        are discarded.
+
+        Args:
+            tick_value (int): The tick whose stimuli should be applied.
+        """
+
+        while len(self.stimuli) > 0 and self.stimuli[0].time <= tick_value:
+            stim = self.stimuli.pop(0)
+            if stim.time != tick_value:
+                continue
+
+            reading = IOTileReading(self.tick_count, stim.stream.encode(), stim.value)
+            self.sensor_graph.process_input(stim.stream, reading, self.rpc_executor)
+
+    def _process_tick(self, tick_value):
+        """Generate all of the inputs that happen at a single tick.
+
+        Args:
+            tick_value (int): The tick that we are processing.
+        """
+
+        # Process all stimuli that occur at this tick of the simulation
+        self._process_stimuli(tick_value)
+        self._check_additional_ticks(tick_value)
+
+        if (tick_value % 10) == 0:
+            reading = IOTileReading(self.tick_count, system_tick.encode(), self.tick_count)
+            self.sensor_graph.process_input(system_tick, reading, self.rpc_executor)
+
+            # Every 10 seconds the battery voltage is reported in 16.16 fixed point format in volts
+            reading = IOTileReading(self.tick_count, battery_voltage.encode(), int(self.voltage * 65536))
+            self.sensor_graph.process_input(battery_voltage, reading, self.rpc_executor)
 
     def _check_additional_ticks(self, tick_value):
         fast_interval = self.sensor_graph.get_tick('fast')
@@ -198,7 +281,6 @@ class SensorGraphSimulator(object):
             reading = IOTileReading(self.tick_count, tick_2.encode(), self.tick_count)
             self.sensor_graph.process_input(tick_2, reading, self.rpc_executor)
 
-
     def _check_stop_conditions(self, sensor_graph):
         """Check if any of our stop conditions are met.
 
@@ -41,6 +41,10 @@ class StopCondition(object):
     There should be a second class method, FromString(cls, desc) that
     tries to parse this stop condition from a text string.  The function
     must raise an ArgumentError if it could not match the input string.
+
+    Stop conditions that only depend on time can also override
+    ticks_until_stop(self, abs_seconds, rel_seconds) so that the simulator
+    is able to skip over ticks where nothing happens.
     """
 
     def should_stop(self, abs_second_count, rel_second_count, sensor_graph):
@@ -60,6 +64,25 @@ class StopCondition(object):
 
         return False
 
+    def ticks_until_stop(self, abs_second_count, rel_second_count):
+        """Predict how many more ticks will pass before this condition is met.
+
+        Conditions that depend on the state of the sensor graph cannot know
+        this in advance and should return None, which is the default.
+
+        Args:
+            abs_second_count (int): The number of seconds that
+                have expired since the start of the simulation.
+            rel_second_count (int): The number of seconds that
+                have expired since the start of the last `run` calls.
+
+        Returns:
+            int: The number of ticks until should_stop will return True or
+                None if this is not known.
+        """
+
+        return None
+
 
 class TimeBasedStopCondition(StopCondition):
     """Stop the simulation after a fixed period of time.
@@ -91,6 +114,21 @@ class TimeBasedStopCondition(StopCondition):
 
         return rel_seconds >= self.max_time
 
+    def ticks_until_stop(self, abs_seconds, rel_seconds):
+        """Predict how many more ticks will pass before this condition is met.
+
+        Args:
+            abs_seconds (int): The number of seconds that
+                have expired since the start of the simulation.
+            rel_seconds (int): The number of seconds that
+                have expired since the start of the last `run` calls.
+
+        Returns:
+            int: The number of ticks until should_stop will return True.
+        """
+
+        return self.max_time - rel_seconds
+
     @classmethod
     def FromString(cls, desc):
         """Parse this stop condition from a string representation.
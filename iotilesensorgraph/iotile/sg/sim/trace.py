@@ -11,6 +11,10 @@ import json
 from iotile.core.hw.reports import IOTileReading
 from typedargs.exceptions import ArgumentError
 from ..stream import DataStreamSelector, DataStream
+from .binary_trace import BinaryTraceFile, save_binary_trace, is_binary_trace
+
+# File extensions that are saved in the binary format by default
+BINARY_EXTENSIONS = ('.bin', '.sgtr')
 
 
 class SimulationTrace(list):
@@ -37,24 +41,42 @@ class SimulationTrace(list):
         self.selectors = selectors
         super(SimulationTrace, self).__init__(readings)
 
-    def save(self, out_path):
-        """Save an ascii representation of this simulation trace.
+    def save(self, out_path, format=None):
+        """Save this simulation trace to a file.
+
+        Traces can be saved either as json or in a compact binary format
+        (see iotile.sg.sim.binary_trace) that is much faster to save and
+        load for large traces.
 
         Args:
             out_path (str): The output path to save this simulation trace.
+            format (str): Either json or binary.  If not specified, the
+                binary format is used for files with a .bin or .sgtr
+                extension and json otherwise.
         """
 
+        if format is None:
+            format = 'binary' if out_path.lower().endswith(BINARY_EXTENSIONS) else 'json'
+
+        if format == 'binary':
+            save_binary_trace(out_path, self, self.selectors)
+            return
+        elif format != 'json':
+            raise ArgumentError("Unknown trace file format", format=format, known_formats=['json', 'binary'])
+
         out = {
             'selectors': [str(x) for x in self.selectors],
             'trace': [{'stream': str(DataStream.FromEncoded(x.stream)), 'time': x.raw_time, 'value': x.value, 'reading_id': x.reading_id} for x in self]
         }
 
-        with open(out_path, "wb") as outfile:
+        with open(out_path, "w") as outfile:
             json.dump(out, outfile, indent=4)
 
     @classmethod
     def FromFile(cls, in_path):
-        """Load a previously saved ascii representation of this simulation trace.
+        """Load a previously saved simulation trace.
+
+        The format of the file (json or binary) is detected automatically.
 
         Args:
             in_path (str): The path of the input file that we should load.
@@ -63,13 +85,80 @@ class SimulationTrace(list):
             SimulationTrace: The loaded trace object.
         """
 
-        with open(in_path, "rb") as infile:
+        if is_binary_trace(in_path):
+            with BinaryTraceFile(in_path) as trace_file:
+                return SimulationTrace(trace_file, selectors=trace_file.selectors)
+
+        with open(in_path, "r") as infile:
             in_data = json.load(infile)
 
-        if not ('trace', 'selectors') in in_data:
+        if 'trace' not in in_data or 'selectors' not in in_data:
             raise ArgumentError("Invalid trace file format", keys=in_data.keys(), expected=('trace', 'selectors'))
 
         selectors = [DataStreamSelector.FromString(x) for x in in_data['selectors']]
         readings = [IOTileReading(x['time'], DataStream.FromString(x['stream']).encode(), x['value'], reading_id=x['reading_id']) for x in in_data['trace']]
 
         return SimulationTrace(readings, selectors=selectors)
+
+    @classmethod
+    def IterFile(cls, in_path):
+        """Iterate over the readings in a saved simulation trace.
+
+        Binary traces are memory mapped and decoded one reading at a time
+        so they can be processed without loading the entire trace into
+        memory.  Json traces must be loaded completely first.
+
+        Args:
+            in_path (str): The path of the trace file to iterate over.
+
+        Yields:
+            IOTileReading: Each reading in the trace, in order.
+        """
+
+        if is_binary_trace(in_path):
+            with BinaryTraceFile(in_path) as trace_file:
+                for reading in trace_file:
+                    yield reading
+
+            return
+
+        for reading in cls.FromFile(in_path):
+            yield reading
+
+
+def compare_trace_files(path_a, path_b):
+    """Compare two saved simulation traces reading by reading.
+
+    The traces may be in different formats.  Readings are compared by
+    stream, raw time, value and reading id.
+
+    Args:
+        path_a (str): The path to the first trace file.
+        path_b (str): The path to the second trace file.
+
+    Returns:
+        (int, IOTileReading, IOTileReading): None if the traces are identical,
+            otherwise the index of the first difference and the readings at
+            that index in each trace.  If one trace is shorter than the other,
+            its reading is None.
+    """
+
+    readings_a = SimulationTrace.IterFile(path_a)
+    readings_b = SimulationTrace.IterFile(path_b)
+
+    index = 0
+    while True:
+        reading_a = next(readings_a, None)
+        reading_b = next(readings_b, None)
+
+        if reading_a is None and reading_b is None:
+            return None
+
+        if reading_a is None or reading_b is None or _reading_key(reading_a) != _reading_key(reading_b):
+            return index, reading_a, reading_b
+
+        index += 1
+
+
+def _reading_key(reading):
+    return (reading.stream, reading.raw_time, reading.value, reading.reading_id)
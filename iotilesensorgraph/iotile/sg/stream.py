@@ -19,6 +19,11 @@ from iotile.core.exceptions import ArgumentError
 class DataStream(object):
     """An immutable specifier of a specific data stream
 
+    DataStream objects are used as dictionary keys throughout sensor graph
+    so they precompute their encoded 16-bit representation, which is used
+    as their hash.  Since they are immutable, DataStream.FromEncoded
+    returns a single shared instance for each encoded value.
+
     Args:
         stream_type (int): The type of the stream
         stream_id (int): The stream identifier
@@ -57,10 +62,27 @@ class DataStream(object):
         1024: 'device_reboot'
     }
 
+    __slots__ = ('stream_type', 'stream_id', 'system', '_encoded')
+
+    _interned = {}
+
     def __init__(self, stream_type, stream_id, system=False):
-        self.stream_type = stream_type
-        self.stream_id = stream_id
-        self.system = system
+        object.__setattr__(self, 'stream_type', stream_type)
+        object.__setattr__(self, 'stream_id', stream_id)
+        object.__setattr__(self, 'system', system)
+        object.__setattr__(self, '_encoded', (stream_type << 12) | (int(system) << 11) | stream_id)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("DataStream objects are immutable", name)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (DataStream, (self.stream_type, self.stream_id, self.system))
 
     @property
     def input(self):
@@ -119,18 +141,29 @@ class DataStream(object):
         return DataStream(stream_type, stream_id, system)
 
     @classmethod
-    def FromEncoded(self, encoded):
+    def FromEncoded(cls, encoded):
         """Create a DataStream from an encoded 16-bit unsigned integer.
 
+        The same DataStream instance is returned every time a given
+        value is decoded.
+
         Returns:
             DataStream: The decoded DataStream object
         """
 
+        encoded &= 0xFFFF
+
+        stream = cls._interned.get(encoded)
+        if stream is not None:
+            return stream
+
         stream_type = (encoded >> 12) & 0b1111
         stream_system = bool(encoded & (1 << 11))
         stream_id = (encoded & ((1 << 11) - 1))
 
-        return DataStream(stream_type, stream_id, stream_system)
+        stream = DataStream(stream_type, stream_id, stream_system)
+        cls._interned[encoded] = stream
+        return stream
 
     def encode(self):
         """Encode this stream as a packed 16-bit unsigned integer.
@@ -139,7 +172,7 @@ class DataStream(object):
             int: The packed encoded stream
         """
 
-        return (self.stream_type << 12) | (int(self.system) << 11) | self.stream_id
+        return self._encoded
 
     def __str__(self):
         type_str = self.TypeToString[self.stream_type]
@@ -150,19 +183,33 @@ class DataStream(object):
         return u'{} {}'.format(type_str, self.stream_id)
 
     def __hash__(self):
-        return hash(str(self))
+        return hash(self._encoded)
 
     def __eq__(self, other):
+        if self is other:
+            return True
+
         if not isinstance(other, DataStream):
             return NotImplemented
 
         return self.system == other.system and self.stream_type == other.stream_type and self.stream_id == other.stream_id
 
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+
+        return not result
+
 
 @python_2_unicode_compatible
 class DataStreamSelector(object):
     """A specifier that matches DataStreams based on their types and ids.
 
+    Like DataStream, selectors are immutable and hash by their encoded
+    16-bit representation.  DataStreamSelector.FromEncoded returns a single
+    shared instance for each encoded value.
+
     Args:
         stream_type (int): The type of the stream to match
         stream_id (int): The stream identifier to match.  If None, all
@@ -197,14 +244,35 @@ class DataStreamSelector(object):
     SpecifierEncodingMap = {y: x for x, y in iteritems(SpecifierEncodings)}
     MatchAllCode = (1 << 11) - 1
 
-    def __init__(self, stream_type, stream_id, stream_specifier):
-        self.match_type = stream_type
-        self.match_id = stream_id
-        self.match_spec = stream_specifier
+    __slots__ = ('match_type', 'match_id', 'match_spec', '_encoded')
 
+    _interned = {}
+
+    def __init__(self, stream_type, stream_id, stream_specifier):
         if stream_specifier not in DataStreamSelector.ValidSpecifiers:
             raise ArgumentError("Unknown stream selector specifier", specifier=stream_specifier, known_specifiers=DataStreamSelector.ValidSpecifiers)
 
+        match_id = stream_id
+        if match_id is None:
+            match_id = DataStreamSelector.MatchAllCode
+
+        object.__setattr__(self, 'match_type', stream_type)
+        object.__setattr__(self, 'match_id', stream_id)
+        object.__setattr__(self, 'match_spec', stream_specifier)
+        object.__setattr__(self, '_encoded', (stream_type << 12) | DataStreamSelector.SpecifierEncodings[stream_specifier] | match_id)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("DataStreamSelector objects are immutable", name)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (DataStreamSelector, (self.match_type, self.match_id, self.match_spec))
+
     @property
     def input(self):
         """Whether this is a root input stream."""
@@ -278,6 +346,12 @@ class DataStreamSelector(object):
             DataStreamSelector: The decoded selector.
         """
 
+        encoded &= 0xFFFF
+
+        selector = cls._interned.get(encoded)
+        if selector is not None:
+            return selector
+
         match_spec = encoded & ((1 << 11) | (1 << 15))
         match_type = (encoded & (0b111 << 12)) >> 12
         match_id = encoded & ((1 << 11) - 1)
@@ -291,7 +365,9 @@ class DataStreamSelector(object):
         if match_id == cls.MatchAllCode:
             match_id = None
 
-        return DataStreamSelector(match_type, match_id, spec_name)
+        selector = DataStreamSelector(match_type, match_id, spec_name)
+        cls._interned[encoded] = selector
+        return selector
 
     @classmethod
     def FromString(cls, string_rep):
@@ -402,17 +478,23 @@ class DataStreamSelector(object):
             int: The packed encoded stream
         """
 
-        match_id = self.match_id
-        if match_id is None:
-            match_id = (1 << 11) - 1
-
-        return (self.match_type << 12) | DataStreamSelector.SpecifierEncodings[self.match_spec] | match_id
+        return self._encoded
 
     def __hash__(self):
-        return hash(str(self))
+        return hash(self._encoded)
 
     def __eq__(self, other):
+        if self is other:
+            return True
+
         if not isinstance(other, DataStreamSelector):
             return NotImplemented
 
         return self.match_spec == other.match_spec and self.match_type == other.match_type and self.match_id == other.match_id
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+
+        return not result
@@ -1,5 +1,6 @@
 """Stream walkers are the basic data retrieval mechanism in sensor graph."""
 
+from collections import deque
 from iotile.core.exceptions import ArgumentError, InternalError
 from iotile.sg.exceptions import StreamEmptyError
 from iotile.sg.stream import DataStream
@@ -132,6 +133,86 @@ class BufferedStreamWalker(StreamWalker):
         self._count -= 1
 
 
+class RingBufferStreamWalker(BufferedStreamWalker):
+    """A buffered stream walker that tracks its position by absolute index.
+
+    This walker must be used with a storage engine that supports absolute
+    indexing, like RingBufferStorageEngine.  Since absolute indices do not
+    shift when old readings are erased, the walker can remember exactly
+    where each reading that matches its selector was stored.  Popping and
+    peeking jump directly to the next matching reading without scanning
+    over readings from other streams that share the same buffer and
+    rollovers only need to discard the positions that were erased.
+
+    Args:
+        selector (DataStreamSelector): The selector for the streams
+            that we are walking
+        engine (StorageEngine): The storage engine backing us up
+    """
+
+    def __init__(self, selector, engine):
+        super(RingBufferStreamWalker, self).__init__(selector, engine)
+        self.offset = self.engine.end_index(self.storage_type)
+        self._positions = deque()
+
+    def count(self):
+        return len(self._positions)
+
+    def pop(self):
+        """Pop a reading off of this stream and return it."""
+
+        if len(self._positions) == 0:
+            raise StreamEmptyError("Pop called on buffered stream walker without any data", selector=self.selector)
+
+        index = self._positions.popleft()
+        self.offset = index + 1
+        return self.engine.get_absolute(self.storage_type, index)
+
+    def peek(self):
+        """Peek at the oldest reading in this virtual stream."""
+
+        if len(self._positions) == 0:
+            raise StreamEmptyError("Peek called on buffered stream walker without any data", selector=self.selector)
+
+        return self.engine.get_absolute(self.storage_type, self._positions[0])
+
+    def skip_all(self):
+        """Skip all readings in this walker."""
+
+        self.offset = self.engine.end_index(self.storage_type)
+        self._positions.clear()
+
+    def notify_added(self, stream):
+        """Notify that a new reading has been added.
+
+        The reading must be the most recent one pushed into our buffer.
+
+        Args:
+            stream (DataStream): The stream that had new data
+        """
+
+        if not self.matches(stream):
+            return
+
+        self._positions.append(self.engine.end_index(self.storage_type) - 1)
+
+    def notify_erased(self, start, readings):
+        """Notify that the oldest readings in our buffer were erased.
+
+        Args:
+            start (int): The absolute index of the first erased reading.
+            readings (list(IOTileReading)): The erased readings, in order.
+        """
+
+        end = start + len(readings)
+
+        while len(self._positions) > 0 and self._positions[0] < end:
+            self._positions.popleft()
+
+        if self.offset < end:
+            self.offset = end
+
+
 class VirtualStreamWalker(StreamWalker):
     """A stream walker that just walks over virtual streams.
 
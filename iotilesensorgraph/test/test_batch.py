@@ -0,0 +1,93 @@
+"""Tests for running batches of sensor graph simulations."""
+
+import os.path
+import json
+import pytest
+from iotile.core.exceptions import ArgumentError
+from iotile.sg.sim.batch import BatchSimulationJob, load_manifest, run_batch, run_job
+from iotile.sg.scripts.iotile_sgrun import main
+
+GRAPH_DIR = os.path.join(os.path.dirname(__file__), 'sensor_graphs')
+
+
+def _write_manifest(tmpdir):
+    jobs = []
+    for i in range(0, 4):
+        jobs.append({
+            'name': 'streamer-{}'.format(i),
+            'sensor_graph': os.path.join(GRAPH_DIR, 'basic_streamer.sgf'),
+            'stop': ['run_time {} minutes'.format(i + 1)],
+            'mock_rpcs': ['slot 1:0x1000 = {}'.format(i)],
+            'trace': 'streamer-{}.json'.format(i)
+        })
+
+    jobs.append({
+        'name': 'every-1min',
+        'sensor_graph': os.path.join(GRAPH_DIR, 'basic_every_1min.sgf'),
+        'stop': ['run_time 1 hour'],
+        'disable_optimizer': True
+    })
+
+    manifest = tmpdir.join('jobs.json')
+    manifest.write(json.dumps({'jobs': jobs}))
+    return str(manifest)
+
+
+def test_load_manifest(tmpdir):
+    """Make sure we can load a manifest with relative paths."""
+
+    jobs = load_manifest(_write_manifest(tmpdir))
+
+    assert len(jobs) == 5
+    assert jobs[0].trace == str(tmpdir.join('streamer-0.json'))
+    assert jobs[1].mock_rpcs[0][1:] == (0x1000, 1)
+    assert jobs[4].trace is None
+    assert jobs[4].disable_optimizer is True
+
+    with pytest.raises(ArgumentError):
+        BatchSimulationJob.FromDict({'sensor_graph': 'test.sgf', 'stop': ['run_time 1 minute'], 'stimulus': []})
+
+    with pytest.raises(ArgumentError):
+        BatchSimulationJob('test.sgf', [])
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_run_batch(tmpdir, processes):
+    """Make sure batches produce the same results in or out of process."""
+
+    jobs = load_manifest(_write_manifest(tmpdir))
+    results = run_batch(jobs, processes)
+
+    assert [x.name for x in results] == [x.name for x in jobs]
+    assert all(x.succeeded for x in results)
+    assert [x.ticks for x in results] == [60, 120, 180, 240, 3600]
+
+    # Each 10 second tick streams one output that is in the trace
+    assert [x.traced for x in results[:4]] == [6, 12, 18, 24]
+    assert results[4].traced == 0
+    assert results[4].readings > 0
+
+    for i in range(0, 4):
+        with open(str(tmpdir.join('streamer-{}.json'.format(i))), "r") as infile:
+            trace = json.load(infile)['trace']
+
+        assert len(trace) == results[i].traced
+        assert all(x['value'] == i for x in trace if x['stream'] == 'output 1')
+
+
+def test_failed_job():
+    """Make sure a broken job is reported without raising."""
+
+    job = BatchSimulationJob(os.path.join(GRAPH_DIR, 'syntax_error_statement.sgf'), ['run_time 1 minute'])
+    result = run_job(job)
+
+    assert not result.succeeded
+    assert result.error is not None
+
+
+def test_sgrun_batch(tmpdir):
+    """Make sure iotile-sgrun can run a batch manifest."""
+
+    manifest = _write_manifest(tmpdir)
+    assert main(['--batch', manifest, '-j', '2']) == 0
+    assert tmpdir.join('streamer-3.json').check()
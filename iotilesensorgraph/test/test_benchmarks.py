@@ -0,0 +1,173 @@
+"""Microbenchmarks for performance sensitive parts of sensor graph.
+
+These tests print timing information when run with pytest -s but only
+assert on deterministic properties so that they are stable on slow or
+heavily loaded machines.
+"""
+
+from __future__ import print_function
+import os.path
+import timeit
+from iotile.sg.model import DeviceModel
+from iotile.sg.sensor_log import SensorLog
+from iotile.sg.engine import InMemoryStorageEngine, RingBufferStorageEngine
+from iotile.sg import DataStreamSelector, DataStream
+from iotile.sg.parser import SensorGraphFileParser
+from iotile.sg.optimizer import SensorGraphOptimizer
+from iotile.sg.sim.null_executor import NullRPCExecutor
+from iotile.sg.known_constants import system_tick, fast_tick, user_connected
+from iotile.core.hw.reports import IOTileReading
+
+enable_input = DataStream.FromString('system input 1034')
+
+
+class _CountingEngine(object):
+    """Wrap a storage engine and count how many readings are fetched from it."""
+
+    def __init__(self, engine):
+        self._engine = engine
+        self.absolute_indexing = engine.absolute_indexing
+        self.fetches = 0
+
+    def get(self, buffer_type, offset):
+        self.fetches += 1
+        return self._engine.get(buffer_type, offset)
+
+    def get_absolute(self, buffer_type, index):
+        self.fetches += 1
+        return self._engine.get_absolute(buffer_type, index)
+
+    def __getattr__(self, name):
+        return getattr(self._engine, name)
+
+
+def _fill_interleaved(engine_class, stream_count, readings_per_stream):
+    model = DeviceModel()
+    engine = _CountingEngine(engine_class(model))
+    log = SensorLog(engine, model=model)
+
+    walker = log.create_walker(DataStreamSelector.FromString('buffered 1'))
+    streams = [DataStream.FromString('buffered {}'.format(i)) for i in range(1, stream_count + 1)]
+
+    for i in range(0, readings_per_stream):
+        for stream in streams:
+            log.push(stream, IOTileReading(0, 0, i))
+
+    return engine, walker
+
+
+def _pop_all(walker):
+    while walker.count() > 0:
+        walker.pop()
+
+
+def test_walker_pop_interleaved_streams():
+    """Make sure ring buffer walker pops do not scan over other streams."""
+
+    readings_per_stream = 100
+
+    for stream_count in (1, 10, 100):
+        for engine_class in (InMemoryStorageEngine, RingBufferStorageEngine):
+            engine, walker = _fill_interleaved(engine_class, stream_count, readings_per_stream)
+            duration = timeit.timeit(lambda: _pop_all(walker), number=1)
+            per_pop = duration / readings_per_stream * 1e6
+
+            print("%s, %d streams: %.1f us/pop, %d readings examined" % (engine_class.__name__, stream_count, per_pop, engine.fetches))
+
+            if engine_class is RingBufferStorageEngine:
+                assert engine.fetches == readings_per_stream
+            else:
+                assert engine.fetches == (readings_per_stream - 1) * stream_count + 1
+
+
+def _build_complex_gate(compiled):
+    parser = SensorGraphFileParser()
+    model = DeviceModel()
+    parser.parse_file(os.path.join(os.path.dirname(__file__), 'test_integration', 'sensor_graphs', 'complex_gates.sgf'))
+    parser.compile(model=model)
+
+    sg = parser.sensor_graph
+    SensorGraphOptimizer().optimize(sg, model=model)
+
+    if compiled:
+        sg.compile_execution_plan()
+
+    sg.load_constants()
+    executor = NullRPCExecutor()
+    sg.process_input(user_connected, IOTileReading(0, user_connected.encode(), 8), executor)
+    sg.process_input(enable_input, IOTileReading(0, enable_input.encode(), 1), executor)
+
+    return sg, executor
+
+
+def _process_ticks(sg, executor, count):
+    for i in range(0, count):
+        reading = IOTileReading(i, system_tick.encode(), i)
+        sg.process_input(system_tick, reading, executor)
+
+        reading = IOTileReading(i, fast_tick.encode(), i)
+        sg.process_input(fast_tick, reading, executor)
+
+
+def test_compiled_process_input():
+    """Compare the per-input cost of the interpreter and compiled plans."""
+
+    count = 2000
+    interpreted = _build_complex_gate(False)
+    compiled = _build_complex_gate(True)
+
+    interpreted_time = timeit.timeit(lambda: _process_ticks(interpreted[0], interpreted[1], count), number=1)
+    compiled_time = timeit.timeit(lambda: _process_ticks(compiled[0], compiled[1], count), number=1)
+
+    print("interpreted: %.1f us/input" % (interpreted_time / (2 * count) * 1e6))
+    print("compiled: %.1f us/input" % (compiled_time / (2 * count) * 1e6))
+    print("speedup: %.2fx" % (interpreted_time / compiled_time))
+
+    assert compiled[0].sensor_log.inspect_last(DataStream.FromString('unbuffered 15')).value == \
+        interpreted[0].sensor_log.inspect_last(DataStream.FromString('unbuffered 15')).value
+
+
+def test_stream_hashing():
+    """Measure the cost of using streams as dictionary keys."""
+
+    streams = [DataStream.FromEncoded(0x5000 | i) for i in range(0, 100)]
+    selectors = [DataStreamSelector.FromStream(x) for x in streams]
+    last_values = {}
+
+    def _store():
+        for stream in streams:
+            last_values[stream] = stream
+
+        for selector in selectors:
+            last_values[selector] = selector
+
+    duration = timeit.timeit(_store, number=100)
+    print("stream hash + store: %.2f us" % (duration / (100 * 200) * 1e6))
+
+    duration = timeit.timeit(lambda: DataStream.FromEncoded(0x5001), number=10000)
+    print("DataStream.FromEncoded: %.2f us" % (duration / 10000 * 1e6))
+
+    assert len(last_values) == 200
+    assert DataStream.FromEncoded(0x5001) is streams[1]
+
+
+def test_trace_formats(tmpdir):
+    """Compare saving and loading large traces as json and binary."""
+
+    from iotile.sg.sim.trace import SimulationTrace
+
+    count = 100000
+    stream = DataStream.FromString('output 1').encode()
+    trace = SimulationTrace([IOTileReading(i, stream, i, reading_id=i) for i in range(0, count)],
+                            selectors=[DataStreamSelector.FromString('all outputs')])
+
+    for name in ('trace.json', 'trace.bin'):
+        path = str(tmpdir.join(name))
+
+        save_time = timeit.timeit(lambda: trace.save(path), number=1)
+        load_time = timeit.timeit(lambda: SimulationTrace.FromFile(path), number=1)
+        iter_time = timeit.timeit(lambda: sum(x.value for x in SimulationTrace.IterFile(path)), number=1)
+
+        print("%s: save %.3f s, load %.3f s, iterate %.3f s, %d bytes" % (name, save_time, load_time, iter_time, os.path.getsize(path)))
+
+    assert os.path.getsize(str(tmpdir.join('trace.bin'))) < os.path.getsize(str(tmpdir.join('trace.json'))) / 5
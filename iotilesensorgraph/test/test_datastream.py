@@ -1,5 +1,8 @@
 """Tests for DataStream objects."""
 
+import copy
+import pickle
+import pytest
 from builtins import str
 from iotile.sg import DataStream, DataStreamSelector
 
@@ -211,3 +214,29 @@ def test_buffered_pluralization():
 
     sel = DataStreamSelector.FromString('all buffered')
     assert str(sel) == 'all buffered'
+
+
+def test_stream_interning():
+    """Make sure decoded streams and selectors are shared immutable objects."""
+
+    stream = DataStream.FromEncoded(0x5001)
+    assert DataStream.FromEncoded(0x5001) is stream
+    assert stream == DataStream.FromString('output 1')
+    assert hash(stream) == hash(DataStream.FromString('output 1'))
+    assert stream != DataStream.FromString('output 2')
+
+    with pytest.raises(AttributeError):
+        stream.stream_id = 2
+
+    assert copy.deepcopy(stream) is stream
+    assert pickle.loads(pickle.dumps(stream)) == stream
+
+    sel = DataStreamSelector.FromEncoded(0xD7FF)
+    assert DataStreamSelector.FromEncoded(0xD7FF) is sel
+    assert sel == DataStreamSelector.FromString('all outputs')
+    assert hash(sel) == hash(DataStreamSelector.FromString('all outputs'))
+
+    with pytest.raises(AttributeError):
+        sel.match_id = 2
+
+    assert pickle.loads(pickle.dumps(sel)) == sel
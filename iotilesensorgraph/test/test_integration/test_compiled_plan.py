@@ -0,0 +1,83 @@
+"""Differential tests making sure compiled graphs behave like the interpreter."""
+
+from __future__ import (absolute_import, unicode_literals, print_function)
+import os.path
+import pytest
+from iotile.sg import DataStream, DataStreamSelector, DeviceModel, SlotIdentifier
+from iotile.sg.sim import SensorGraphSimulator
+from iotile.sg.optimizer import SensorGraphOptimizer
+from iotile.sg.known_constants import user_connected, user_disconnected
+from iotile.sg.parser import SensorGraphFileParser
+
+ALL_STREAMS = [u'all combined buffered', u'all combined unbuffered', u'all combined constants',
+               u'all combined inputs', u'all combined counters', u'all combined outputs']
+
+
+def compile_sg(name):
+    """Compile a sensor graph."""
+
+    parser = SensorGraphFileParser()
+    parser.parse_file(os.path.join(os.path.dirname(__file__), 'sensor_graphs', name))
+    parser.compile(model=DeviceModel())
+    return parser.sensor_graph
+
+
+def _run_graph(name, optimize, compiled):
+    """Simulate a graph while recording every reading pushed to any stream."""
+
+    sg = compile_sg(name)
+    if optimize:
+        SensorGraphOptimizer().optimize(sg, model=DeviceModel())
+
+    if compiled:
+        sg.compile_execution_plan()
+        assert sg.compiled
+
+    pushed = []
+
+    def _record(stream, reading):
+        pushed.append((reading.stream, reading.raw_time, reading.value))
+
+    for selector in ALL_STREAMS:
+        sg.sensor_log.watch(DataStreamSelector.FromString(selector), _record)
+
+    sim = SensorGraphSimulator(sg)
+    sim.stop_condition("run_time 20 minutes")
+    sim.rpc_executor.mock(SlotIdentifier.FromString(u'slot 2'), 0x8003, 5)
+
+    sg.load_constants()
+    sim.run()
+
+    sim.step(user_connected, 8)
+    sim.step(DataStream.FromString("system input 1034"), 1)
+    sim.step(DataStream.FromString("input 1"), 10)
+    sim.run()
+
+    sim.step(user_disconnected, 8)
+    sim.step(DataStream.FromString("system input 1034"), 0)
+    sim.run()
+
+    return pushed
+
+
+@pytest.mark.parametrize('name', ['complex_gates.sgf', 'user_tick.sgf', 'streamers.sgf'])
+@pytest.mark.parametrize('optimize', [False, True])
+def test_compiled_matches_interpreter(name, optimize):
+    """Make sure the compiled plan pushes exactly the same readings as the interpreter."""
+
+    interpreted = _run_graph(name, optimize, False)
+    compiled = _run_graph(name, optimize, True)
+
+    assert len(interpreted) > 0
+    assert compiled == interpreted
+
+
+def test_add_node_discards_plan():
+    """Make sure a stale plan is not used after the graph changes."""
+
+    sg = compile_sg('complex_gates.sgf')
+    sg.compile_execution_plan()
+    assert sg.compiled
+
+    sg.add_node(u'(input 5 always) => unbuffered 100 using copy_latest_a')
+    assert not sg.compiled
@@ -2,6 +2,7 @@ import pytest
 
 from iotile.sg.model import DeviceModel
 from iotile.sg.sensor_log import SensorLog
+from iotile.sg.engine import InMemoryStorageEngine, RingBufferStorageEngine
 from iotile.sg import DataStreamSelector, DataStream, StreamEmptyError
 from iotile.core.hw.reports import IOTileReading
 
@@ -86,11 +87,12 @@ def test_constant_walker():
     assert walk.count() == 0xFFFFFFFF
 
 
-def test_storage_walker():
+@pytest.mark.parametrize('engine', [InMemoryStorageEngine, RingBufferStorageEngine])
+def test_storage_walker(engine):
     """Make sure the storage walker works."""
 
     model = DeviceModel()
-    log = SensorLog(model=model)
+    log = SensorLog(engine(model), model=model)
 
 
     walk = log.create_walker(DataStreamSelector.FromString('buffered 1'))
@@ -112,11 +114,12 @@ def test_storage_walker():
     assert walk.count() == (old_count - erase_size + 1)
 
 
-def test_storage_streaming_walkers():
+@pytest.mark.parametrize('engine', [InMemoryStorageEngine, RingBufferStorageEngine])
+def test_storage_streaming_walkers(engine):
     """Make sure the storage and streaming walkers work simultaneously."""
 
     model = DeviceModel()
-    log = SensorLog(model=model)
+    log = SensorLog(engine(model), model=model)
 
 
     storage_walk = log.create_walker(DataStreamSelector.FromString('buffered 1'))
@@ -159,3 +162,89 @@ def test_storage_streaming_walkers():
 
     assert output_walk.count() == 0
     assert output_walk.offset == 0
+
+
+def test_ring_buffer_rollover():
+    """Make sure ring buffer walkers keep their place across rollovers."""
+
+    model = DeviceModel()
+    model.set('max_storage_buffer', 100)
+    model.set('buffer_erase_size', 10)
+    log = SensorLog(RingBufferStorageEngine(model), model=model)
+
+    walk1 = log.create_walker(DataStreamSelector.FromString('buffered 1'))
+    walk2 = log.create_walker(DataStreamSelector.FromString('buffered 2'))
+    stream1 = DataStream.FromString('buffered 1')
+    stream2 = DataStream.FromString('buffered 2')
+
+    for i in range(0, 50):
+        log.push(stream1, IOTileReading(0, 0, i))
+        log.push(stream2, IOTileReading(0, 0, i))
+
+    # Walker 1 has consumed everything that is about to be erased
+    for i in range(0, 10):
+        assert walk1.pop().value == i
+
+    log.push(stream1, IOTileReading(0, 0, 50))
+
+    assert log._engine.count() == (91, 0)
+    assert walk1.count() == 41
+    assert walk1.offset == 19
+    assert walk2.count() == 45
+    assert walk2.offset == 10
+
+    assert walk1.pop().value == 10
+    assert walk2.pop().value == 5
+
+    # Keep pushing so the physical buffer wraps around multiple times
+    for i in range(51, 500):
+        log.push(stream1, IOTileReading(0, 0, i))
+
+    assert walk2.count() == 0
+    assert walk1.peek().value == log._engine.get('storage', 0).value
+
+    last = None
+    while walk1.count() > 0:
+        last = walk1.pop()
+
+    assert last.value == 499
+
+    log.clear()
+    assert walk1.count() == 0
+    assert walk1.offset == 0
+
+
+def test_dispatch_invalidation():
+    """Make sure walkers and monitors added or removed after a push are respected."""
+
+    model = DeviceModel()
+    log = SensorLog(model=model)
+
+    stream = DataStream.FromString('buffered 1')
+    vstream = DataStream.FromString('unbuffered 1')
+    seen = []
+
+    log.push(stream, IOTileReading(0, 0, 1))
+    log.push(vstream, IOTileReading(0, 0, 1))
+
+    walk = log.create_walker(DataStreamSelector.FromString('buffered 1'))
+    vwalk = log.create_walker(DataStreamSelector.FromString('unbuffered 1'))
+    log.watch(DataStreamSelector.FromString('all buffered'), lambda stream, reading: seen.append(reading.value))
+
+    log.push(stream, IOTileReading(0, 0, 2))
+    log.push(vstream, IOTileReading(0, 0, 2))
+
+    assert walk.count() == 1
+    assert vwalk.count() == 1
+    assert seen == [2]
+
+    log.destroy_walker(walk)
+    log.destroy_walker(vwalk)
+    vwalk.pop()
+
+    log.push(stream, IOTileReading(0, 0, 3))
+    log.push(vstream, IOTileReading(0, 0, 3))
+
+    assert walk.count() == 1
+    assert vwalk.count() == 0
+    assert seen == [2, 3]
@@ -35,3 +35,15 @@ def test_basic_simulation(exitcode):
 
     retval = main(['-s', 'run_time 1 second', infile])
     assert retval == 0
+
+
+def test_mock_rpc(exitcode):
+    """Make sure mock RPCs are parsed the same way as in batch manifests."""
+
+    infile = os.path.join(os.path.dirname(__file__), 'sensor_graphs', 'basic_block.sgf')
+
+    retval = main(['-s', 'run_time 1 second', '-m', 'slot 1:0x500a = 10', infile])
+    assert retval == 0
+
+    retval = main(['-s', 'run_time 1 second', '-m', 'slot 1 0x500a = 10', infile])
+    assert retval == 1
@@ -1,10 +1,14 @@
+import os.path
 import pytest
 from typedargs.exceptions import ArgumentError
 from iotile.sg.sim import SensorGraphSimulator
 from iotile.sg.sim.stimulus import SimulationStimulus
+from iotile.sg.sim.stop_conditions import StopCondition
+from iotile.sg.parser import SensorGraphFileParser
+from iotile.sg.exceptions import StreamEmptyError
 from iotile.sg.slot import SlotIdentifier
 from iotile.sg.known_constants import config_fast_tick_secs, config_tick1_secs, config_tick2_secs
-from iotile.sg import DeviceModel, SensorLog, SensorGraph, DataStream
+from iotile.sg import DeviceModel, SensorLog, SensorGraph, DataStream, DataStreamSelector
 from iotile.core.hw.reports import IOTileReading
 
 @pytest.fixture
@@ -199,3 +203,67 @@ def test_stimulus_parsing():
     with pytest.raises(ArgumentError):
         SimulationStimulus.FromString('unbuffered 1 = 1')
 
+
+
+def _trace_all_streams(sim):
+    pushed = []
+
+    def _record(stream, reading):
+        pushed.append((reading.stream, reading.raw_time, reading.value))
+
+    for selector in [u'all combined buffered', u'all combined unbuffered', u'all combined inputs',
+                     u'all combined counters', u'all combined outputs']:
+        sim.sensor_graph.sensor_log.watch(DataStreamSelector.FromString(selector), _record)
+
+    return pushed
+
+
+@pytest.mark.parametrize('name', ['basic_every_1min.sgf', 'basic_latch.sgf', 'basic_complete.sgf', 'nested_block.sgf'])
+def test_skip_idle_ticks(name):
+    """Make sure skipping idle ticks produces exactly the same results as stepping."""
+
+    results = []
+
+    for skip in (False, True):
+        parser = SensorGraphFileParser()
+        parser.parse_file(os.path.join(os.path.dirname(__file__), 'sensor_graphs', name))
+        parser.compile(model=DeviceModel())
+
+        sg = parser.sensor_graph
+        sg.add_config(SlotIdentifier.FromString('controller'), config_tick1_secs, 'uint32_t', 7)
+
+        sim = SensorGraphSimulator(sg)
+        pushed = _trace_all_streams(sim)
+
+        sim.stop_condition('run_time 2 hours')
+        sim.stimulus('input 1 = 5')
+        sim.stimulus('11 minutes: input 1 = 10')
+        sim.stimulus('11 minutes: system input 1034 = 1')
+        sim.stimulus('3 hours: input 1 = 15')
+
+        sg.load_constants()
+        sim.run(skip_idle_ticks=skip)
+        sim.step(DataStream.FromString('system input 1025'), 1)
+        sim.run(skip_idle_ticks=skip)
+
+        results.append((pushed, sim.tick_count))
+
+    assert results[0][1] == 4 * 60 * 60
+    assert results[0] == results[1]
+
+
+def test_skip_idle_ticks_fallback(basic_sg):
+    """Make sure we step every tick if a stop condition can't predict when it stops."""
+
+    class _StopAtValue(StopCondition):
+        def should_stop(self, abs_seconds, rel_seconds, sensor_graph):
+            try:
+                return sensor_graph.sensor_log.inspect_last(DataStream.FromString('unbuffered 1')).value >= 55
+            except StreamEmptyError:
+                return False
+
+    sim = SensorGraphSimulator(basic_sg)
+    sim.stop_conditions.append(_StopAtValue())
+    sim.run(skip_idle_ticks=True)
+
+    assert sim.tick_count == 60
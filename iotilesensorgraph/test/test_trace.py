@@ -0,0 +1,132 @@
+"""Tests for saving, loading and comparing simulation traces."""
+
+import os.path
+import pytest
+from iotile.core.hw.reports import IOTileReading
+from iotile.core.exceptions import ArgumentError
+from iotile.sg import DataStream, DataStreamSelector
+from iotile.sg.sim.trace import SimulationTrace, compare_trace_files
+from iotile.sg.sim import binary_trace
+from iotile.sg.sim.binary_trace import BinaryTraceFile
+from iotile.sg.scripts.iotile_sgrun import main
+
+
+@pytest.fixture
+def trace():
+    stream1 = DataStream.FromString('output 1').encode()
+    stream2 = DataStream.FromString('system output 1024').encode()
+
+    readings = []
+    for i in range(0, 100):
+        readings.append(IOTileReading(i * 10, stream1, i, reading_id=i + 1))
+        readings.append(IOTileReading(i * 10, stream2, -i * 1000000000, reading_id=0))
+
+    selectors = [DataStreamSelector.FromString('all outputs'), DataStreamSelector.FromString('all system outputs')]
+    return SimulationTrace(readings, selectors=selectors)
+
+
+def _as_tuples(readings):
+    return [(x.stream, x.raw_time, x.value, x.reading_id) for x in readings]
+
+
+@pytest.mark.parametrize('filename', ['trace.json', 'trace.bin'])
+def test_save_load(tmpdir, trace, filename):
+    """Make sure traces round trip through both formats."""
+
+    path = str(tmpdir.join(filename))
+    trace.save(path)
+
+    loaded = SimulationTrace.FromFile(path)
+    assert loaded.selectors == trace.selectors
+    assert _as_tuples(loaded) == _as_tuples(trace)
+    assert _as_tuples(SimulationTrace.IterFile(path)) == _as_tuples(trace)
+
+
+@pytest.mark.parametrize('zero_copy', [True, False])
+def test_binary_columns(tmpdir, trace, monkeypatch, zero_copy):
+    """Make sure binary traces can be accessed by column without decoding."""
+
+    # Also cover the chunked columns that are used when memoryview cannot cast
+    monkeypatch.setattr(binary_trace, '_ZERO_COPY', binary_trace._ZERO_COPY and zero_copy)
+    monkeypatch.setattr(binary_trace, '_CHUNK_SIZE', 64)
+
+    path = str(tmpdir.join('trace.dat'))
+    trace.save(path, format='binary')
+
+    with BinaryTraceFile(path) as trace_file:
+        assert len(trace_file) == 200
+        assert list(trace_file.times[:4]) == [0, 0, 10, 10]
+        assert trace_file.values[-1] == -99000000000
+        assert trace_file[-2].reading_id == 100
+        assert sum(trace_file.values[0::2]) == sum(range(0, 100))
+        assert list(trace_file.reading_ids)[1::2] == [0] * 100
+        assert _as_tuples(trace_file) == _as_tuples(trace)
+
+        with pytest.raises(IndexError):
+            trace_file[200]
+
+
+def test_binary_errors(tmpdir, trace):
+    """Make sure invalid or truncated binary traces are rejected."""
+
+    path = str(tmpdir.join('trace.bin'))
+    trace.save(path)
+
+    with open(path, "rb") as infile:
+        data = infile.read()
+
+    with open(path, "wb") as outfile:
+        outfile.write(data[:-8])
+
+    with pytest.raises(ArgumentError):
+        BinaryTraceFile(path)
+
+    with pytest.raises(ArgumentError):
+        trace.save(path, format='xml')
+
+    trace.append(IOTileReading(-1, 0, 0))
+    with pytest.raises(ArgumentError):
+        trace.save(path)
+
+
+def test_compare_traces(tmpdir, trace):
+    """Make sure we can diff traces across formats."""
+
+    json_path = str(tmpdir.join('trace.json'))
+    bin_path = str(tmpdir.join('trace.bin'))
+    short_path = str(tmpdir.join('short.bin'))
+    changed_path = str(tmpdir.join('changed.bin'))
+
+    trace.save(json_path)
+    trace.save(bin_path)
+    SimulationTrace(trace[:-1], selectors=trace.selectors).save(short_path)
+
+    trace[50].value += 1
+    trace.save(changed_path)
+
+    assert compare_trace_files(json_path, bin_path) is None
+
+    index, reading_a, reading_b = compare_trace_files(json_path, short_path)
+    assert index == 199
+    assert reading_a is not None and reading_b is None
+
+    index, reading_a, reading_b = compare_trace_files(bin_path, changed_path)
+    assert index == 50
+    assert reading_b.value == reading_a.value + 1
+
+    assert main(['--diff', json_path, bin_path]) == 0
+    assert main(['--diff', bin_path, changed_path]) == 1
+
+
+def test_sgrun_binary_trace(tmpdir):
+    """Make sure iotile-sgrun can save binary traces."""
+
+    infile = os.path.join(os.path.dirname(__file__), 'sensor_graphs', 'basic_streamer.sgf')
+    json_path = str(tmpdir.join('out.json'))
+    bin_path = str(tmpdir.join('out.trace'))
+
+    assert main(['-s', 'run_time 10 minutes', '-t', json_path, infile]) == 0
+    assert main(['-s', 'run_time 10 minutes', '-t', bin_path, '--trace-format', 'binary', infile]) == 0
+
+    assert len(SimulationTrace.FromFile(bin_path)) == 60
+    assert main(['--diff', json_path, bin_path]) == 0
@@ -1 +1 @@
-version = "0.7.2"
+version = "0.8.0"
@@ -44,6 +44,7 @@ class AWSIOTDeviceAdapter(DeviceAdapter):
         args['iam_key'] = iamuser
         args['iam_secret'] = iamsecret
         args['iam_session'] = iamsession
+        args['payload_encoding'] = reg.get_config('awsiot-payload-encoding', default='json')
 
         self._logger = logging.getLogger(__name__)
 
@@ -312,6 +313,11 @@ class AWSIOTDeviceAdapter(DeviceAdapter):
         """Periodically help maintain adapter internal state
         """
 
+        try:
+            self.client.check_timeouts()
+        except Exception:
+            self._logger.exception('Exception checking for missing packets')
+
         while True:
             try:
                 action = self._deferred.get(False)
@@ -408,10 +414,13 @@ class AWSIOTDeviceAdapter(DeviceAdapter):
 
         try:
             rep_msg = messages.ReportNotification.verify(message)
+            encoded_report = self._reassemble_report(conn_id, rep_msg)
+            if encoded_report is None:
+                return
 
             serialized_report = {}
             serialized_report['report_format'] = rep_msg['report_format']
-            serialized_report['encoded_report'] = rep_msg['report']
+            serialized_report['encoded_report'] = encoded_report
             serialized_report['received_time'] = datetime.datetime.strptime(rep_msg['received_time'].decode(), "%Y%m%dT%H:%M:%S.%fZ")
 
             report = IOTileReportParser.DeserializeReport(serialized_report)
@@ -419,6 +428,66 @@ class AWSIOTDeviceAdapter(DeviceAdapter):
         except Exception:
             self._logger.exception("Error processing report conn_id=%d", conn_id)
 
+    @classmethod
+    def _decode_binary(cls, data, encoding):
+        """Decode a binary field of a notification.
+
+        Args:
+            data (string): The field, either hex encoded or raw bytes
+            encoding (string): 'raw' if the field was sent as raw bytes,
+                None if it is hex encoded.
+
+        Returns:
+            bytes: The decoded field
+        """
+
+        if encoding == 'raw':
+            return bytes(data)
+
+        return binascii.unhexlify(data)
+
+    def _reassemble_report(self, conn_id, rep_msg):
+        """Add a report fragment to the fragments received so far.
+
+        Fragments of a report are published back to back on the ordered
+        streaming topic, so they are received in order.  An incomplete
+        report is dropped if a fragment is missing.
+
+        Args:
+            conn_id (int): The connection the fragment was received on
+            rep_msg (dict): The verified report notification
+
+        Returns:
+            bytes: The complete encoded report if this was its last fragment,
+                otherwise None.
+        """
+
+        fragment = self._decode_binary(rep_msg['report'], rep_msg.get('report_encoding'))
+        index = rep_msg['fragment_index']
+        count = rep_msg['fragment_count']
+
+        if count == 1:
+            return fragment
+
+        context = self.conns.get_context(conn_id)
+        if index == 0:
+            context['report_fragments'] = {'count': count, 'received': 0, 'data': bytearray()}
+
+        partial = context.get('report_fragments')
+        if partial is None or partial['count'] != count or partial['received'] != index:
+            self._logger.warn("Dropping out of order report fragment %d of %d, conn_id=%d", index, count, conn_id)
+            context.pop('report_fragments', None)
+            return None
+
+        partial['data'] += fragment
+        partial['received'] += 1
+
+        if partial['received'] < count:
+            return None
+
+        del context['report_fragments']
+        return bytes(partial['data'])
+
     def _on_trace(self, sequence, topic, message):
         """Process a trace received from a device.
 
@@ -437,7 +506,7 @@ class AWSIOTDeviceAdapter(DeviceAdapter):
 
         try:
             tracing = messages.TracingNotification.verify(message)
-            self._trigger_callback('on_trace', conn_id, tracing['trace'])
+            self._trigger_callback('on_trace', conn_id, self._decode_binary(tracing['trace'], tracing.get('trace_encoding')))
         except Exception:
             self._logger.exception("Error processing trace conn_id=%d", conn_id)
 
@@ -30,6 +30,12 @@ class AWSIOTGatewayAgent(object):
               in between this interval and only the last one is sent every interval unless
               the progres event indicates that the total operation has finished, in which
               case it is sent immediately.  Default: 2s
+            - payload_encoding (str): How to encode MQTT packets, either json or msgpack.
+              With msgpack, reports and traces are sent as raw bytes instead of being
+              hex encoded, which halves their size.  Default: json
+            - report_fragment_size (int): The maximum number of bytes of an encoded report
+              to send in a single MQTT message.  Larger reports are split into fragments
+              that the device adapter reassembles.  Default: 60 KB
 
     """
 
@@ -41,6 +47,7 @@ class AWSIOTGatewayAgent(object):
         self.slug = None
         self.topics = None
         self._disconnector = None
+        self._timeout_checker = None
         self._connections = {}
 
         self._logger = logging.getLogger(__name__)
@@ -58,6 +65,11 @@ class AWSIOTGatewayAgent(object):
         self.throttle_trace = self._args.get('trace_throttle_interval', 5.0)
         self.throttle_progress = self._args.get('progress_throttle_interval', 2.0)
         self.client_timeout = self._args.get('client_timeout', 60.0)
+        self.report_fragment_size = int(self._args.get('report_fragment_size', 60*1024))
+
+        if self.report_fragment_size < 1:
+            raise ArgumentError("Invalid report_fragment_size in awsiot gateway agent arguments",
+                                report_fragment_size=self.report_fragment_size)
 
     @classmethod
     def _build_device_slug(cls, device_id):
@@ -91,12 +103,18 @@ class AWSIOTGatewayAgent(object):
         self._disconnector = tornado.ioloop.PeriodicCallback(self._disconnect_hanging_devices, 1000, self._loop)
         self._disconnector.start()
 
+        self._timeout_checker = tornado.ioloop.PeriodicCallback(self.client.check_timeouts, 1000, self._loop)
+        self._timeout_checker.start()
+
     def stop(self):
         """Stop this gateway agent."""
 
         if self._disconnector:
             self._disconnector.stop()
 
+        if self._timeout_checker:
+            self._timeout_checker.stop()
+
         self.client.disconnect()
 
     def _prepare(self):
@@ -590,17 +608,34 @@ class AWSIOTGatewayAgent(object):
         slug = self._build_device_slug(device_uuid)
         streaming_topic = self.topics.prefix + 'devices/{}/data/streaming'.format(slug)
 
-        data = {'type': 'notification', 'operation': 'report'}
-
         ser = report.serialize()
-        data['received_time'] = ser['received_time'].strftime("%Y%m%dT%H:%M:%S.%fZ").encode()
-        data['report_origin'] = ser['origin']
-        data['report_format'] = ser['report_format']
-        data['report'] = binascii.hexlify(ser['encoded_report'])
-        data['fragment_count'] = 1
-        data['fragment_index'] = 0
-        self._logger.debug("Publishing report: (topic=%s)", streaming_topic)
-        self.client.publish(streaming_topic, data)
+        encoded_report = ser['encoded_report']
+        received_time = ser['received_time'].strftime("%Y%m%dT%H:%M:%S.%fZ").encode()
+
+        # Split reports that are too large for a single MQTT message into fragments.  Fragments
+        # are published back to back on an ordered topic so they cannot interleave with other reports
+        size = self.report_fragment_size
+        fragment_count = max(1, (len(encoded_report) + size - 1) // size)
+
+        for i in xrange(0, fragment_count):
+            fragment = encoded_report[i*size:(i + 1)*size]
+
+            data = {'type': 'notification', 'operation': 'report'}
+            data['received_time'] = received_time
+            data['report_origin'] = ser['origin']
+            data['report_format'] = ser['report_format']
+            data['fragment_count'] = fragment_count
+            data['fragment_index'] = i
+
+            if self.client.binary:
+                data['report'] = bytes(fragment)
+                data['report_encoding'] = 'raw'
+            else:
+                data['report'] = binascii.hexlify(fragment)
+
+            self._logger.debug("Publishing report fragment %d of %d: (topic=%s)", i + 1, fragment_count,
+                               streaming_topic)
+            self.client.publish(streaming_topic, data)
 
     def _notify_trace(self, device_uuid, event_name, trace):
         """Notify that we have received tracing data from a device.
@@ -644,9 +679,14 @@ class AWSIOTGatewayAgent(object):
             tracing_topic = self.topics.prefix + 'devices/{}/data/tracing'.format(slug)
 
             data = {'type': 'notification', 'operation': 'trace'}
-            data['trace'] = binascii.hexlify(trace)
             data['trace_origin'] = device_uuid
 
+            if self.client.binary:
+                data['trace'] = bytes(trace)
+                data['trace_encoding'] = 'raw'
+            else:
+                data['trace'] = binascii.hexlify(trace)
+
             self._logger.debug('Publishing trace: (topic=%s)', tracing_topic)
             self.client.publish(tracing_topic, data)
 
@@ -160,15 +160,17 @@ ReportNotification.add_required('fragment_count', IntVerifier())
 ReportNotification.add_required('fragment_index', IntVerifier())
 ReportNotification.add_required('operation', LiteralVerifier('report'))
 ReportNotification.add_required('received_time', StringVerifier())
-ReportNotification.add_required('report', BytesVerifier(encoding='hex'))
+ReportNotification.add_required('report', OptionsVerifier(StringVerifier(), BytesVerifier()))  # hex unless report_encoding is raw
 ReportNotification.add_required('report_origin', IntVerifier())
 ReportNotification.add_required('report_format', IntVerifier())
+ReportNotification.add_optional('report_encoding', LiteralVerifier('raw'))
 
 TracingNotification = DictionaryVerifier()  # pylint: disable=C0103
 TracingNotification.add_required('type', LiteralVerifier('notification'))
 TracingNotification.add_required('operation', LiteralVerifier('trace'))
 TracingNotification.add_required('trace_origin', IntVerifier())
-TracingNotification.add_required('trace', BytesVerifier(encoding='hex'))
+TracingNotification.add_required('trace', OptionsVerifier(StringVerifier(), BytesVerifier()))  # hex unless trace_encoding is raw
+TracingNotification.add_optional('trace_encoding', LiteralVerifier('raw'))
 
 ProgressNotification = DictionaryVerifier()  # pylint: disable=C0103
 ProgressNotification.add_required('type', LiteralVerifier('notification'))
@@ -2,6 +2,7 @@ import json
 import logging
 import AWSIoTPythonSDK.MQTTLib
 import re
+import msgpack
 from AWSIoTPythonSDK.exception import operationError
 from iotile.core.exceptions import ArgumentError, ExternalError, InternalError
 from iotile.core.dev.registry import ComponentRegistry
@@ -12,11 +13,25 @@ from topic_sequencer import TopicSequencer
 class OrderedAWSIOTClient(object):
     """An MQTT based channel to connect with an IOTile Device
 
+    Packets are published as JSON unless the payload_encoding argument is
+    'msgpack', in which case they are packed with msgpack and binary fields
+    can be sent as raw bytes.  Received packets are decoded according to
+    their own encoding, so clients using either encoding can talk to each
+    other as long as they understand the binary fields they receive.
+
+    Packets on ordered topics are reordered by sequence number.  A missing
+    packet is skipped if it has not arrived after the missing_timeout
+    argument (default: 10 seconds).  The owner of the client should call
+    check_timeouts() periodically so this also happens when no more packets
+    arrive on the topic.
+
     Args:
         args (dict): A dictionary of arguments for setting up the
             MQTT connection.
     """
 
+    Encodings = ('json', 'msgpack')
+
     def __init__(self, args):
         cert = args.get('certificate', None)
         key = args.get('private_key', None)
@@ -26,6 +41,11 @@ class OrderedAWSIOTClient(object):
         iamsecret = args.get('iam_secret', None)
         iamsession = args.get('iam_session', None)
         use_websockets = args.get('use_websockets', False)
+        payload_encoding = args.get('payload_encoding', 'json')
+
+        if payload_encoding not in self.Encodings:
+            raise ArgumentError("Unknown MQTT payload encoding", payload_encoding=payload_encoding,
+                                known_encodings=self.Encodings)
 
         try:
             if not use_websockets:
@@ -69,6 +89,8 @@ class OrderedAWSIOTClient(object):
         self.key = key
         self.root = root
         self.endpoint = endpoint
+        self.payload_encoding = payload_encoding
+        self.missing_timeout = args.get('missing_timeout', 10.0)
         self.client = None
         self.sequencer = TopicSequencer()
         self.queues = {}
@@ -109,6 +131,12 @@ class OrderedAWSIOTClient(object):
 
         self.sequencer.reset()
 
+    @property
+    def binary(self):
+        """Whether published packets can contain raw binary fields."""
+
+        return self.payload_encoding == 'msgpack'
+
     def disconnect(self):
         """Disconnect from AWS IOT message broker
         """
@@ -122,9 +150,10 @@ class OrderedAWSIOTClient(object):
             raise InternalError("Could not disconnect from AWS IOT", message=exc.message)
 
     def publish(self, topic, message):
-        """Publish a json message to a topic with a type and a sequence number
+        """Publish a message to a topic with a type and a sequence number
 
-        The actual message will be published as a JSON object:
+        The actual message will be published as a JSON or msgpack object
+        depending on the payload encoding of this client:
         {
             "sequence": <incrementing id>,
             "message": message
@@ -142,11 +171,14 @@ class OrderedAWSIOTClient(object):
             'message': message
         }
 
-        serialized_packet = json.dumps(packet)
+        if self.binary:
+            serialized_packet = msgpack.packb(packet, use_bin_type=True)
+        else:
+            serialized_packet = json.dumps(packet)
 
         try:
             # Limit how much we log in case the message is very long
-            self._logger.debug("Publishing %s on topic %s", serialized_packet[:256], topic)
+            self._logger.debug("Publishing %r on topic %s", serialized_packet[:256], topic)
             self.client.publish(topic, serialized_packet, 1)
         except operationError, exc:
             raise InternalError("Could not publish message", topic=topic, message=exc.message)
@@ -155,7 +187,7 @@ class OrderedAWSIOTClient(object):
         """Subscribe to future messages in the given topic
 
         The contents of topic should be in the format created by self.publish with a
-        sequence number of message type encoded as a json string.
+        sequence number of message type encoded as a json string or msgpack object.
 
         Wildcard topics containing + and # are allowed and
 
@@ -171,7 +203,7 @@ class OrderedAWSIOTClient(object):
             regex = re.compile(topic.replace('+', '[^/]+').replace('#', '.*'))
             self.wildcard_queues.append((topic, regex, callback, ordered))
         else:
-            self.queues[topic] = PacketQueue(0, callback, ordered)
+            self.queues[topic] = PacketQueue(self.missing_timeout, callback, ordered)
 
         try:
             self.client.subscribe(topic, 1, self._on_receive)
@@ -192,6 +224,16 @@ class OrderedAWSIOTClient(object):
         if topic in self.queues:
             self.queues[topic].reset()
 
+    def check_timeouts(self):
+        """Skip missing packets that have timed out on every ordered topic.
+
+        Packets received after a missing packet are otherwise only passed on
+        once another packet arrives on the same topic.
+        """
+
+        for packet_queue in list(self.queues.values()):
+            packet_queue.check_timeouts()
+
     def unsubscribe(self, topic):
         """Unsubscribe from messages on a given topic
 
@@ -218,16 +260,20 @@ class OrderedAWSIOTClient(object):
         topic = message.topic
         encoded = message.payload
 
+        # JSON packets are always objects while msgpack packets start with a map header
         try:
-            packet = json.loads(encoded)
-        except ValueError:
-            self._logger.warn("Could not decode json packet: %s", encoded)
+            if encoded[:1] == b'{':
+                packet = json.loads(encoded)
+            else:
+                packet = msgpack.unpackb(encoded, raw=False)
+        except (ValueError, msgpack.UnpackException):
+            self._logger.warn("Could not decode packet: %r", encoded[:256])
             return
 
         try:
             seq = packet['sequence']
             message_data = packet['message']
-        except KeyError:
+        except (KeyError, TypeError):
             self._logger.warn("Message received did not have required sequence and message keys: %s", packet)
             return
 
@@ -237,7 +283,7 @@ class OrderedAWSIOTClient(object):
             found = False
             for _, regex, callback, ordered in self.wildcard_queues:
                 if regex.match(topic):
-                    self.queues[topic] = PacketQueue(0, callback, ordered)
+                    self.queues[topic] = PacketQueue(self.missing_timeout, callback, ordered)
                     found = True
                     break
 
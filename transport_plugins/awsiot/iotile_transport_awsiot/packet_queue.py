@@ -1,18 +1,30 @@
 """A packet queue for reordering out of order packets
 
-TODO:
-- Add timeout
-- replace list with a priority queue
-- Add maximum out of order window
+Packets that arrive before the packet that should come before them are kept
+in a dictionary keyed by sequence number until the missing packets arrive.
+If a missing packet does not arrive within missing_timeout seconds, or too
+many packets are waiting for it, the queue gives up on it and continues with
+the next packet that it has.
+
+The timeout is checked whenever a packet is received and whenever
+check_timeouts() is called, which the owner of the queue should do
+periodically so that packets held behind a missing one are not stuck when no
+more packets arrive.
 """
 
+import logging
+import threading
+from monotonic import monotonic
+
 
 class PacketQueue(object):
     """A queue for reordering out-of-order messages
 
     Args:
-        missing_timeout (int): The maximum time to wait for a missing packet
-            without triggering a timeout error
+        missing_timeout (float): The maximum time in seconds to wait for a missing
+            packet before skipping it and processing the packets received after it.
+            The timeout is checked whenever a packet is received or check_timeouts()
+            is called.  If None, wait forever for missing packets.
         callback (callable): A callback function that should be called for
             each received message with the signature:
             callback(*args) where args is the list passed to receive
@@ -21,14 +33,60 @@ class PacketQueue(object):
             channel or if each packet is independent and sequence numbers
             should not be checked.  True means sequence numbers are checked
             and packets are reordered.
-
+        max_buffered (int): The maximum number of out of order packets to keep
+            while waiting for a missing packet.  When there are more, the missing
+            packet is skipped.
     """
-    def __init__(self, missing_timeout, callback, reorder=True):
-        self._out_of_order = []
+
+    def __init__(self, missing_timeout, callback, reorder=True, max_buffered=1000):
+        self._out_of_order = {}
         self._next_expected = None
+        self._gap_started = None
         self._callback = callback
         self._reorder = reorder
         self._missing_timeout = missing_timeout
+        self._max_buffered = max_buffered
+        self._logger = logging.getLogger(__name__)
+
+        # Packets are received on the MQTT client's thread while timeouts may be checked from another one.
+        # Callbacks are run with the lock held so that packets are always passed on in order.
+        self._lock = threading.RLock()
+
+        self._delivered = 0
+        self._dropped = 0
+        self._skipped = 0
+        self._timeouts = 0
+        self._overflows = 0
+        self._max_depth = 0
+
+    @property
+    def depth(self):
+        """The number of out of order packets waiting for a missing packet."""
+
+        return len(self._out_of_order)
+
+    @property
+    def statistics(self):
+        """Counters describing the packets that went through this queue.
+
+        Returns:
+            dict: The current and maximum reorder depth, the number of packets
+                delivered, the number of late or duplicate packets dropped, the
+                number of missing packets skipped and how many times packets were
+                skipped because of a timeout or because too many packets were
+                waiting.
+        """
+
+        with self._lock:
+            return {
+                'depth': len(self._out_of_order),
+                'max_depth': self._max_depth,
+                'delivered': self._delivered,
+                'dropped': self._dropped,
+                'skipped': self._skipped,
+                'timeouts': self._timeouts,
+                'overflows': self._overflows
+            }
 
     def receive(self, sequence, args):
         """Receive one packet
@@ -37,7 +95,7 @@ class PacketQueue(object):
 
         If it is not the next expected sequence number, it is put into the
         _out_of_order queue to be processed once the holes in sequence number
-        are filled in.
+        are filled in or skipped.
 
         Args:
             sequence (int): The sequence number of the received packet
@@ -47,30 +105,89 @@ class PacketQueue(object):
 
         # If we are told to ignore sequence numbers, just pass the packet on
         if not self._reorder:
+            self._delivered += 1
             self._callback(*args)
             return
 
-        # If this packet is in the past, drop it
-        if self._next_expected is not None and sequence < self._next_expected:
-            print "Dropping out of order packet, seq=%d" % sequence
+        with self._lock:
+            # If this packet is in the past or a duplicate, drop it
+            if (self._next_expected is not None and sequence < self._next_expected) or sequence in self._out_of_order:
+                self._logger.debug("Dropping late or duplicate packet, seq=%d", sequence)
+                self._dropped += 1
+                return
+
+            self._out_of_order[sequence] = args
+            self._max_depth = max(self._max_depth, len(self._out_of_order))
+
+            if self._next_expected is None:
+                self._next_expected = min(self._out_of_order)
+
+            self._process()
+
+            if len(self._out_of_order) > self._max_buffered:
+                self._overflows += 1
+                self._skip_missing()
+            else:
+                self._check_timeout()
+
+    def check_timeouts(self):
+        """Skip a missing packet if we have waited longer than missing_timeout for it.
+
+        This should be called periodically so that packets received after a
+        missing packet are passed on even if no more packets arrive.
+        """
+
+        with self._lock:
+            self._check_timeout()
+
+    def _check_timeout(self):
+        """Skip the oldest missing packet if it timed out.  Must be called with the lock held."""
+
+        if len(self._out_of_order) == 0 or self._missing_timeout is None:
             return
 
-        self._out_of_order.append((sequence, args))
-        self._out_of_order.sort(key=lambda x: x[0])
+        if monotonic() - self._gap_started > self._missing_timeout:
+            self._timeouts += 1
+            self._skip_missing()
 
-        # If we have received packets, attempt to process them in order
-        while len(self._out_of_order) > 0:
-            seq, args = self._out_of_order[0]
+    def _process(self):
+        """Pass on all of the packets that are next in sequence."""
 
-            if self._next_expected is not None and seq != self._next_expected:
-                return
+        delivered = False
+        while self._next_expected in self._out_of_order:
+            args = self._out_of_order.pop(self._next_expected)
+            self._next_expected += 1
+            self._delivered += 1
+            delivered = True
 
             self._callback(*args)
-            self._out_of_order.pop(0)
-            self._next_expected = seq+1
+
+        # Start timing the wait for the missing packet when a new gap appears
+        if len(self._out_of_order) == 0:
+            self._gap_started = None
+        elif delivered or self._gap_started is None:
+            self._gap_started = monotonic()
+
+    def _skip_missing(self):
+        """Give up on the missing packets before the oldest packet we have."""
+
+        first = min(self._out_of_order)
+        missing = first - self._next_expected
+
+        self._logger.warn("Skipping %d missing packets, seq=%d to %d", missing, self._next_expected, first - 1)
+        self._skipped += missing
+        self._next_expected = first
+        self._process()
 
     def reset(self):
         """Reset the expected next sequence number
+
+        Any packets waiting for a missing packet are discarded since they
+        belong to the sequence that is being reset.
         """
 
-        self._next_expected = None
+        with self._lock:
+            self._dropped += len(self._out_of_order)
+            self._out_of_order.clear()
+            self._gap_started = None
+            self._next_expected = None
@@ -10,6 +10,7 @@ setup(
     install_requires=[
         "iotile-core>=3.6.2",
         "AWSIoTPythonSDK>=1.0.0",
+        "msgpack>=0.5.5",
         "monotonic"
     ],
 
@@ -1,4 +1,6 @@
+import json
 import Queue
+import msgpack
 from iotile_transport_awsiot.mqtt_client import OrderedAWSIOTClient
 import time
 
@@ -54,6 +56,48 @@ def test_streaming(gateway, hw_man, local_broker):
     assert len(reps) == 100
 
 
+def test_streaming_fragments(gateway, hw_man, local_broker):
+    """Make sure reports split into several messages are reassembled."""
+
+    gateway.agents[0].report_fragment_size = 8
+
+    hw_man.connect(3, wait=0.1)
+    hw_man.enable_streaming()
+    reps = hw_man.wait_reports(100, timeout=1.0)
+
+    assert len(reps) == 100
+    assert all(x.origin == 3 for x in reps)
+
+    streamed = local_broker.messages['devices/d--0000-0000-0000-0002/devices/d--0000-0000-0000-0003/data/streaming']
+    fragments = [json.loads(x[1])['message'] for x in streamed]
+    assert len(fragments) > 100
+    assert all(x['fragment_count'] > 1 for x in fragments)
+
+
+def test_binary_encoding(gateway, hw_man, local_broker):
+    """Make sure reports and traces can be sent as raw bytes in msgpack packets."""
+
+    gateway.agents[0].client.payload_encoding = 'msgpack'
+
+    hw_man.connect(3, wait=0.1)
+    hw_man.enable_streaming()
+    reps = hw_man.wait_reports(100, timeout=1.0)
+    assert len(reps) == 100
+
+    streamed = local_broker.messages['devices/d--0000-0000-0000-0002/devices/d--0000-0000-0000-0003/data/streaming']
+    message = msgpack.unpackb(streamed[0][1], raw=False)['message']
+    assert message['report_encoding'] == 'raw'
+    assert message['report'] == reps[0].encode()
+
+    hw_man.disconnect()
+    hw_man.connect(4, wait=0.1)
+    hw_man.enable_tracing()
+
+    time.sleep(0.1)
+    data = hw_man.dump_trace('raw')
+    assert data == 'Hello world, this is tracing data!'
+
+
 def test_tracing(gateway, hw_man, local_broker):
     """Make sure we can receive tracing data."""
 
@@ -1,3 +1,5 @@
+import pytest
+from iotile.core.exceptions import ArgumentError
 from iotile_transport_awsiot.mqtt_client import OrderedAWSIOTClient
 
 
@@ -8,3 +10,37 @@ def test_basic_functionality(local_broker, args):
     client = OrderedAWSIOTClient(args)
     client.connect('hello')
     client.publish('test_topic', 'hello')
+
+
+def test_payload_encodings(local_broker, args):
+    """Make sure packets in either encoding are received by any client."""
+
+    received = []
+
+    args['payload_encoding'] = 'msgpack'
+    binary = OrderedAWSIOTClient(args)
+    binary.connect('binary')
+
+    args['payload_encoding'] = 'json'
+    text = OrderedAWSIOTClient(args)
+    text.connect('text')
+    text.subscribe('binary_topic', lambda seq, topic, message: received.append(message))
+    text.subscribe('text_topic', lambda seq, topic, message: received.append(message))
+
+    binary.publish('binary_topic', {'data': b'\x00\xff'})
+    text.publish('text_topic', {'data': 'abc'})
+
+    # Raw bytes are packed as is instead of being hex encoded
+    assert local_broker.messages['binary_topic'][0][1][:1] != b'{'
+    assert b'\x00\xff' in local_broker.messages['binary_topic'][0][1]
+    assert local_broker.messages['text_topic'][0][1][:1] == b'{'
+    assert received == [{'data': b'\x00\xff'}, {'data': 'abc'}]
+
+
+def test_invalid_encoding(local_broker, args):
+    """Make sure unknown payload encodings are rejected."""
+
+    args['payload_encoding'] = 'xml'
+
+    with pytest.raises(ArgumentError):
+        OrderedAWSIOTClient(args)
@@ -0,0 +1,141 @@
+"""Tests of reordering packets by sequence number."""
+
+import time
+from iotile_transport_awsiot.packet_queue import PacketQueue
+
+
+def build_queue(missing_timeout=None, max_buffered=1000):
+    received = []
+    queue = PacketQueue(missing_timeout, lambda seq: received.append(seq), max_buffered=max_buffered)
+
+    return queue, received
+
+
+def test_reordering():
+    """Make sure out of order packets are delivered in order and duplicates are dropped."""
+
+    queue, received = build_queue()
+
+    for seq in [5, 7, 6, 6, 9, 8, 4, 10]:
+        queue.receive(seq, [seq])
+
+    assert received == [5, 6, 7, 8, 9, 10]
+
+    stats = queue.statistics
+    assert stats['delivered'] == 6
+    assert stats['dropped'] == 2
+    assert stats['max_depth'] == 2
+    assert stats['depth'] == 0
+
+    queue.reset()
+    queue.receive(1, [1])
+    assert received[-1] == 1
+
+
+def test_missing_timeout():
+    """Make sure a missing packet is skipped after the timeout."""
+
+    queue, received = build_queue(missing_timeout=0.05)
+
+    queue.receive(0, [0])
+    queue.receive(2, [2])
+    queue.receive(3, [3])
+    assert received == [0]
+    assert queue.depth == 2
+
+    time.sleep(0.1)
+    queue.receive(5, [5])
+    assert received == [0, 2, 3]
+
+    # The wait for packet 4 started when packet 3 was delivered
+    time.sleep(0.1)
+    queue.receive(6, [6])
+    assert received == [0, 2, 3, 5, 6]
+
+    # The skipped packet is dropped if it arrives late
+    queue.receive(1, [1])
+    assert received == [0, 2, 3, 5, 6]
+
+    stats = queue.statistics
+    assert stats['skipped'] == 2
+    assert stats['timeouts'] == 2
+    assert stats['dropped'] == 1
+
+
+def test_check_timeouts():
+    """Make sure packets held behind a missing packet are passed on without more traffic."""
+
+    queue, received = build_queue(missing_timeout=0.05)
+
+    queue.receive(0, [0])
+    queue.receive(2, [2])
+
+    queue.check_timeouts()
+    assert received == [0]
+
+    time.sleep(0.1)
+    queue.check_timeouts()
+    assert received == [0, 2]
+    assert queue.statistics['timeouts'] == 1
+
+    # Nothing is waiting anymore so there is nothing to time out
+    time.sleep(0.1)
+    queue.check_timeouts()
+    assert queue.statistics['timeouts'] == 1
+
+
+def test_reset():
+    """Make sure resetting discards packets from the previous sequence."""
+
+    queue, received = build_queue(missing_timeout=0.05)
+
+    queue.receive(10, [10])
+    queue.receive(12, [12])
+    queue.receive(13, [13])
+
+    queue.reset()
+    assert queue.depth == 0
+    assert queue.statistics['dropped'] == 2
+
+    # A new sequence that reuses sequence numbers is delivered normally
+    for seq in [12, 13, 14]:
+        queue.receive(seq, [seq])
+
+    time.sleep(0.1)
+    queue.check_timeouts()
+    assert received == [10, 12, 13, 14]
+    assert queue.statistics['timeouts'] == 0
+
+
+def test_buffer_limit():
+    """Make sure a missing packet is skipped when too many packets are waiting."""
+
+    queue, received = build_queue(max_buffered=10)
+
+    queue.receive(0, [0])
+    for seq in range(2, 12):
+        queue.receive(seq, [seq])
+
+    assert received == [0]
+    assert queue.depth == 10
+
+    queue.receive(12, [12])
+    assert received == [0] + list(range(2, 13))
+    assert queue.statistics['overflows'] == 1
+    assert queue.statistics['skipped'] == 1
+
+
+def test_reordering_load():
+    """Make sure reordering many packets does not depend on the amount buffered."""
+
+    queue, received = build_queue()
+    count = 100000
+
+    # After the first packet, deliver packets in blocks of 100 in reverse order
+    queue.receive(0, [0])
+    for block in range(1, count, 100):
+        for seq in range(block + 99, block - 1, -1):
+            queue.receive(seq, [seq])
+
+    assert received == list(range(0, count + 1))
+    assert queue.statistics['max_depth'] == 100
@@ -1 +1 @@
-version = "0.2.2"
+version = "0.3.0"
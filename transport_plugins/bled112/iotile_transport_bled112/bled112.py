@@ -978,7 +978,8 @@ class BLED112Adapter(DeviceAdapter):
         conndata['services'] = services
 
         #Create a report parser for this connection for when reports are streamed to us
-        conndata['parser'] = IOTileReportParser(report_callback=self._on_report, error_callback=self._on_report_error)
+        conndata['parser'] = IOTileReportParser(report_callback=self._on_report, error_callback=self._on_report_error,
+                                                lazy=self.get_config('lazy_reports', False))
         conndata['parser'].context = conn_id
 
         del conndata['disconnect_handler']
@@ -576,7 +576,8 @@ class NativeBLEDeviceAdapter(DeviceAdapter):
             )
             return
 
-        context['parser'] = IOTileReportParser(report_callback=self._on_report, error_callback=self._on_report_error)
+        context['parser'] = IOTileReportParser(report_callback=self._on_report, error_callback=self._on_report_error,
+                                               lazy=self.get_config('lazy_reports', False))
         context['parser'].context = connection_id
 
         def on_report_chunk_received(report_chunk):
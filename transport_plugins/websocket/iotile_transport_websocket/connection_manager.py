@@ -295,6 +295,8 @@ class ConnectionManager(threading.Thread):
                         self.finish_operation(conn_id, False, 'RPC timed out without response', None, None)
                     elif data['microstate'] == 'open_interface':
                         self.finish_operation(conn_id, False, 'Open interface request timed out')
+                    elif data['microstate'] == 'script':
+                        self.finish_operation(conn_id, False, 'Script transfer timed out')
 
     def begin_connection(self, conn_id, internal_id, callback, context, timeout):
         """Asynchronously begin a connection attempt
@@ -613,6 +615,47 @@ class ConnectionManager(threading.Thread):
         data['microstate'] = action.data['operation_name']
         data['action'] = action
 
+    def extend_operation(self, conn_or_internal_id, timeout):
+        """Restart the timeout of an operation in progress.
+
+        This is used by long operations like script uploads that make
+        progress in steps, so that they are only timed out when no step
+        finishes in time.  Operations started without a timeout keep not
+        having one.
+
+        Args:
+            conn_or_internal_id (string, int): Either an integer connection id or a string
+                internal_id
+            timeout (float): How long to allow the operation to proceed from now
+                without timing it out (in seconds)
+        """
+
+        data = {
+            'id': conn_or_internal_id,
+            'timeout': timeout
+        }
+
+        action = ConnectionAction('extend_operation', data, sync=False)
+        self._actions.put(action)
+
+    def _extend_operation_action(self, action):
+        """Restart the timeout of an operation in progress.
+
+        Args:
+            action (ConnectionAction): the action object describing the operation
+                and its new timeout
+        """
+
+        conn_key = action.data['id']
+
+        # The operation may have finished while this action was queued
+        if self._get_connection_state(conn_key) != self.InProgress:
+            return
+
+        operation = self._get_connection(conn_key)['action']
+        if operation.timeout is not None:
+            operation.set_timeout(action.data['timeout'])
+
     def finish_operation(self, conn_or_internal_id, success, *args):
         """Finish an operation on a connection.
 
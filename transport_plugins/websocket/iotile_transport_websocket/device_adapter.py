@@ -1,7 +1,7 @@
 # This file is copyright Arch Systems, Inc.
 # Except as otherwise provided in the relevant LICENSE file, all rights are reserved.
 
-import base64
+import hashlib
 import logging
 import monotonic
 import threading
@@ -11,18 +11,31 @@ from iotile.core.utilities.validating_wsclient import ValidatingWSClient
 from iotile.core.hw.reports.parser import IOTileReportParser
 from iotile.core.exceptions import ArgumentError, HardwareError
 from .connection_manager import ConnectionManager
-from .protocol import notifications, operations, responses
+from .protocol import encoding, notifications, operations, responses
 
 
 class WebSocketDeviceAdapter(DeviceAdapter):
     """ A device adapter allowing connections to devices over WebSockets
 
+    When the adapter connects, it negotiates the newest protocol version that both it and the
+    server support, so binary payloads are sent without base64 encoding when possible.
+
+    Since protocol version 3, scripts are uploaded with a sliding window of `script_window`
+    fragments of `mtu` bytes that the server acknowledges as it receives them.  An upload that
+    is interrupted can be resumed by sending the same script again after reconnecting.
+
+    If the `lazy_reports` config is set, received reports are created in lazy mode so their
+    readings are only decoded if someone accesses them.  iotile-gateway turns this on since it
+    only forwards reports.
+
     Args:
         port (string): A url for the WebSocket server in form of server:port
         autoprobe_interval (int): If not None, run a probe refresh every `autoprobe_interval` seconds
+        protocol_version (int): The newest protocol version to request from the server.  Defaults
+            to the newest version this adapter supports.
     """
 
-    def __init__(self, port, autoprobe_interval=None):
+    def __init__(self, port, autoprobe_interval=None, protocol_version=encoding.LATEST_VERSION):
         super(WebSocketDeviceAdapter, self).__init__()
 
         # Configuration
@@ -31,6 +44,9 @@ class WebSocketDeviceAdapter(DeviceAdapter):
         self.set_config('maximum_connections', 100)
         self.set_config('probe_required', True)
         self.set_config('probe_supported', True)
+        self.set_config('mtu', 60*1024)
+        self.set_config('script_window', 8)
+        self.set_config('lazy_reports', False)
 
         # Set logger
         self.logger = logging.getLogger(__name__)
@@ -46,16 +62,23 @@ class WebSocketDeviceAdapter(DeviceAdapter):
         self.client.add_message_type(responses.Scan, self._on_probe_finished)
         self.client.add_message_type(responses.SendRPC, self._on_rpc_finished)
         self.client.add_message_type(responses.SendScript, self._on_script_finished)
+        self.client.add_message_type(responses.BeginScript, self._on_script_begun)
         self.client.add_message_type(responses.OpenInterface, self._on_interface_opened)
         self.client.add_message_type(responses.CloseInterface, self._on_interface_closed)
+        self.client.add_message_type(responses.NegotiateProtocol, self._on_protocol_negotiated)
         self.client.add_message_type(responses.Unknown, self._on_unknown_response)
         self.client.add_message_type(notifications.DeviceFound, self._on_device_found)
         self.client.add_message_type(notifications.Report, self._on_report_chunk_received)
         self.client.add_message_type(notifications.Trace, self._on_trace_chunk_received)
         self.client.add_message_type(notifications.Progress, self._on_progress_notification)
+        self.client.add_message_type(notifications.ScriptAck, self._on_script_ack)
         self.client.disconnection_callback = self._on_websocket_disconnect
 
+        self.protocol_version = encoding.BASE64_VERSION
+        self._protocol_negotiated = threading.Event()
+
         self.client.start()
+        self._negotiate_protocol(int(protocol_version))
 
         # To manage multiple connections
         self.connections = ConnectionManager(self.id)
@@ -67,6 +90,38 @@ class WebSocketDeviceAdapter(DeviceAdapter):
         self.last_probe = 0
         self.autoprobe_interval = float(autoprobe_interval) if autoprobe_interval is not None else None
 
+    def _negotiate_protocol(self, version):
+        """Ask the server to use the newest protocol version that we both support.
+
+        Servers that do not support negotiation respond with an error and we keep
+        using the original protocol version.
+
+        Args:
+            version (int): The newest protocol version that we support
+        """
+
+        if version <= encoding.BASE64_VERSION:
+            return
+
+        self.send_command_async(operations.NEGOTIATE_PROTOCOL, version=version)
+
+        if not self._protocol_negotiated.wait(self.get_config('default_timeout')):
+            self.logger.warn('Timeout negotiating protocol version, using version {}'.format(self.protocol_version))
+
+    def _on_protocol_negotiated(self, response):
+        """Callback function called when the server has answered our protocol negotiation.
+
+        Args:
+            response (dict): The response data
+        """
+
+        if response['success']:
+            self.protocol_version = response['version']
+        else:
+            self.logger.info('Server does not support protocol negotiation: {}'.format(response['failure_reason']))
+
+        self._protocol_negotiated.set()
+
     def can_connect(self):
         """Check if this adapter can take another connection
 
@@ -235,7 +290,7 @@ class WebSocketDeviceAdapter(DeviceAdapter):
                                     connection_string=connection_string,
                                     address=address,
                                     rpc_id=rpc_id,
-                                    payload=base64.b64encode(payload),
+                                    payload=encoding.encode_bytes(payload, self.protocol_version),
                                     timeout=timeout)
         except Exception as err:
             failure_reason = "Error while sending 'send_rpc' command to ws server: {}".format(err)
@@ -254,7 +309,7 @@ class WebSocketDeviceAdapter(DeviceAdapter):
             response['success'],
             response.get('failure_reason', None),
             response['status'],
-            base64.b64decode(response['return_value'])
+            encoding.decode_bytes(response['return_value'], self.protocol_version)
         )
 
     def send_script_async(self, connection_id, data, progress_callback, callback):
@@ -280,11 +335,7 @@ class WebSocketDeviceAdapter(DeviceAdapter):
             return
 
         connection_string = context['connection_string']
-        context['progress_callback'] = progress_callback
-
-        self.connections.begin_operation(connection_id, 'script', callback, self.get_config('default_timeout'))
-
-        mtu = int(self.get_config('mtu', 60*1024))  # Split script payloads larger than this
+        mtu = int(self.get_config('mtu'))  # Split script payloads larger than this
 
         # Count number of chunks to send
         nb_chunks = 1
@@ -293,6 +344,15 @@ class WebSocketDeviceAdapter(DeviceAdapter):
             if len(data) % mtu != 0:
                 nb_chunks += 1
 
+        if self.protocol_version >= encoding.WINDOWED_SCRIPT_VERSION:
+            self._begin_windowed_script(connection_id, context, data, mtu, nb_chunks, progress_callback, callback)
+            return
+
+        context['progress_callback'] = progress_callback
+
+        # The whole script is sent at once so there is nothing to restart the timeout with
+        self.connections.begin_operation(connection_id, 'script', callback, None)
+
         # Send the script out possibly in multiple chunks if it's larger than our maximum transmit unit
         for i in range(0, nb_chunks):
             start = i * mtu
@@ -301,7 +361,7 @@ class WebSocketDeviceAdapter(DeviceAdapter):
             try:
                 self.send_command_async(operations.SEND_SCRIPT,
                                         connection_string=connection_string,
-                                        script=base64.b64encode(chunk),
+                                        script=encoding.encode_bytes(chunk, self.protocol_version),
                                         fragment_count=nb_chunks,
                                         fragment_index=i)
             except Exception as err:
@@ -309,6 +369,196 @@ class WebSocketDeviceAdapter(DeviceAdapter):
                 self.connections.finish_operation(connection_id, False, failure_reason)
                 raise HardwareError(failure_reason)
 
+    @classmethod
+    def _get_script_id(cls, data, mtu):
+        """Compute the id of a windowed script upload.
+
+        The id only depends on the script and how it is split into fragments, so sending the
+        same script again resumes a previous upload that was interrupted.
+
+        Args:
+            data (bytes): The script to send
+            mtu (int): The size of each fragment
+
+        Returns:
+            str: The script id
+        """
+
+        return '{}-{}'.format(hashlib.sha256(bytes(data)).hexdigest(), mtu)
+
+    def _begin_windowed_script(self, connection_id, context, data, mtu, fragment_count, progress_callback, callback):
+        """Ask the server where to start or resume a windowed script upload.
+
+        Fragments are sent once the server answers, see _on_script_begun.
+
+        Args:
+            connection_id (int): A unique identifier that will refer to this connection
+            context (dict): The context of the connection
+            data (bytes): The script to send
+            mtu (int): The size of each fragment
+            fragment_count (int): The number of fragments in the script
+            progress_callback (callable): Called as progress_callback(done_count, total_count).
+                The first half of the progress is the fragments acknowledged by the server and
+                the second half is the progress of the device writing the script.
+            callback (callable): A callback for when we have finished sending the script
+        """
+
+        script_id = self._get_script_id(data, mtu)
+        context.pop('progress_callback', None)
+        context.pop('script_writing', None)
+        context['script'] = {
+            'script_id': script_id,
+            'data': data,
+            'mtu': mtu,
+            'fragment_count': fragment_count,
+            'window': int(self.get_config('script_window')),
+            'next_fragment': 0,
+            'acknowledged': 0,
+            'progress_callback': progress_callback
+        }
+
+        self.connections.begin_operation(connection_id, 'script', callback, self.get_config('default_timeout'))
+
+        try:
+            self.send_command_async(operations.BEGIN_SCRIPT,
+                                    connection_string=context['connection_string'],
+                                    script_id=script_id,
+                                    fragment_count=fragment_count)
+        except Exception as err:
+            del context['script']
+            failure_reason = "Error while sending 'begin_script' command to ws server: {}".format(err)
+            self.connections.finish_operation(connection_id, False, failure_reason)
+            raise HardwareError(failure_reason)
+
+    def _get_script_context(self, message):
+        """Find the windowed script upload that a message refers to.
+
+        Args:
+            message (dict): A begin_script response or script ack notification
+
+        Returns:
+            (dict, dict): The context of the connection and the state of the upload, or
+                (None, None) if the message does not correspond with an upload in progress.
+        """
+
+        try:
+            context = self.connections.get_context(message['connection_string'])
+        except ArgumentError:
+            self.logger.warn(
+                "Dropping script message that does not correspond with a known connection, message={}"
+                .format(message)
+            )
+            return None, None
+
+        script = context.get('script')
+        if script is None or script['script_id'] != message.get('script_id', script['script_id']):
+            self.logger.warn("Dropping script message that does not correspond with the current script, message={}"
+                             .format(message))
+            return None, None
+
+        return context, script
+
+    def _send_script_window(self, connection_string, script):
+        """Send fragments until the window of unacknowledged fragments is full.
+
+        Args:
+            connection_string (str): The connection string of the device
+            script (dict): The state of the upload
+        """
+
+        while script['next_fragment'] < script['fragment_count'] and \
+                script['next_fragment'] - script['acknowledged'] < script['window']:
+            index = script['next_fragment']
+            start = index * script['mtu']
+            chunk = script['data'][start:start + script['mtu']]
+
+            self.send_command_async(operations.SEND_SCRIPT,
+                                    connection_string=connection_string,
+                                    script_id=script['script_id'],
+                                    script=encoding.encode_bytes(chunk, self.protocol_version),
+                                    fragment_count=script['fragment_count'],
+                                    fragment_index=index)
+            script['next_fragment'] += 1
+
+    def _on_script_begun(self, response):
+        """Callback function called when the server tells us where to start a windowed script upload.
+
+        Args:
+            response (dict): The response data
+        """
+
+        context, script = self._get_script_context(response)
+        if context is None:
+            return
+
+        connection_string = response['connection_string']
+
+        if not response['success']:
+            del context['script']
+            self.connections.finish_operation(connection_string, False, response['failure_reason'])
+            return
+
+        script['next_fragment'] = response['next_fragment']
+        script['acknowledged'] = response['next_fragment']
+
+        if script['acknowledged'] > 0:
+            self.logger.info("Resuming script upload at fragment %d of %d", script['acknowledged'],
+                             script['fragment_count'])
+
+        self._update_script_window(connection_string, context, script)
+
+    def _on_script_ack(self, notification):
+        """Callback function called when the server acknowledges script fragments.
+
+        Args:
+            notification (dict): The received notification
+        """
+
+        context, script = self._get_script_context(notification)
+        if context is None:
+            return
+
+        script['acknowledged'] = max(script['acknowledged'], notification['received_count'])
+
+        # The server is making progress so restart the timeout of the upload
+        self.connections.extend_operation(notification['connection_string'], self.get_config('default_timeout'))
+        self._update_script_window(notification['connection_string'], context, script)
+
+    def _update_script_window(self, connection_string, context, script):
+        """Report progress and send more fragments after the server acknowledged some.
+
+        Args:
+            connection_string (str): The connection string of the device
+            context (dict): The context of the connection
+            script (dict): The state of the upload
+        """
+
+        progress_callback = script['progress_callback']
+        fragment_count = script['fragment_count']
+
+        if progress_callback is not None:
+            progress_callback(script['acknowledged'], 2*fragment_count)
+
+        if script['acknowledged'] >= fragment_count:
+            # All fragments received, now report the progress of the device writing the script.
+            # The timeout of the upload is restarted by every progress notification from now on.
+            del context['script']
+            context['script_writing'] = True
+
+            if progress_callback is not None:
+                context['progress_callback'] = lambda done, total: progress_callback(
+                    fragment_count + (fragment_count*done) // max(total, 1), 2*fragment_count)
+
+            return
+
+        try:
+            self._send_script_window(connection_string, script)
+        except Exception as err:  #pylint:disable=broad-except;We are on the websocket thread with no one to raise to
+            del context['script']
+            failure_reason = "Error while sending 'send_script' command to ws server: {}".format(err)
+            self.logger.exception(failure_reason)
+            self.connections.finish_operation(connection_string, False, failure_reason)
+
     def _on_script_finished(self, response):
         """Callback function called when a script has been fully sent to a device.
 
@@ -316,6 +566,13 @@ class WebSocketDeviceAdapter(DeviceAdapter):
             response (dict): The response
         """
 
+        try:
+            context = self.connections.get_context(response['connection_string'])
+            context.pop('script', None)
+            context.pop('script_writing', None)
+        except ArgumentError:
+            pass
+
         self.connections.finish_operation(
             response['connection_string'],
             response.get('success', False),
@@ -349,7 +606,8 @@ class WebSocketDeviceAdapter(DeviceAdapter):
             return
 
         # Create a parser to parse reports
-        context['parser'] = IOTileReportParser(report_callback=self._on_report, error_callback=self._on_report_error)
+        context['parser'] = IOTileReportParser(report_callback=self._on_report, error_callback=self._on_report_error,
+                                               lazy=self.get_config('lazy_reports'))
         context['parser'].context = connection_id
 
         self._open_interface(connection_id, 'streaming', callback)
@@ -553,7 +811,7 @@ class WebSocketDeviceAdapter(DeviceAdapter):
             )
             return
 
-        decoded_payload = base64.b64decode(report_chunk['payload'])
+        decoded_payload = encoding.decode_bytes(report_chunk['payload'], self.protocol_version)
         context['parser'].add_data(decoded_payload)
 
     def _on_report(self, report, context):
@@ -599,7 +857,7 @@ class WebSocketDeviceAdapter(DeviceAdapter):
             )
             return
 
-        decoded_payload = base64.b64decode(trace_chunk['payload'])
+        decoded_payload = encoding.decode_bytes(trace_chunk['payload'], self.protocol_version)
         self._trigger_callback('on_trace', connection_id, decoded_payload)
 
     def _on_progress_notification(self, notification):
@@ -618,6 +876,11 @@ class WebSocketDeviceAdapter(DeviceAdapter):
             )
             return
 
+        # The device is making progress writing a windowed script so restart the timeout of the upload,
+        # whether or not the caller asked to be told about the progress
+        if context.get('script_writing', False):
+            self.connections.extend_operation(notification['connection_string'], self.get_config('default_timeout'))
+
         progress_callback = context.get('progress_callback', None)
 
         if progress_callback is not None:
@@ -1,6 +1,7 @@
 import tornado.web
 import logging
 from .wshandler import WebSocketHandler
+from .script_store import PartialScriptStore
 
 
 class WebSocketGatewayAgent(object):
@@ -20,6 +21,7 @@ class WebSocketGatewayAgent(object):
         self.app = None
         self._manager = manager
         self._loop = loop
+        self._scripts = PartialScriptStore()
         self._logger = logging.getLogger(__name__)
         self._logger.addHandler(logging.NullHandler())
         self._logger.setLevel(logging.INFO)
@@ -33,7 +35,7 @@ class WebSocketGatewayAgent(object):
         port = self._args.get('port', 5120)
 
         self.app = tornado.web.Application([
-            (r'/iotile/v2', WebSocketHandler, {'manager': self._manager, 'loop': self._loop})
+            (r'/iotile/v2', WebSocketHandler, {'manager': self._manager, 'loop': self._loop, 'scripts': self._scripts})
         ])
 
         self._logger.info("Starting WebSocket Agent v2 on port %d" % port)
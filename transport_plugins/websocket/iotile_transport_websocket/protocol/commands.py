@@ -1,4 +1,8 @@
-"""List of commands handled by the WebSocket plugin."""
+"""List of commands handled by the WebSocket plugin.
+
+Binary fields are base64 encoded or raw depending on the negotiated protocol
+version, see encoding.py.
+"""
 
 from iotile.core.utilities.schema_verify import BytesVerifier, DictionaryVerifier, Verifier, \
     EnumVerifier, FloatVerifier, IntVerifier, LiteralVerifier, StringVerifier
@@ -8,6 +12,12 @@ Basic = DictionaryVerifier()
 Basic.add_required('type', LiteralVerifier('command'))
 Basic.add_required('connection_string', StringVerifier())
 
+# Begin or resume a windowed script upload
+BeginScript = Basic.clone()
+BeginScript.add_required('operation', LiteralVerifier(operations.BEGIN_SCRIPT))
+BeginScript.add_required('script_id', StringVerifier())
+BeginScript.add_required('fragment_count', IntVerifier())
+
 # Connect
 Connect = Basic.clone()
 Connect.add_required('operation', LiteralVerifier(operations.CONNECT))
@@ -21,6 +31,12 @@ CloseInterface.add_required('interface', EnumVerifier(['rpc', 'streaming', 'trac
 Disconnect = Basic.clone()
 Disconnect.add_required('operation', LiteralVerifier(operations.DISCONNECT))
 
+# Negotiate protocol
+NegotiateProtocol = DictionaryVerifier()
+NegotiateProtocol.add_required('type', LiteralVerifier('command'))
+NegotiateProtocol.add_required('operation', LiteralVerifier(operations.NEGOTIATE_PROTOCOL))
+NegotiateProtocol.add_required('version', IntVerifier())
+
 # Open interface
 OpenInterface = Basic.clone()
 OpenInterface.add_required('operation', LiteralVerifier(operations.OPEN_INTERFACE))
@@ -37,11 +53,12 @@ SendRPC.add_required('operation', LiteralVerifier(operations.SEND_RPC))
 SendRPC.add_required('address', IntVerifier())
 SendRPC.add_required('rpc_id', IntVerifier())
 SendRPC.add_required('timeout', FloatVerifier())
-SendRPC.add_required('payload', BytesVerifier(encoding="base64"))
+SendRPC.add_required('payload', BytesVerifier())
 
 # Send script
 SendScript = Basic.clone()
 SendScript.add_required('operation', LiteralVerifier(operations.SEND_SCRIPT))
 SendScript.add_required('fragment_count', IntVerifier())
 SendScript.add_required('fragment_index', IntVerifier())
-SendScript.add_required('script', BytesVerifier(encoding="base64"))
+SendScript.add_required('script', BytesVerifier())
+SendScript.add_optional('script_id', StringVerifier())
@@ -0,0 +1,70 @@
+"""Encoding of binary fields in each version of the WebSocket protocol.
+
+Messages are always packed with msgpack.  In version 1 of the protocol,
+binary fields like report and trace chunks, RPC payloads and script
+fragments are additionally base64 encoded.  Version 2 sends them as raw
+msgpack bin fields, which is 25% smaller and avoids encoding and decoding
+every payload.  Version 3 also uploads scripts in acknowledged fragments
+with a sliding window, see script_store.py.
+
+Both sides start out speaking version 1.  A client that supports newer
+versions sends a negotiate_protocol command with the highest version it
+supports and both sides switch to the version the server answers with.
+Servers that do not know the command answer with an error, so the client
+keeps using version 1 and old peers continue to work.
+"""
+
+import base64
+
+BASE64_VERSION = 1
+BINARY_VERSION = 2
+WINDOWED_SCRIPT_VERSION = 3
+
+LATEST_VERSION = WINDOWED_SCRIPT_VERSION
+
+
+def negotiate_version(requested):
+    """Choose the protocol version to use with a peer.
+
+    Args:
+        requested (int): The highest version the peer supports.
+
+    Returns:
+        int: The highest version supported by both sides.
+    """
+
+    return max(BASE64_VERSION, min(int(requested), LATEST_VERSION))
+
+
+def encode_bytes(data, version):
+    """Prepare a binary field to be sent.
+
+    Args:
+        data (bytes or bytearray): The data to send.
+        version (int): The protocol version in use with the peer.
+
+    Returns:
+        bytes or bytearray: The value to put in the message.
+    """
+
+    if version >= BINARY_VERSION:
+        return data
+
+    return base64.b64encode(data)
+
+
+def decode_bytes(data, version):
+    """Decode a binary field that was received.
+
+    Args:
+        data (bytes): The value from the message.
+        version (int): The protocol version in use with the peer.
+
+    Returns:
+        bytes: The decoded data.
+    """
+
+    if version >= BINARY_VERSION:
+        return data
+
+    return base64.b64decode(data)
@@ -16,13 +16,20 @@ DeviceFound.add_required('device', Verifier())
 Report = Basic.clone()
 Report.add_required('operation', LiteralVerifier(operations.NOTIFY_REPORT))
 Report.add_required('connection_string', StringVerifier())
-Report.add_required('payload', BytesVerifier(encoding="base64"))
+Report.add_required('payload', BytesVerifier())
 
 # Trace
 Trace = Basic.clone()
 Trace.add_required('operation', LiteralVerifier(operations.NOTIFY_TRACE))
 Trace.add_required('connection_string', StringVerifier())
-Trace.add_required('payload', BytesVerifier(encoding="base64"))
+Trace.add_required('payload', BytesVerifier())
+
+# Script fragments received
+ScriptAck = Basic.clone()
+ScriptAck.add_required('operation', LiteralVerifier(operations.NOTIFY_SCRIPT_ACK))
+ScriptAck.add_required('connection_string', StringVerifier())
+ScriptAck.add_required('script_id', StringVerifier())
+ScriptAck.add_required('received_count', IntVerifier())
 
 # Script progress
 Progress = Basic.clone()
@@ -1,11 +1,14 @@
 """List of operations handled by the WebSocket plugin."""
 
+BEGIN_SCRIPT = 'begin_script'
 CONNECT = 'connect'
 CLOSE_INTERFACE = 'close_interface'
 DISCONNECT = 'disconnect'
+NEGOTIATE_PROTOCOL = 'negotiate_protocol'
 NOTIFY_DEVICE_FOUND = 'notify_device_found'
 NOTIFY_PROGRESS = 'notify_progress'
 NOTIFY_REPORT = 'notify_report'
+NOTIFY_SCRIPT_ACK = 'notify_script_ack'
 NOTIFY_TRACE = 'notify_trace'
 OPEN_INTERFACE = 'open_interface'
 SCAN = 'probe'
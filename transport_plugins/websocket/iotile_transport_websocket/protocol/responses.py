@@ -48,6 +48,21 @@ FailedScan.add_required('failure_reason', StringVerifier())
 
 Scan = OptionsVerifier(SuccessfulScan, FailedScan)
 
+# Negotiate protocol
+SuccessfulNegotiateProtocol = DictionaryVerifier()
+SuccessfulNegotiateProtocol.add_required('type', LiteralVerifier('response'))
+SuccessfulNegotiateProtocol.add_required('operation', LiteralVerifier(operations.NEGOTIATE_PROTOCOL))
+SuccessfulNegotiateProtocol.add_required('success', BooleanVerifier(True))
+SuccessfulNegotiateProtocol.add_required('version', IntVerifier())
+
+FailedNegotiateProtocol = DictionaryVerifier()
+FailedNegotiateProtocol.add_required('type', LiteralVerifier('response'))
+FailedNegotiateProtocol.add_required('operation', LiteralVerifier(operations.NEGOTIATE_PROTOCOL))
+FailedNegotiateProtocol.add_required('success', BooleanVerifier(False))
+FailedNegotiateProtocol.add_required('failure_reason', StringVerifier())
+
+NegotiateProtocol = OptionsVerifier(SuccessfulNegotiateProtocol, FailedNegotiateProtocol)
+
 # Open interface
 SuccessfulOpenInterface = SuccessfulCommand.clone()
 SuccessfulOpenInterface.add_required('operation', LiteralVerifier(operations.OPEN_INTERFACE))
@@ -69,7 +84,7 @@ CloseInterface = OptionsVerifier(SuccessfulCloseInterface, FailedCloseInterface)
 # Send RPC
 SuccessfulSendRPC = SuccessfulCommand.clone()
 SuccessfulSendRPC.add_required('operation', LiteralVerifier(operations.SEND_RPC))
-SuccessfulSendRPC.add_required('return_value', BytesVerifier(encoding="base64"))
+SuccessfulSendRPC.add_required('return_value', BytesVerifier())
 SuccessfulSendRPC.add_required('status', IntVerifier())
 
 FailedSendRPC = FailedCommand.clone()
@@ -86,6 +101,17 @@ FailedSendScript.add_required('operation', LiteralVerifier(operations.SEND_SCRIP
 
 SendScript = OptionsVerifier(SuccessfulSendScript, FailedSendScript)
 
+# Begin script
+SuccessfulBeginScript = SuccessfulCommand.clone()
+SuccessfulBeginScript.add_required('operation', LiteralVerifier(operations.BEGIN_SCRIPT))
+SuccessfulBeginScript.add_required('script_id', StringVerifier())
+SuccessfulBeginScript.add_required('next_fragment', IntVerifier())
+
+FailedBeginScript = FailedCommand.clone()
+FailedBeginScript.add_required('operation', LiteralVerifier(operations.BEGIN_SCRIPT))
+
+BeginScript = OptionsVerifier(SuccessfulBeginScript, FailedBeginScript)
+
 # Unknown
 SuccessfulUnknownOperation = DictionaryVerifier()
 SuccessfulUnknownOperation.add_required('type', Verifier())
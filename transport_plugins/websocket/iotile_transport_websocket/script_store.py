@@ -0,0 +1,97 @@
+"""Storage for partially received scripts on the server side of the WebSocket protocol.
+
+Since protocol version 3, scripts are uploaded in numbered fragments that the
+server acknowledges as it receives them, so that the client can keep a window
+of fragments in flight.  Each upload is identified by a script id chosen by
+the client.  Partially received scripts are kept after the client disconnects,
+so that a client that reconnects can resume uploading the same script from the
+first fragment that the server does not have yet.
+"""
+
+from collections import OrderedDict
+from iotile.core.exceptions import ArgumentError
+
+
+class PartialScriptStore(object):
+    """Keep track of scripts whose fragments are still being received.
+
+    Only the most recently started uploads are kept, so abandoned uploads do
+    not accumulate forever.
+
+    Args:
+        max_scripts (int): The maximum number of partial scripts to keep.
+    """
+
+    def __init__(self, max_scripts=8):
+        self.max_scripts = max_scripts
+        self._scripts = OrderedDict()
+
+    def begin(self, device, script_id, fragment_count):
+        """Start or resume receiving a script.
+
+        Args:
+            device (str): The connection string of the device the script is for.
+            script_id (str): The client's identifier for the script.
+            fragment_count (int): The number of fragments in the script.
+
+        Returns:
+            int: The number of fragments that have already been received, which
+                is the index of the next fragment the client should send.
+        """
+
+        key = (device, script_id)
+        script = self._scripts.pop(key, None)
+
+        if script is None or script['fragment_count'] != fragment_count:
+            script = {'fragment_count': fragment_count, 'received': 0, 'data': bytearray()}
+
+        self._scripts[key] = script
+        while len(self._scripts) > self.max_scripts:
+            self._scripts.popitem(last=False)
+
+        return script['received']
+
+    def add_fragment(self, device, script_id, index, fragment):
+        """Add the next fragment of a script.
+
+        Fragments must be added in order.  Fragments that were already received
+        are ignored so that a client can safely resend them.
+
+        Args:
+            device (str): The connection string of the device the script is for.
+            script_id (str): The client's identifier for the script.
+            index (int): The index of this fragment.
+            fragment (bytes): The fragment data.
+
+        Returns:
+            (int, bytearray): The number of fragments received so far and the
+                complete script if this was the last fragment, otherwise None.
+
+        Raises:
+            ArgumentError: If the script was never started or the fragment is
+                not the next one expected.
+        """
+
+        key = (device, script_id)
+        script = self._scripts.get(key)
+        if script is None:
+            raise ArgumentError("Received fragment for unknown script", device=device, script_id=script_id)
+
+        if index < script['received']:
+            return script['received'], None
+
+        if index != script['received']:
+            raise ArgumentError("Received script fragment out of order", device=device, script_id=script_id,
+                                expected=script['received'], index=index)
+
+        script['data'] += fragment
+        script['received'] += 1
+
+        if script['received'] < script['fragment_count']:
+            return script['received'], None
+
+        del self._scripts[key]
+        return script['received'], script['data']
+
+    def __len__(self):
+        return len(self._scripts)
@@ -1,7 +1,6 @@
 # This file is copyright Arch Systems, Inc.
 # Except as otherwise provided in the relevant LICENSE file, all rights are reserved.
 
-import base64
 import datetime
 import logging
 import msgpack
@@ -11,9 +10,10 @@ from builtins import bytes
 from future.utils import viewitems
 from iotile.core.hw.virtual.virtualdevice import RPCInvalidIDError, RPCNotFoundError, TileNotFoundError
 from iotile.core.hw.virtual.virtualinterface import VirtualIOTileInterface
-from iotile.core.exceptions import HardwareError
+from iotile.core.exceptions import ArgumentError, HardwareError
 from .websocket_server import WebsocketServer
-from .protocol import commands, operations
+from .protocol import commands, encoding, operations
+from .script_store import PartialScriptStore
 
 
 class WebSocketVirtualInterface(VirtualIOTileInterface):
@@ -25,6 +25,9 @@ class WebSocketVirtualInterface(VirtualIOTileInterface):
 
                 port (int):
                     The port on which the server will listen (default: 5120)
+                max_frame_size (int):
+                    Split messages larger than this many bytes into fragmented
+                    websocket frames (default: never fragment)
 
     """
     def __init__(self, args):
@@ -55,9 +58,17 @@ class WebSocketVirtualInterface(VirtualIOTileInterface):
 
         # WebSocket client
         self.client = None
+        self.protocol_version = encoding.BASE64_VERSION
+
+        # Partially uploaded scripts, kept across reconnections so uploads can be resumed
+        self.scripts = PartialScriptStore()
 
         # WebSocket server
-        self.server = WebsocketServer(port, host='127.0.0.1', loglevel=logging.DEBUG)
+        max_frame_size = args.get('max_frame_size')
+        if max_frame_size is not None:
+            max_frame_size = int(max_frame_size)
+
+        self.server = WebsocketServer(port, host='127.0.0.1', loglevel=logging.DEBUG, max_frame_size=max_frame_size)
         self.server.set_fn_new_client(self.on_new_client)
         self.server.set_fn_client_left(self.on_client_disconnect)
         self.server.set_fn_message_received(self.on_message)
@@ -164,6 +175,7 @@ class WebSocketVirtualInterface(VirtualIOTileInterface):
 
         self.logger.info('Client connected with id {}'.format(client['id']))
         self.client = client
+        self.protocol_version = encoding.BASE64_VERSION
 
     def send_response(self, operation, **kwargs):
         """Send a command response indicating it has been executed with success.
@@ -255,6 +267,10 @@ class WebSocketVirtualInterface(VirtualIOTileInterface):
                 devices = self._simulate_scan_response()
                 self._send_scan_result(devices)
 
+            elif commands.NegotiateProtocol.matches(message):
+                self.protocol_version = encoding.negotiate_version(message['version'])
+                self.send_response(operations.NEGOTIATE_PROTOCOL, version=self.protocol_version)
+
             elif commands.Connect.matches(message):
                 self._connect_to_device(connection_string)
 
@@ -275,6 +291,17 @@ class WebSocketVirtualInterface(VirtualIOTileInterface):
                     message['payload']
                 )
 
+            elif commands.BeginScript.matches(message):
+                self._begin_script(connection_string, message['script_id'], message['fragment_count'])
+
+            elif commands.SendScript.matches(message) and 'script_id' in message:
+                self._send_script_fragment(
+                    connection_string,
+                    message['script_id'],
+                    message['script'],
+                    message['fragment_index']
+                )
+
             elif commands.SendScript.matches(message):
                 self._send_script(
                     connection_string,
@@ -635,7 +662,7 @@ class WebSocketVirtualInterface(VirtualIOTileInterface):
             connection_string (str): The connection string of the device
             address (int): the address of the tile that you want to talk to
             rpc_id (int): ID of the RPC to send
-            payload (str): the payload to send (up to 20 bytes), encoded using base64
+            payload (bytes): the payload to send (up to 20 bytes), encoded according to the protocol version
         """
 
         operation = operations.SEND_RPC
@@ -648,7 +675,7 @@ class WebSocketVirtualInterface(VirtualIOTileInterface):
         if connection_id is not None:
             feature = rpc_id >> 8  # Calculate the feature value from RPC id
             command = rpc_id & 0xFF  # Calculate the command value from RPC id
-            decoded_payload = base64.b64decode(payload)
+            decoded_payload = encoding.decode_bytes(payload, self.protocol_version)
 
             result = self._simulate_send_rpc(
                 connection_id,
@@ -659,7 +686,7 @@ class WebSocketVirtualInterface(VirtualIOTileInterface):
             )
 
             if result['success']:
-                return_value = base64.b64encode(result['payload'])
+                return_value = encoding.encode_bytes(result['payload'], self.protocol_version)
                 status = result['status']
             else:
                 error = result['reason']
@@ -711,7 +738,7 @@ class WebSocketVirtualInterface(VirtualIOTileInterface):
 
         Args:
             connection_string (str): The connection string of the device
-            chunk (str): A chunk of the script to send (up to 20 bytes), encoded using base64
+            chunk (bytes): A chunk of the script to send, encoded according to the protocol version
             chunk_status (tuple): Contains information as the current chunk index and the total of chunk which
                                 compose the script.
         """
@@ -728,7 +755,7 @@ class WebSocketVirtualInterface(VirtualIOTileInterface):
         if index == 0:
             self.script = bytes()
 
-        decoded_chunk = base64.b64decode(chunk)
+        decoded_chunk = encoding.decode_bytes(chunk, self.protocol_version)
         self.script += decoded_chunk
 
         # If there is more than one chunk and we aren't on the last one, wait until we receive them
@@ -736,10 +763,74 @@ class WebSocketVirtualInterface(VirtualIOTileInterface):
         if index != count - 1:
             return
 
+        self._write_script(connection_string, connection_id, self.script)
+
+    def _begin_script(self, connection_string, script_id, fragment_count):
+        """Start or resume receiving a script in acknowledged fragments.
+
+        Args:
+            connection_string (str): The connection string of the device
+            script_id (str): The client's identifier for the script
+            fragment_count (int): The number of fragments in the script
+        """
+
+        operation = operations.BEGIN_SCRIPT
+
+        if self._get_connection_id(connection_string) is None:
+            self.send_error(operation, 'Attempt to send a script when there was no connection',
+                            connection_string=connection_string)
+            return
+
+        next_fragment = self.scripts.begin(connection_string, script_id, fragment_count)
+        self.send_response(operation, connection_string=connection_string, script_id=script_id,
+                           next_fragment=next_fragment)
+
+    def _send_script_fragment(self, connection_string, script_id, chunk, index):
+        """Receive and acknowledge one fragment of a script started with _begin_script.
+
+        The script is sent to the device once its last fragment is received.
+
+        Args:
+            connection_string (str): The connection string of the device
+            script_id (str): The client's identifier for the script
+            chunk (bytes): The fragment, encoded according to the protocol version
+            index (int): The index of the fragment
+        """
+
+        operation = operations.SEND_SCRIPT
+        connection_id = self._get_connection_id(connection_string)
+
+        if connection_id is None:
+            self.send_error(operation, 'Received script chunk from unknown connection: {}'.format(connection_string))
+            return
+
+        try:
+            received, script = self.scripts.add_fragment(connection_string, script_id, index,
+                                                         encoding.decode_bytes(chunk, self.protocol_version))
+        except ArgumentError as err:
+            self.send_error(operation, str(err), connection_string=connection_string)
+            return
+
+        self.send_notification(operations.NOTIFY_SCRIPT_ACK, connection_string=connection_string,
+                               script_id=script_id, received_count=received)
+
+        if script is not None:
+            self._write_script(connection_string, connection_id, bytes(script))
+
+    def _write_script(self, connection_string, connection_id, script):
+        """Send a complete script to the device and respond to the client.
+
+        Args:
+            connection_string (str): The connection string of the device
+            connection_id (int): The connection id of the device
+            script (bytes): The complete script
+        """
+
+        operation = operations.SEND_SCRIPT
         error = None
 
         try:
-            self._simulate_send_script(connection_id, self.script, self._notify_progress)
+            self._simulate_send_script(connection_id, script, self._notify_progress)
 
         except Exception as exc:
             self.logger.exception('Error in manager send_script')
@@ -786,7 +877,7 @@ class WebSocketVirtualInterface(VirtualIOTileInterface):
             self.send_notification(
                 operations.NOTIFY_REPORT,
                 connection_string=connection_string,
-                payload=base64.b64encode(chunk)
+                payload=encoding.encode_bytes(chunk, self.protocol_version)
             )
             self._defer(self._stream_data, [device_uuid])
         except HardwareError as err:
@@ -814,7 +905,7 @@ class WebSocketVirtualInterface(VirtualIOTileInterface):
             self.send_notification(
                 operations.NOTIFY_TRACE,
                 connection_string=connection_string,
-                payload=base64.b64encode(chunk)
+                payload=encoding.encode_bytes(chunk, self.protocol_version)
             )
             self._defer(self._send_trace, [device_uuid])
         except HardwareError as err:
@@ -1,10 +1,12 @@
 # Author: Johan Hanssen Seferidis
 # License: MIT
 
+import binascii
 import errno
 import logging
 import sys
 import struct
+import threading
 from base64 import b64encode
 from builtins import bytes
 from hashlib import sha1
@@ -53,6 +55,55 @@ STATUS_GOING_AWAY = 1001
 STATUS_PROTOCOL_ERROR = 1002
 STATUS_WRONG_DATA_TYPE = 1003
 
+# Payloads up to this size are read into a buffer that is reused between frames
+MAX_REUSED_BUFFER = 64*1024
+
+
+if sys.version_info[0] < 3:
+    def unmask(mask, data):
+        """XOR a payload with its repeating 4 byte mask.
+
+        The whole payload is XORed at once as a single large integer instead
+        of one byte at a time.
+
+        Args:
+            mask (bytearray): The 4 byte masking key.
+            data (str or bytearray): The masked payload.
+
+        Returns:
+            bytearray: The unmasked payload.
+        """
+
+        length = len(data)
+        if length == 0:
+            return bytearray()
+
+        key = (str(mask) * (length // 4 + 1))[:length]
+        value = int(binascii.hexlify(data), 16) ^ int(binascii.hexlify(key), 16)
+        return bytearray(binascii.unhexlify('%0*x' % (2*length, value)))
+else:
+    def unmask(mask, data):
+        """XOR a payload with its repeating 4 byte mask.
+
+        The whole payload is XORed at once as a single large integer instead
+        of one byte at a time.
+
+        Args:
+            mask (bytearray): The 4 byte masking key.
+            data (bytes-like): The masked payload.
+
+        Returns:
+            bytearray: The unmasked payload.
+        """
+
+        length = len(data)
+        if length == 0:
+            return bytearray()
+
+        key = (bytes(mask) * (length // 4 + 1))[:length]
+        value = int.from_bytes(data, 'big') ^ int.from_bytes(key, 'big')
+        return bytearray(value.to_bytes(length, 'big'))
+
 
 # -------------------------------- API ---------------------------------
 
@@ -114,6 +165,8 @@ class WebsocketServer(ThreadingMixIn, TCPServer, API):
             0.0.0.0.
         loglevel: Logging level from logging module to use for logging. By default
             warnings and errors are being logged.
+        max_frame_size(int): Messages longer than this are sent as several
+            fragmented frames. By default every message is sent in a single frame.
     Properties:
         clients(list): A list of connected clients. A client is a dictionary
             like below.
@@ -130,8 +183,9 @@ class WebsocketServer(ThreadingMixIn, TCPServer, API):
     clients = []
     id_counter = 0
 
-    def __init__(self, port, host='127.0.0.1', loglevel=logging.WARNING):
+    def __init__(self, port, host='127.0.0.1', loglevel=logging.WARNING, max_frame_size=None):
         logger.setLevel(loglevel)
+        self.max_frame_size = max_frame_size
         TCPServer.__init__(self, (host, port), WebSocketHandler)
         self.port = self.socket.getsockname()[1]
 
@@ -191,6 +245,12 @@ class WebSocketHandler(StreamRequestHandler):
         self.handshake_done = False
         self.valid_client = False
 
+        # Note that StreamRequestHandler.__init__ handles the whole connection
+        self._buffer = bytearray(4096)
+        self._fragments = []
+        self._fragment_opcode = None
+        self._send_lock = threading.Lock()
+
         StreamRequestHandler.__init__(self, socket, addr, server)
 
     def setup(self):
@@ -214,6 +274,42 @@ class WebSocketHandler(StreamRequestHandler):
         else:
             return bytes
 
+    def read_payload(self, num):
+        """Read exactly num bytes of frame payload.
+
+        Small payloads are read directly into a buffer that is reused for
+        every frame, so the returned data is only valid until the next read.
+
+        Returns:
+            bytes-like: The payload data.
+
+        Raises:
+            EOFError: The connection was closed before num bytes were read.
+        """
+
+        if not hasattr(self.rfile, 'readinto'):
+            data = self.rfile.read(num)
+            if len(data) < num:
+                raise EOFError("Connection closed in the middle of a frame")
+            return data
+
+        if num <= MAX_REUSED_BUFFER:
+            if len(self._buffer) < num:
+                self._buffer = bytearray(max(num, 2*len(self._buffer)))
+            buf = self._buffer
+        else:
+            buf = bytearray(num)
+
+        view = memoryview(buf)[:num]
+        received = 0
+        while received < num:
+            count = self.rfile.readinto(view[received:])
+            if not count:
+                raise EOFError("Connection closed in the middle of a frame")
+            received += count
+
+        return view
+
     def read_next_message(self):
         try:
             b1, b2 = self.read_bytes(2)
@@ -241,16 +337,20 @@ class WebSocketHandler(StreamRequestHandler):
             self.keep_alive = 0
             return
         if opcode == OPCODE_CONTINUATION:
-            logger.warn("Continuation frames are not supported.")
-            return
-        elif opcode == OPCODE_BINARY:
-            opcode_handler = self.server._message_received_
-        elif opcode == OPCODE_TEXT:
-            opcode_handler = self.server._message_received_
-        elif opcode == OPCODE_PING:
-            opcode_handler = self.server._ping_received_
-        elif opcode == OPCODE_PONG:
-            opcode_handler = self.server._pong_received_
+            if self._fragment_opcode is None:
+                logger.warn("Continuation frame received without a message to continue.")
+                self.keep_alive = 0
+                return
+        elif opcode in (OPCODE_BINARY, OPCODE_TEXT):
+            if self._fragment_opcode is not None:
+                logger.warn("New message started before the previous fragmented message finished.")
+                self.keep_alive = 0
+                return
+        elif opcode in (OPCODE_PING, OPCODE_PONG):
+            if not fin or payload_length > 125:
+                logger.warn("Control frames must not be fragmented.")
+                self.keep_alive = 0
+                return
         else:
             logger.warn("Unknown opcode %#x." % opcode)
             self.keep_alive = 0
@@ -261,16 +361,39 @@ class WebSocketHandler(StreamRequestHandler):
         elif payload_length == 127:
             payload_length = struct.unpack(">Q", self.rfile.read(8))[0]
 
-        masks = self.read_bytes(4)
-        message_bytes = bytearray()
-        for message_byte in self.read_bytes(payload_length):
-            message_byte ^= masks[len(message_bytes) % 4]
-            message_bytes.append(message_byte)
+        try:
+            masks = bytearray(self.read_payload(4))
+            message_bytes = unmask(masks, self.read_payload(payload_length))
+        except EOFError:
+            logger.info("Client closed connection in the middle of a frame.")
+            self.keep_alive = 0
+            return
+
+        if opcode == OPCODE_PING:
+            self.server._ping_received_(self, message_bytes)
+            return
+        elif opcode == OPCODE_PONG:
+            self.server._pong_received_(self, message_bytes)
+            return
+
+        # Collect fragmented messages until the final frame arrives
+        if not fin or opcode == OPCODE_CONTINUATION:
+            if opcode != OPCODE_CONTINUATION:
+                self._fragment_opcode = opcode
+
+            self._fragments.append(message_bytes)
+            if not fin:
+                return
+
+            opcode = self._fragment_opcode
+            message_bytes = bytearray().join(self._fragments)
+            self._fragments = []
+            self._fragment_opcode = None
 
         if opcode == OPCODE_BINARY:
-            opcode_handler(self, message_bytes)
+            self.server._message_received_(self, message_bytes)
         else:
-            opcode_handler(self, message_bytes.decode('utf8'))
+            self.server._message_received_(self, message_bytes.decode('utf8'))
 
     def send_pong(self, ping):
         self.send(ping, OPCODE_PONG)
@@ -298,35 +421,73 @@ class WebSocketHandler(StreamRequestHandler):
         self.send(payload, OPCODE_TEXT)
 
     def send(self, payload, opcode):
+        """Send a message to the client.
+
+        If the server has a max_frame_size and the payload is longer than it,
+        the message is split into a first frame and continuation frames.
+        Control frames are never fragmented.
         """
-        Important: Fragmented(=continuation) messages are not supported since
-        their usage cases are limited - when we don't know the payload length.
-        """
 
+        frame_size = self.server.max_frame_size
+        payload_length = len(payload)
+
+        with self._send_lock:
+            if not frame_size or payload_length <= frame_size or opcode >= OPCODE_CLOSE_CONN:
+                self._send_frame(FIN | opcode, payload)
+                return
+
+            view = memoryview(payload)
+            for offset in range(0, payload_length, frame_size):
+                flags = opcode if offset == 0 else OPCODE_CONTINUATION
+                if offset + frame_size >= payload_length:
+                    flags |= FIN
+
+                self._send_frame(flags, view[offset:offset + frame_size])
+
+    def _send_frame(self, flags, payload):
         header = bytearray()
         payload_length = len(payload)
 
         # Normal payload
         if payload_length <= 125:
-            header.append(FIN | opcode)
+            header.append(flags)
             header.append(payload_length)
 
         # Extended payload
         elif 126 <= payload_length < 2**16:
-            header.append(FIN | opcode)
+            header.append(flags)
             header.append(PAYLOAD_LEN_EXT16)
             header.extend(struct.pack(">H", payload_length))
 
         # Huge extended payload
         elif payload_length < 2**64:
-            header.append(FIN | opcode)
+            header.append(flags)
             header.append(PAYLOAD_LEN_EXT64)
             header.extend(struct.pack(">Q", payload_length))
 
         else:
             raise Exception("Message is too big. Consider breaking it into chunks.")
 
-        self.request.send(header + payload)
+        self._send_vectored(header, payload)
+
+    def _send_vectored(self, header, payload):
+        """Send a frame header and payload without joining them into one buffer."""
+
+        if not hasattr(self.request, 'sendmsg'):
+            header += payload
+            self.request.sendall(header)
+            return
+
+        buffers = [memoryview(header), memoryview(payload)]
+        while len(buffers) > 0:
+            sent = self.request.sendmsg(buffers)
+
+            while len(buffers) > 0 and sent >= len(buffers[0]):
+                sent -= len(buffers[0])
+                buffers.pop(0)
+
+            if sent > 0:
+                buffers[0] = buffers[0][sent:]
 
     def read_http_headers(self):
         headers = {}
@@ -1,7 +1,6 @@
 # This file is copyright Arch Systems, Inc.
 # Except as otherwise provided in the relevant LICENSE file, all rights are reserved.
 
-import base64
 import datetime
 import logging
 import msgpack
@@ -10,7 +9,9 @@ import tornado.ioloop
 import tornado.websocket
 from future.utils import viewitems
 from builtins import bytes
-from .protocol import commands, operations
+from iotile.core.exceptions import ArgumentError
+from .protocol import commands, encoding, operations
+from .script_store import PartialScriptStore
 
 
 class WebSocketHandler(tornado.websocket.WebSocketHandler):
@@ -24,8 +25,9 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
         self.logger.addHandler(logging.NullHandler())
 
         self.connections = {}
+        self.protocol_version = encoding.BASE64_VERSION
 
-    def initialize(self, manager, loop):
+    def initialize(self, manager, loop, scripts=None):
         """Initialize socket handler. Called every time a client call the websocket server
         address (cf gateway_agent.py). Used to get the DeviceManager of the gateway.
         /!\ : called before __init__
@@ -33,11 +35,18 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
         Args:
             manager (DeviceManager): The device manager of the gateway.
             loop (tornado.ioloop): The event loop of the thread
+            scripts (PartialScriptStore): Partially uploaded scripts shared between all clients
+                so that uploads can be resumed after reconnecting.
         """
 
         self.manager = manager
         self.loop = loop
 
+        if scripts is None:
+            scripts = PartialScriptStore()
+
+        self.scripts = scripts
+
     @classmethod
     def decode_datetime(cls, obj):
         """Decode a msgpack'ed datetime."""
@@ -203,6 +212,9 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
                 devices = yield self.manager.probe_async()
                 self._send_scan_result(devices)
 
+            elif commands.NegotiateProtocol.matches(message):
+                self._negotiate_protocol(message['version'])
+
             elif commands.Connect.matches(message):
                 yield self._connect_to_device(connection_string)
 
@@ -224,6 +236,17 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
                     message['timeout']
                 )
 
+            elif commands.BeginScript.matches(message):
+                self._begin_script(connection_string, message['script_id'], message['fragment_count'])
+
+            elif commands.SendScript.matches(message) and 'script_id' in message:
+                self._send_script_fragment(
+                    connection_string,
+                    message['script_id'],
+                    message['script'],
+                    message['fragment_index']
+                )
+
             elif commands.SendScript.matches(message):
                 self._send_script(
                     connection_string,
@@ -241,6 +264,16 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
             self.logger.exception('Error while handling received message')
             self.send_error(operations.UNKNOWN, 'Exception raised: {}'.format(err))
 
+    def _negotiate_protocol(self, version):
+        """Switch to the newest protocol version supported by both the client and us.
+
+        Args:
+            version (int): The newest protocol version supported by the client
+        """
+
+        self.protocol_version = encoding.negotiate_version(version)
+        self.send_response(operations.NEGOTIATE_PROTOCOL, version=self.protocol_version)
+
     def _send_scan_result(self, devices):
         """Send scan results by sending one notification per device found and, at the end, a final response
         indicating than the scan is done.
@@ -387,7 +420,7 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
             connection_string (str): The connection string of the device
             address (int): the address of the tile that you want to talk to
             rpc_id (int): ID of the RPC to send
-            payload (str): the payload to send (up to 20 bytes), encoded using base64
+            payload (bytes): the payload to send (up to 20 bytes), encoded according to the protocol version
         """
 
         operation = operations.SEND_RPC
@@ -400,7 +433,7 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
         if connection_id is not None:
             feature = rpc_id >> 8  # Calculate the feature value from RPC id
             command = rpc_id & 0xFF  # Calculate the command value from RPC id
-            decoded_payload = base64.b64decode(payload)
+            decoded_payload = encoding.decode_bytes(payload, self.protocol_version)
 
             result = yield self.manager.send_rpc(
                 connection_id,
@@ -412,7 +445,7 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
             )
 
             if result['success']:
-                return_value = base64.b64encode(result['payload'])
+                return_value = encoding.encode_bytes(result['payload'], self.protocol_version)
                 status = result['status']
             else:
                 error = result['reason']
@@ -431,7 +464,7 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
 
         Args:
             connection_string (str): The connection string of the device
-            chunk (str): A chunk of the script to send (up to 20 bytes), encoded using base64
+            chunk (bytes): A chunk of the script to send, encoded according to the protocol version
             chunk_status (tuple): Contains information as the current chunk index and the total of chunk which
                                 compose the script.
         """
@@ -448,7 +481,7 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
         if index == 0:
             connection_data['script'] = bytes()
 
-        decoded_chunk = base64.b64decode(chunk)
+        decoded_chunk = encoding.decode_bytes(chunk, self.protocol_version)
         connection_data['script'] += decoded_chunk
 
         # If there is more than one chunk and we aren't on the last one, wait until we receive them
@@ -456,15 +489,83 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
         if index != count - 1:
             return
 
+        script = connection_data['script']
+        connection_data['script'] = bytes()
+
+        yield self._write_script(connection_string, connection_data['connection_id'], script)
+
+    def _begin_script(self, connection_string, script_id, fragment_count):
+        """Start or resume receiving a script in acknowledged fragments.
+
+        Args:
+            connection_string (str): The connection string of the device
+            script_id (str): The client's identifier for the script
+            fragment_count (int): The number of fragments in the script
+        """
+
+        operation = operations.BEGIN_SCRIPT
+
+        if self._get_connection_data(connection_string) is None:
+            self.send_error(operation, 'Attempt to send a script when there was no connection',
+                            connection_string=connection_string)
+            return
+
+        next_fragment = self.scripts.begin(connection_string, script_id, fragment_count)
+        self.send_response(operation, connection_string=connection_string, script_id=script_id,
+                           next_fragment=next_fragment)
+
+    @tornado.gen.coroutine
+    def _send_script_fragment(self, connection_string, script_id, chunk, index):
+        """Receive and acknowledge one fragment of a script started with _begin_script.
+
+        The script is sent to the device once its last fragment is received.
+
+        Args:
+            connection_string (str): The connection string of the device
+            script_id (str): The client's identifier for the script
+            chunk (bytes): The fragment, encoded according to the protocol version
+            index (int): The index of the fragment
+        """
+
+        operation = operations.SEND_SCRIPT
+
+        connection_data = self._get_connection_data(connection_string)
+        if connection_data is None:
+            self.send_error(operation, 'Received script chunk from unknown connection: {}'.format(connection_string))
+            return
+
+        try:
+            received, script = self.scripts.add_fragment(connection_string, script_id, index,
+                                                         encoding.decode_bytes(chunk, self.protocol_version))
+        except ArgumentError as err:
+            self.send_error(operation, str(err), connection_string=connection_string)
+            return
+
+        self.send_notification(operations.NOTIFY_SCRIPT_ACK, connection_string=connection_string,
+                               script_id=script_id, received_count=received)
+
+        if script is not None:
+            yield self._write_script(connection_string, connection_data['connection_id'], bytes(script))
+
+    @tornado.gen.coroutine
+    def _write_script(self, connection_string, connection_id, script):
+        """Send a complete script to the device and respond to the client.
+
+        Args:
+            connection_string (str): The connection string of the device
+            connection_id (int): The device manager's id for the connection
+            script (bytes): The complete script
+        """
+
+        operation = operations.SEND_SCRIPT
         error = None
 
         try:
             result = yield self.manager.send_script(
-                connection_data['connection_id'],
-                connection_data['script'],
+                connection_id,
+                script,
                 lambda x, y: self._notify_progress_async(connection_string, x, y)
             )
-            connection_data['script'] = bytes()
 
             if not result['success']:
                 error = result['reason']
@@ -524,7 +625,7 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
         self.send_notification(
             operations.NOTIFY_REPORT,
             connection_string=connection_string,
-            payload=base64.b64encode(report.encode())
+            payload=encoding.encode_bytes(report.encode(), self.protocol_version)
         )
 
     def _notify_trace(self, device_uuid, event_name, trace):
@@ -545,7 +646,7 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
         self.send_notification(
             operations.NOTIFY_TRACE,
             connection_string=connection_string,
-            payload=base64.b64encode(trace)
+            payload=encoding.encode_bytes(trace, self.protocol_version)
         )
 
     @tornado.gen.coroutine
@@ -0,0 +1,60 @@
+"""Tests of binary field encoding in each protocol version.
+
+test_encoding_benchmark prints the message size and the time to pack and
+unpack a report chunk with each protocol version when run with pytest -s.
+"""
+
+from __future__ import print_function
+import os
+import timeit
+import msgpack
+import pytest
+from iotile_transport_websocket.protocol import encoding, notifications, operations
+
+
+def test_negotiate_version():
+    """Make sure we pick the newest version both sides support."""
+
+    assert encoding.negotiate_version(1) == 1
+    assert encoding.negotiate_version(2) == 2
+    assert encoding.negotiate_version(100) == encoding.LATEST_VERSION
+    assert encoding.negotiate_version(0) == 1
+
+
+@pytest.mark.parametrize('version', [1, 2])
+def test_encode_decode(version):
+    """Make sure binary fields survive a msgpack round trip."""
+
+    data = os.urandom(100)
+
+    message = {'type': 'notification', 'operation': operations.NOTIFY_REPORT, 'connection_string': '1',
+               'payload': encoding.encode_bytes(data, version)}
+
+    unpacked = msgpack.unpackb(msgpack.packb(message, use_bin_type=True), raw=False)
+    assert notifications.Report.matches(unpacked)
+    assert encoding.decode_bytes(unpacked['payload'], version) == data
+
+
+def test_encoding_benchmark():
+    """Compare the size and cost of sending a 4 KB report chunk in each version."""
+
+    data = os.urandom(4*1024)
+    results = {}
+
+    for version in (encoding.BASE64_VERSION, encoding.BINARY_VERSION):
+        def _round_trip():
+            message = {'type': 'notification', 'operation': operations.NOTIFY_REPORT, 'connection_string': '1',
+                       'payload': encoding.encode_bytes(data, version)}
+            packed = msgpack.packb(message, use_bin_type=True)
+            unpacked = msgpack.unpackb(packed, raw=False)
+            notifications.Report.verify(unpacked)
+            encoding.decode_bytes(unpacked['payload'], version)
+            return len(packed)
+
+        size = _round_trip()
+        elapsed = timeit.timeit(_round_trip, number=1000) / 1000
+        results[version] = size
+
+        print("protocol version %d: %d bytes per 4 KB chunk, %.1f us per round trip" % (version, size, elapsed * 1e6))
+
+    assert results[encoding.BINARY_VERSION] < results[encoding.BASE64_VERSION] * 0.8
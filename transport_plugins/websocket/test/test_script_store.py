@@ -0,0 +1,45 @@
+"""Unit tests for the server side storage of partially uploaded scripts."""
+
+import pytest
+from iotile.core.exceptions import ArgumentError
+from iotile_transport_websocket.script_store import PartialScriptStore
+
+
+def test_script_fragments():
+    """Make sure fragments are assembled in order and duplicates are ignored."""
+
+    store = PartialScriptStore()
+
+    assert store.begin('1', 'abc', 3) == 0
+    assert store.add_fragment('1', 'abc', 0, b'ab') == (1, None)
+    assert store.add_fragment('1', 'abc', 0, b'ab') == (1, None)
+
+    with pytest.raises(ArgumentError):
+        store.add_fragment('1', 'abc', 2, b'ef')
+
+    # Resuming keeps the fragments received so far
+    assert store.begin('1', 'abc', 3) == 1
+    assert store.add_fragment('1', 'abc', 1, b'cd') == (2, None)
+    assert store.add_fragment('1', 'abc', 2, b'ef') == (3, b'abcdef')
+
+    assert len(store) == 0
+    with pytest.raises(ArgumentError):
+        store.add_fragment('1', 'abc', 3, b'gh')
+
+
+def test_script_limits():
+    """Make sure only the most recent partial scripts are kept."""
+
+    store = PartialScriptStore(max_scripts=2)
+
+    store.begin('1', 'a', 2)
+    store.add_fragment('1', 'a', 0, b'a')
+    store.begin('2', 'a', 2)
+    store.begin('1', 'b', 2)
+
+    assert len(store) == 2
+    assert store.begin('1', 'a', 2) == 0
+
+    # A script with a different number of fragments starts over
+    store.add_fragment('1', 'a', 0, b'a')
+    assert store.begin('1', 'a', 3) == 0
@@ -6,6 +6,7 @@ Also test that our WebSocketDeviceAdapter works well with the HardwareManager.
 import json
 import pytest
 import queue
+from iotile_transport_websocket.device_adapter import WebSocketDeviceAdapter
 from devices_factory import build_report_device, build_tracing_device, get_tracing_device_string
 
 
@@ -113,3 +114,83 @@ def test_send_script(hw, virtual_interface):
     assert prog_count > 0
 
     assert interface.device.script == script
+
+
+@pytest.mark.parametrize('virtual_interface, version', [(build_report_device(), 1), (build_report_device(), 2)],
+                         indirect=['virtual_interface'])
+def test_protocol_versions(virtual_interface, version):
+    """Make sure scripts and reports work with both protocol versions."""
+
+    port, interface = virtual_interface
+
+    adapter = WebSocketDeviceAdapter(port="127.0.0.1:{}".format(port), protocol_version=version)
+    reports = queue.Queue()
+    adapter.add_callback('on_report', lambda conn_id, report: reports.put(report))
+
+    try:
+        assert adapter.protocol_version == version
+        assert interface.protocol_version == version
+
+        assert adapter.connect_sync(0, str(0x10))['success'] is True
+
+        script = bytes(b'ab')*100
+        assert adapter.send_script_sync(0, script, lambda x, y: None)['success'] is True
+        assert interface.device.script == script
+
+        assert adapter.open_interface_sync(0, 'streaming')['success'] is True
+        reports.get(timeout=5.0)
+    finally:
+        adapter.stop_sync()
+
+
+@pytest.mark.parametrize('virtual_interface', [build_report_device()], indirect=True)
+def test_resume_script(virtual_interface):
+    """Make sure an interrupted script upload resumes from the last acknowledged fragment."""
+
+    port, interface = virtual_interface
+    script = bytes(bytearray(range(0, 200)))
+    mtu = 16
+
+    # Simulate a previous upload that was interrupted after 5 of its 13 fragments
+    script_id = WebSocketDeviceAdapter._get_script_id(script, mtu)
+    assert interface.scripts.begin(str(0x10), script_id, 13) == 0
+    for i in range(0, 5):
+        interface.scripts.add_fragment(str(0x10), script_id, i, script[i*mtu:(i + 1)*mtu])
+
+    adapter = WebSocketDeviceAdapter(port="127.0.0.1:{}".format(port))
+    adapter.set_config('mtu', mtu)
+    progress = []
+
+    try:
+        assert adapter.connect_sync(0, str(0x10))['success'] is True
+        result = adapter.send_script_sync(0, script, lambda done, total: progress.append((done, total)))
+        assert result['success'] is True
+    finally:
+        adapter.stop_sync()
+
+    assert progress[0] == (5, 26)
+    assert interface.device.script == script
+    assert len(interface.scripts) == 0
+
+
+@pytest.mark.parametrize('virtual_interface', [build_report_device()], indirect=True)
+def test_slow_script_write(virtual_interface):
+    """Make sure a device that takes longer than the timeout to write a script does not time out the upload."""
+
+    port, interface = virtual_interface
+    script = bytes(bytearray(range(0, 200)))*2
+
+    # Write the script in 25 steps of 50 ms, well past the timeout, while reporting progress after each step
+    interface.chunk_size = 16
+
+    adapter = WebSocketDeviceAdapter(port="127.0.0.1:{}".format(port))
+    adapter.set_config('default_timeout', 0.5)
+
+    try:
+        assert adapter.connect_sync(0, str(0x10))['success'] is True
+        result = adapter.send_script_sync(0, script, None)
+        assert result['success'] is True
+    finally:
+        adapter.stop_sync()
+
+    assert interface.device.script == script
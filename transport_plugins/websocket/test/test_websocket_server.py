@@ -0,0 +1,215 @@
+"""Tests of the embedded websocket server's framing using a raw socket client.
+
+test_throughput_benchmark prints timing information when run with pytest -s
+but only asserts that every message was received correctly.
+"""
+
+from __future__ import print_function
+import os
+import socket
+import struct
+import threading
+import time
+import pytest
+from iotile_transport_websocket import websocket_server
+from iotile_transport_websocket.websocket_server import WebsocketServer, unmask, OPCODE_BINARY, OPCODE_TEXT, \
+    OPCODE_CONTINUATION, OPCODE_PING, OPCODE_PONG, FIN
+
+
+def legacy_unmask(mask, data):
+    """The byte at a time unmasking loop that the server used to use."""
+
+    message_bytes = bytearray()
+    for message_byte in bytearray(data):
+        message_byte ^= mask[len(message_bytes) % 4]
+        message_bytes.append(message_byte)
+
+    return message_bytes
+
+
+class RawClient(object):
+    """A minimal websocket client that sends hand built frames."""
+
+    def __init__(self, port):
+        self.sock = socket.create_connection(('127.0.0.1', port))
+        self.sock.sendall(b'GET / HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                          b'Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\nSec-WebSocket-Version: 13\r\n\r\n')
+
+        response = b''
+        while b'\r\n\r\n' not in response:
+            response += self.sock.recv(1024)
+
+        assert response.startswith(b'HTTP/1.1 101')
+
+    def send_frame(self, flags, payload, mask=b'\x12\x34\x56\x78'):
+        length = len(payload)
+        if length <= 125:
+            header = struct.pack("BB", flags, 0x80 | length)
+        elif length < 2**16:
+            header = struct.pack(">BBH", flags, 0x80 | 126, length)
+        else:
+            header = struct.pack(">BBQ", flags, 0x80 | 127, length)
+
+        self.sock.sendall(header + mask + bytes(unmask(bytearray(mask), payload)))
+
+    def _recv_exact(self, length):
+        data = b''
+        while len(data) < length:
+            chunk = self.sock.recv(length - len(data))
+            assert len(chunk) > 0
+            data += chunk
+
+        return data
+
+    def recv_frame(self):
+        flags, length = struct.unpack("BB", self._recv_exact(2))
+        if length == 126:
+            length, = struct.unpack(">H", self._recv_exact(2))
+        elif length == 127:
+            length, = struct.unpack(">Q", self._recv_exact(8))
+
+        return flags, self._recv_exact(length)
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture(scope="function", params=[None])
+def echo_server(request):
+    """A websocket server that echoes every message it receives."""
+
+    server = WebsocketServer(0, max_frame_size=request.param)
+    received = []
+
+    def _on_message(client, server, message):
+        received.append(message)
+        server.send_message(client, message, binary=not isinstance(message, type(u'')))
+
+    server.set_fn_new_client(lambda client, server: None)
+    server.set_fn_client_left(lambda client, server: None)
+    server.set_fn_message_received(_on_message)
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    yield server, received
+
+    server.shutdown()
+    server.socket.close()
+    del WebsocketServer.clients[:]
+
+
+@pytest.mark.parametrize('length', [0, 1, 3, 4, 5, 125, 126, 4095, 65536])
+def test_unmask(length):
+    """Make sure the fast unmasking matches the byte at a time loop."""
+
+    mask = bytearray(b'\xa1\x02\xff\x40')
+    data = bytearray(os.urandom(length))
+
+    assert unmask(mask, data) == legacy_unmask(mask, data)
+    assert unmask(mask, memoryview(data)) == legacy_unmask(mask, data)
+
+
+def test_frames(echo_server):
+    """Make sure single frame messages of all sizes are received correctly."""
+
+    server, received = echo_server
+    client = RawClient(server.port)
+
+    for length in (0, 10, 125, 126, 1000, 70000):
+        payload = os.urandom(length)
+        client.send_frame(FIN | OPCODE_BINARY, payload)
+        assert client.recv_frame() == (FIN | OPCODE_BINARY, payload)
+
+    client.send_frame(FIN | OPCODE_TEXT, u'hello'.encode('utf-8'))
+    assert client.recv_frame() == (FIN | OPCODE_TEXT, b'hello')
+
+    assert received[-1] == u'hello'
+    client.close()
+
+
+def test_fragmented_frames(echo_server):
+    """Make sure fragmented messages are reassembled, even with pings between fragments."""
+
+    server, received = echo_server
+    client = RawClient(server.port)
+
+    payload = os.urandom(10000)
+    client.send_frame(OPCODE_BINARY, payload[:3000])
+    client.send_frame(OPCODE_CONTINUATION, payload[3000:6000])
+    client.send_frame(FIN | OPCODE_PING, b'ping')
+    assert client.recv_frame() == (FIN | OPCODE_PONG, b'ping')
+
+    client.send_frame(FIN | OPCODE_CONTINUATION, payload[6000:])
+    assert client.recv_frame() == (FIN | OPCODE_BINARY, payload)
+    assert received == [bytearray(payload)]
+
+    client.send_frame(OPCODE_TEXT, u'hel'.encode('utf-8'))
+    client.send_frame(FIN | OPCODE_CONTINUATION, u'lo'.encode('utf-8'))
+    assert client.recv_frame() == (FIN | OPCODE_TEXT, b'hello')
+
+    client.close()
+
+
+@pytest.mark.parametrize('echo_server', [1000], indirect=True)
+def test_fragmented_send(echo_server):
+    """Make sure large messages are sent as continuation frames."""
+
+    server, _received = echo_server
+    client = RawClient(server.port)
+
+    payload = os.urandom(2500)
+    client.send_frame(FIN | OPCODE_BINARY, payload)
+
+    assert client.recv_frame() == (OPCODE_BINARY, payload[:1000])
+    assert client.recv_frame() == (OPCODE_CONTINUATION, payload[1000:2000])
+    assert client.recv_frame() == (FIN | OPCODE_CONTINUATION, payload[2000:])
+
+    client.send_frame(FIN | OPCODE_BINARY, payload[:1000])
+    assert client.recv_frame() == (FIN | OPCODE_BINARY, payload[:1000])
+
+    client.close()
+
+
+def test_unexpected_continuation(echo_server):
+    """Make sure a continuation frame without a first frame closes the connection."""
+
+    server, received = echo_server
+    client = RawClient(server.port)
+
+    client.send_frame(FIN | OPCODE_CONTINUATION, b'abc')
+    assert client.sock.recv(10) == b''
+    assert received == []
+
+    client.close()
+
+
+def test_throughput_benchmark(echo_server, monkeypatch):
+    """Compare receive throughput with the fast and the legacy unmasking."""
+
+    server, received = echo_server
+    payload = os.urandom(64*1024)
+    count = 50
+
+    def _measure():
+        del received[:]
+        client = RawClient(server.port)
+        start = time.time()
+        for _i in range(0, count):
+            client.send_frame(FIN | OPCODE_BINARY, payload)
+            client.recv_frame()
+
+        elapsed = time.time() - start
+        client.close()
+
+        assert len(received) == count
+        assert all(x == payload for x in received)
+        return len(payload) * count / elapsed / 1e6
+
+    fast = _measure()
+
+    monkeypatch.setattr(websocket_server, 'unmask', legacy_unmask)
+    legacy = _measure()
+
+    print("64 KB messages: %.1f MB/s fast unmasking, %.1f MB/s legacy unmasking" % (fast, legacy))
@@ -8,6 +8,8 @@ import pytest
 import struct
 import threading
 from devices_factory import get_report_device_string, get_tracing_device_string
+from iotile_transport_websocket.device_adapter import WebSocketDeviceAdapter
+from iotile_transport_websocket.protocol import commands
 
 
 report_device_string = get_report_device_string()
@@ -38,6 +40,16 @@ def test_probe(device_adapter):
     assert report_device['connection_string'] == str(report_device['uuid'])
 
 
+@pytest.mark.parametrize('gateway', [{"name": "virtual", "port": report_device_string}], indirect=True)
+@pytest.mark.parametrize('device_adapter, expected', [({}, 3), ({'protocol_version': 1}, 1), ({'protocol_version': 2}, 2),
+                                                       ({'protocol_version': 4}, 3)],
+                         indirect=['device_adapter'])
+def test_protocol_negotiation(device_adapter, expected):
+    """Make sure the adapter and server agree on a protocol version both support."""
+
+    assert device_adapter.protocol_version == expected
+
+
 @pytest.mark.parametrize('gateway', [{"name": "virtual", "port": ';'.join([report_device_string, tracing_device_string])}], indirect=True)
 def test_device_adapter_connection(device_adapter):
     # Connect to the first device
@@ -92,6 +104,7 @@ def test_autoprobe(device_adapter):
 
 
 @pytest.mark.parametrize('gateway', [{"name": "virtual", "port": tracing_device_string}], indirect=True)
+@pytest.mark.parametrize('device_adapter', [{}, {'protocol_version': 1}], indirect=True)
 def test_traces(device_adapter):
     result = {'traces': bytes()}
     traces_complete = threading.Event()
@@ -114,6 +127,7 @@ def test_traces(device_adapter):
 
 
 @pytest.mark.parametrize('gateway', [{"name": "virtual", "port": report_device_string}], indirect=True)
+@pytest.mark.parametrize('device_adapter', [{}, {'protocol_version': 1}], indirect=True)
 def test_reports(device_adapter):
     reports = []
     reports_complete = threading.Event()
@@ -136,6 +150,33 @@ def test_reports(device_adapter):
 
 
 @pytest.mark.parametrize('gateway', [{"name": "virtual", "port": report_device_string}], indirect=True)
+def test_lazy_reports(device_adapter):
+    """Make sure reports are only decoded when their readings are accessed if lazy_reports is set."""
+
+    reports = []
+    report_received = threading.Event()
+
+    def on_report_callback(connection_id, report):
+        reports.append(report)
+        report_received.set()
+
+    device_adapter.set_config('lazy_reports', True)
+    device_adapter.add_callback('on_report', on_report_callback)
+
+    device_adapter.connect_sync(0, str(0x10))
+    device_adapter.open_interface_sync(0, 'streaming')
+
+    assert report_received.wait(timeout=5.0) is True
+
+    report = reports[0]
+    assert not report.decoded
+    assert report.origin == 0x10
+    assert len(report.visible_readings) > 0
+    assert report.decoded
+
+
+@pytest.mark.parametrize('gateway', [{"name": "virtual", "port": report_device_string}], indirect=True)
+@pytest.mark.parametrize('device_adapter', [{}, {'protocol_version': 1}], indirect=True)
 def test_send_rpc(device_adapter):
     device_adapter.connect_sync(0, str(0x10))
     device_adapter.open_interface_sync(0, 'rpc')
@@ -153,6 +194,7 @@ def test_send_rpc(device_adapter):
 
 
 @pytest.mark.parametrize('gateway', [{"name": "virtual", "port": report_device_string}], indirect=True)
+@pytest.mark.parametrize('device_adapter', [{}, {'protocol_version': 2}, {'protocol_version': 1}], indirect=True)
 def test_send_script(device_adapter):
     progress = {'done': 0, 'total': None}
     script_complete = threading.Event()
@@ -180,3 +222,52 @@ def test_send_script(device_adapter):
     flag = script_complete.wait(5.0)
     assert flag is True
     assert progress['done'] > 0
+
+
+@pytest.mark.parametrize('gateway', [{"name": "virtual", "port": report_device_string}], indirect=True)
+def test_send_script_windowed(device_adapter):
+    """Make sure scripts split into many fragments are sent through a small window."""
+
+    progress = []
+    script = bytes(bytearray(range(0, 200)))
+
+    device_adapter.set_config('mtu', 16)
+    device_adapter.set_config('script_window', 3)
+    device_adapter.connect_sync(0, str(0x10))
+
+    result = device_adapter.send_script_sync(0, script, lambda done, total: progress.append((done, total)))
+    assert result['success'] is True
+
+    # 13 fragments acknowledged by the gateway followed by the device writing the script
+    assert [x[0] for x in progress[:14]] == list(range(0, 14))
+    assert all(total == 26 for _done, total in progress)
+    assert sorted(progress) == progress
+
+    # Sending the script again starts from the beginning since the previous upload finished
+    del progress[:]
+    assert device_adapter.send_script_sync(0, script, lambda done, total: progress.append((done, total)))['success']
+    assert progress[0] == (0, 26)
+
+
+@pytest.mark.parametrize('gateway', [{"name": "virtual", "port": report_device_string}], indirect=True)
+def test_old_server(gateway, monkeypatch):
+    """Make sure the adapter falls back to base64 payloads with servers that cannot negotiate."""
+
+    port, _manager = gateway
+
+    # Make the server reject negotiation like servers from before it was added
+    monkeypatch.setattr(commands.NegotiateProtocol, 'matches', lambda message: False)
+
+    adapter = WebSocketDeviceAdapter(port="127.0.0.1:{}".format(port))
+
+    try:
+        assert adapter.protocol_version == 1
+
+        adapter.connect_sync(0, str(0x10))
+        adapter.open_interface_sync(0, 'rpc')
+
+        result = adapter.send_rpc_sync(0, 8, 0x200a, struct.pack('<H', 0), timeout=1.0)
+        assert result['success'] is True
+        assert len(result['payload']) > 0
+    finally:
+        adapter.stop_sync()